@@ -0,0 +1,95 @@
+"""
+Benchmark: enka.merge_dataframes (column-wise) vs the original row-wise merge.
+
+Builds synthetic artifact histories of growing size, merges a new showcase into
+each of them with both implementations, checks that the results are identical
+and prints the timings.
+
+    python Tools/Benchmarks/bench_merge_dataframes.py [--sizes 1000 10000 50000] [--repeat 3]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'Website'))
+
+import enka
+
+SLOTS = ['Flower', 'Plume', 'Sands', 'Goblet', 'Circlet']
+SETS = ['Golden Troupe', 'Emblem of Severed Fate', 'Marechaussee Hunter', 'Noblesse Oblige']
+SUBS = ['Crit Rate', 'Crit DMG', 'ATK%', 'HP%', 'Energy Recharge', 'Elemental Mastery']
+
+
+def synthetic_history(n_rows, seed=0):
+    """n_rows artifacts spread over n_rows / 25 characters, with the usual CSV dtypes."""
+    rnd = random.Random(seed)
+    n_chars = max(1, n_rows // 25)
+    rows = []
+    for _ in range(n_rows):
+        row = {
+            'Character': f'Char{rnd.randrange(n_chars)}',
+            'Slot': rnd.choice(SLOTS),
+            'Set': rnd.choice(SETS),
+            'Main_Stat': rnd.choice(['HP', 'ATK', 'Crit Rate']),
+            'Main_Value': rnd.choice([4780, 311, 31.1, 46.6]),
+            'Level': 20,
+            'Crit_Value': round(rnd.uniform(0, 50), 1),
+        }
+        for k in range(1, 5):
+            row[f'Sub{k}'] = rnd.choice(SUBS)
+            row[f'Sub{k}_Val'] = rnd.choice([3.9, 7.8, 5.8, 19, 23, np.nan])
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def new_showcase(history, seed=0, size=40):
+    """A showcase re-reading some known pieces, upgrading some, and bringing new ones."""
+    unchanged = history.sample(size // 2, random_state=seed)
+    upgraded = history.sample(size // 4, random_state=seed + 1).copy()
+    upgraded['Sub1_Val'] = 11.7
+    fresh = synthetic_history(size // 4, seed=seed + 2)
+    return pd.concat([unchanged, upgraded, fresh], ignore_index=True)
+
+
+def timed(func, repeat):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 50000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    key_columns = ['Character', 'Slot']
+    print(f"{'rows':>8} {'row-wise':>10} {'column-wise':>12} {'speedup':>8}  stats")
+    for size in args.sizes:
+        history = synthetic_history(size)
+        showcase = new_showcase(history)
+
+        t_old, (old_df, old_stats) = timed(
+            lambda: enka._merge_dataframes_rowwise(history, showcase, enka.create_artifact_key, key_columns),
+            args.repeat)
+        t_new, (new_df, new_stats) = timed(
+            lambda: enka.merge_dataframes(history, showcase, enka.create_artifact_key, key_columns),
+            args.repeat)
+
+        assert old_stats == new_stats, (old_stats, new_stats)
+        pd.testing.assert_frame_equal(old_df, new_df)
+        print(f"{size:>8} {t_old:>9.3f}s {t_new:>11.3f}s {t_old / t_new:>7.1f}x  {new_stats}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+"""
+Benchmark: parsing a showcase into records (enka.parse_player_data + to_api_data)
+vs the original dict-per-row parse regrouped by scanning every artifact for
+every character.
+
+Runs both over the stored raw.json snapshots, checks that the API data is
+identical and prints the time of parse + grouping + API dicts, and the peak
+allocation of the parsed scans (tracemalloc).
+
+    python Tools/Benchmarks/bench_parse_records.py [--fixtures 'Website/backend/*/raw.json'] [--repeat 20]
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'Website'))
+
+import enka
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+
+
+# --- Original implementation (one 15-key dict per artifact, regrouped afterwards) ---
+
+def legacy_extract_artifacts(equip_list, char_name):
+    artifacts = []
+    for equip in equip_list:
+        if 'reliquary' not in equip:
+            continue
+        flat = equip.get('flat', {})
+        reliquary = equip.get('reliquary', {})
+        equip_type = flat.get('equipType', 'Unknown')
+        set_id = flat.get('setId', 0)
+        level = reliquary.get('level', 1) - 1
+        main_stat = flat.get('reliquaryMainstat', {})
+        substats = flat.get('reliquarySubstats', [])
+        substat_data = {}
+        for i, sub in enumerate(substats):
+            substat_data[f'Sub{i+1}'] = enka.format_prop(sub.get('appendPropId', ''))
+            substat_data[f'Sub{i+1}_Val'] = sub.get('statValue', 0)
+        for i in range(len(substats), 4):
+            substat_data[f'Sub{i+1}'] = ""
+            substat_data[f'Sub{i+1}_Val'] = ""
+        crit_rate = 0
+        crit_dmg = 0
+        for sub in substats:
+            prop = sub.get('appendPropId', '')
+            if prop == 'FIGHT_PROP_CRITICAL':
+                crit_rate = sub.get('statValue', 0)
+            elif prop == 'FIGHT_PROP_CRITICAL_HURT':
+                crit_dmg = sub.get('statValue', 0)
+        artifacts.append({
+            'Character': char_name,
+            'Slot': enka.EQUIP_TYPE_MAP.get(equip_type, equip_type),
+            'Set': enka.SET_MAP.get(set_id, f"Set_{set_id}"),
+            'Level': f"+{level}",
+            'Main_Stat': enka.format_prop(main_stat.get('mainPropId', '')),
+            'Main_Value': main_stat.get('statValue', 0),
+            'Sub1': substat_data.get('Sub1', ''),
+            'Sub1_Val': substat_data.get('Sub1_Val', ''),
+            'Sub2': substat_data.get('Sub2', ''),
+            'Sub2_Val': substat_data.get('Sub2_Val', ''),
+            'Sub3': substat_data.get('Sub3', ''),
+            'Sub3_Val': substat_data.get('Sub3_Val', ''),
+            'Sub4': substat_data.get('Sub4', ''),
+            'Sub4_Val': substat_data.get('Sub4_Val', ''),
+            'Crit_Value': round(crit_rate * 2 + crit_dmg, 1),
+        })
+    return artifacts
+
+
+def legacy_parse(data):
+    characters, all_artifacts = [], []
+    for avatar in data['avatarInfoList']:
+        avatar_id = avatar.get('avatarId')
+        char_name = enka.CHARACTER_MAP.get(avatar_id, f"ID_{avatar_id}")
+        fight_props = avatar.get('fightPropMap', {})
+        element, elem_bonus = enka.get_element_bonus(fight_props)
+        weapon = enka.extract_weapon_info(avatar.get('equipList', []))
+        char_artifacts = legacy_extract_artifacts(avatar.get('equipList', []), char_name)
+        characters.append({
+            'Character': char_name,
+            'Level': int(avatar.get('propMap', {}).get('4001', {}).get('val', 0)),
+            'HP': round(fight_props.get('2000', 0)),
+            'ATK': round(fight_props.get('2001', 0)),
+            'DEF': round(fight_props.get('2002', 0)),
+            'EM': round(fight_props.get('28', 0)),
+            'ER%': round(fight_props.get('23', 1) * 100, 1),
+            'Crit_Rate%': round(fight_props.get('20', 0) * 100, 1),
+            'Crit_DMG%': round(fight_props.get('22', 0) * 100, 1),
+            'Element': element or "N/A",
+            'Elem_Bonus%': elem_bonus,
+            'Total_CV': sum(a['Crit_Value'] for a in char_artifacts),
+            'Weapon_Refine': weapon.refinement if weapon else 0,
+        })
+        all_artifacts.extend(char_artifacts)
+    # Regrouped twice (API data, combined rows) by scanning every artifact for every character
+    api_data = [{'stats': c, 'artifacts': [a for a in all_artifacts if a['Character'] == c['Character']]}
+                for c in characters]
+    by_slot = [{a['Slot']: a for a in all_artifacts if a['Character'] == c['Character']} for c in characters]
+    return api_data, by_slot
+
+
+def records_parse(data):
+    parsed, _ = enka.parse_player_data(data)
+    by_slot = [c.artifacts_by_slot() for c in parsed['characters']]
+    return enka.to_api_data(parsed), by_slot
+
+
+# --- Measurements ---
+
+def best_time(func, payloads, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for data in payloads:
+            func(data)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def peak_memory(func, payloads):
+    """Peak of the memory allocated while the parsed results of all payloads are alive."""
+    tracemalloc.start()
+    kept = [func(data) for data in payloads]
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del kept
+    return peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--fixtures', default=os.path.join(ROOT, 'Website', 'backend', '*', 'raw.json'))
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    payloads = []
+    for path in sorted(glob.glob(args.fixtures)):
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('avatarInfoList'):
+            payloads.append(data)
+    if not payloads:
+        print(f"No showcase found in {args.fixtures}")
+        return 1
+
+    for data in payloads:
+        assert legacy_parse(data)[0] == records_parse(data)[0]
+    n_artifacts = sum(len(c['artifacts']) for data in payloads for c in legacy_parse(data)[0])
+
+    print(f"{len(payloads)} showcases, {n_artifacts} artifacts, best of {args.repeat}")
+    print(f"{'':>10} {'dicts':>10} {'records':>10} {'ratio':>7}")
+    t_old = best_time(legacy_parse, payloads, args.repeat)
+    t_new = best_time(records_parse, payloads, args.repeat)
+    print(f"{'time':>10} {t_old * 1000:>8.1f}ms {t_new * 1000:>8.1f}ms {t_old / t_new:>6.2f}x")
+
+    # What a scan keeps alive until it is persisted: the parsed rows
+    m_old = peak_memory(legacy_parse, payloads)
+    m_new = peak_memory(lambda d: enka.parse_player_data(d)[0], payloads)
+    print(f"{'peak mem':>10} {m_old / 1024:>8.0f}KB {m_new / 1024:>8.0f}KB {m_old / m_new:>6.2f}x")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
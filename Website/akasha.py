@@ -1,14 +1,37 @@
 import pandas as pd
 import json
 import re
+import logging
 import i18n
 import http_client
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 
 # --- CONFIGURATION ---
 BASE_URL = "https://akasha.cv/api/leaderboards"
 CALCULATION_ID = "" 
 MAX_SIZE = 50
 REQUEST_TIMEOUT = 15
+PAGE_SIZE = 20           # Entries per Akasha request
+MAX_PARALLEL_PAGES = 3   # Pages fetched at the same time (rate budget)
+RESUME_TTL = 600         # Seconds an incomplete fetch can be resumed
+MAX_PARTIAL_FETCHES = 32
+
+# (sort key, id key) pairs accepted by the Akasha API, tried in this order
+QUERY_SHAPES = [
+    ('Leaderboard.result', 'LeaderboardId'),
+    ('calculation.result', 'calculationId'),
+]
+# Remembers which shape worked for each calculation ID (calc_id -> id key)
+QUERY_SHAPE_CACHE = os.environ.get('AKASHA_SHAPE_CACHE', str(Path(__file__).resolve().parent / "data" / "akasha_query_shapes.json"))
+
+# Incomplete page fetches kept for resuming: (calc_id, limit) -> state
+_partial_fetches = {}
+_partial_fetches_lock = threading.Lock()
+_shape_cache_lock = threading.Lock()
 
 def sanitize_filename(name):
     """Cleans a name for use in a filename."""
@@ -43,109 +66,289 @@ def get_calculation_id():
     
     return calc_id
 
-def fetch_leaderboard(calculation_id, limit=MAX_SIZE, timeout=REQUEST_TIMEOUT):
-    """Fetches leaderboard data for a given Calculation ID."""
-    # Use optimized http_client with Cloudflare bypass
-    session = http_client.create_session(
-        browser='chrome',
-        platform='windows',  # Windows has better reputation
-        use_nodejs=True
+def load_query_shapes(path=None):
+    """Reads the calc_id -> query shape map ({} if missing or unreadable)."""
+    path = path or QUERY_SHAPE_CACHE
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            shapes = json.load(f)
+        return shapes if isinstance(shapes, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+def _update_query_shape(calculation_id, id_key, path=None):
+    """Stores (or with id_key=None, forgets) the working shape of a calculation ID."""
+    path = path or QUERY_SHAPE_CACHE
+    with _shape_cache_lock:
+        shapes = load_query_shapes(path)
+        if shapes.get(calculation_id) == id_key:
+            return
+        if id_key is None:
+            shapes.pop(calculation_id, None)
+        else:
+            shapes[calculation_id] = id_key
+        try:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(shapes, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logging.warning(f"Could not save query shape cache: {e}")
+
+def query_shape_order(known_id_key=None):
+    """Shape indexes to try, the remembered one (by id key) first."""
+    order = list(range(len(QUERY_SHAPES)))
+    order.sort(key=lambda shape: QUERY_SHAPES[shape][1] != known_id_key)
+    return order
+
+def build_query_params(shape, calculation_id, size, page=1):
+    """Akasha accepts two parameter shapes depending on the leaderboard type."""
+    sort_key, id_key = QUERY_SHAPES[shape]
+    return {
+        'sort': sort_key,
+        'order': '-1',
+        'size': size,
+        'page': page,
+        id_key: calculation_id
+    }
+
+def artifact_set_label(entry):
+    """
+    Describes the artifact sets of a raw Akasha entry ('4pc X', '2pc A + 2pc B').
+    Returns None when the entry has no set information.
+    """
+    sets = entry.get('artifactSets') or {}
+    counts = {}
+    for name, info in sets.items():
+        count = info.get('count', 0) if isinstance(info, dict) else info
+        if count >= 2:
+            counts[name] = 4 if count >= 4 else 2
+    if not counts:
+        return None
+    return " + ".join(f"{count}pc {name}" for name, count in sorted(counts.items(), key=lambda x: (-x[1], x[0])))
+
+def parse_entry(entry):
+    """Converts one Akasha leaderboard entry into a flat profile row."""
+    stats = entry.get('stats', {})
+    calc = entry.get('Leaderboard') or entry.get('calculation') or entry.get('Calculation') or {}
+    weapon = entry.get('weapon', {})
+    owner = entry.get('owner', {})
+
+    weapon_info = weapon.get('weaponInfo', {})
+    refine_obj = weapon_info.get('refinementLevel', {})
+
+    # Dynamically retrieve elemental bonus
+    elemental_bonus = None
+    for key in stats:
+        if 'DamageBonus' in key and key != 'physicalDamageBonus':
+            elemental_bonus = round(get_value(stats.get(key, 0)) * 100, 2)
+            break
+
+    return {
+        'Rank': entry.get('index'),
+        'Player': owner.get('nickname'),
+        'UID': entry.get('uid'),
+        # 'Build_ID': entry.get('_id'),
+        'Region': owner.get('region'),
+        'Weapon': weapon.get('name'),
+        'Refine': get_value(refine_obj) + 1 if refine_obj else None,
+        'HP': round(get_value(stats.get('maxHp', 0))),
+        'ATK': round(get_value(stats.get('atk', 0))),
+        'DEF': round(get_value(stats.get('def', 0))),
+        'EM': round(get_value(stats.get('elementalMastery', 0))),
+        'ER': round(get_value(stats.get('energyRecharge', 0)) * 100, 2),
+        'Crit_Rate': round(get_value(stats.get('critRate', 0)) * 100, 2),
+        'Crit_DMG': round(get_value(stats.get('critDamage', 0)) * 100, 2),
+        'Elem_Bonus': elemental_bonus,
+        'DMG_Result': round(get_value(calc.get('result', 0))),
+        'Character': entry.get('name'),
+        'Artifact_Sets': artifact_set_label(entry),
+    }
+
+def merge_pages(pages):
+    """
+    Merges page results in rank order and drops duplicates.
+    Entries are deduplicated by UID (an entry can shift to the next page between
+    two requests); entries without UID are deduplicated by rank.
+    """
+    merged = []
+    seen = set()
+    for page in sorted(pages):
+        for entry in pages[page]:
+            key = ('uid', entry.get('uid')) if entry.get('uid') else ('rank', entry.get('index'))
+            if key in seen:
+                continue
+            seen.add(key)
+            merged.append(entry)
+    return merged
+
+def _request_page(session, calculation_id, shape, page, page_size, timeout):
+    """Fetches one page. Returns (entries, status_code); entries is None when the page failed."""
+    response = http_client.get_with_retry(
+        session,
+        BASE_URL,
+        params=build_query_params(shape, calculation_id, page_size, page),
+        timeout=timeout,
+        delay_min=1.5,
+        delay_max=3.0,
+        max_retries=3
     )
-    
-    print(i18n.get("FETCHING_LEADERBOARD", limit=limit), flush=True)
-
-    param_sets = [
-        {
-            'sort': 'Leaderboard.result',
-            'order': '-1',
-            'size': limit,
-            'LeaderboardId': calculation_id
-        },
-        {
-            'sort': 'calculation.result',
-            'order': '-1',
-            'size': limit,
-            'calculationId': calculation_id
+    if response.status_code != 200:
+        return None, response.status_code
+    payload = response.json()
+    return (payload or {}).get('data') or [], response.status_code
+
+def fetch_leaderboard_pages(calculation_id, limit=MAX_SIZE, page_size=PAGE_SIZE, max_workers=MAX_PARALLEL_PAGES,
+                            timeout=REQUEST_TIMEOUT, resume=None):
+    """
+    Fetches a leaderboard page by page. Page 1 is used to find a working query shape,
+    the remaining pages are fetched concurrently (at most `max_workers` at once,
+    each request keeping http_client's delays).
+
+    Returns (raw_entries, state). `state` records the successful pages; passing it
+    back as `resume` only re-fetches the pages that are still missing.
+    """
+    if not resume or resume.get('calc_id') != calculation_id:
+        resume = {
+            'calc_id': calculation_id,
+            'page_size': max(1, min(page_size, limit)),
+            'shape': None,
+            'pages': {},
+            'last_status': None,
         }
-    ]
+    state = resume
+    pages = state['pages']
+    page_size = state['page_size']
+    page_count = -(-limit // page_size)
 
-    last_status = None
-    data = None
+    # One session per thread: cloudscraper sessions are not thread-safe
+    local = threading.local()
+    def get_session():
+        if not hasattr(local, 'session'):
+            local.session = http_client.create_session(
+                browser='chrome',
+                platform='windows',  # Windows has better reputation
+                use_nodejs=True
+            )
+        return local.session
 
-    try:
-        for params in param_sets:
+    # Page 1 decides which query shape this leaderboard answers to.
+    # The shape that worked last time is tried first, so a repeat fetch makes one attempt.
+    if state['shape'] is None:
+        known = load_query_shapes().get(calculation_id)
+        for shape in query_shape_order(known):
             try:
-                response = http_client.get_with_retry(
-                    session,
-                    BASE_URL,
-                    params=params,
-                    timeout=timeout,
-                    delay_min=1.5,
-                    delay_max=3.0,
-                    max_retries=3
-                )
-                last_status = response.status_code
-                if response.status_code != 200:
-                    continue
-                payload = response.json()
-                if payload and payload.get('data'):
-                    data = payload
-                    break
+                entries, status = _request_page(get_session(), calculation_id, shape, 1, page_size, timeout)
             except Exception as e:
-                print(f"Request attempt failed: {e}")
+                # A timeout or a reset says nothing about the shape: keep remembering it
+                logging.warning(f"Request attempt failed: {e}")
                 continue
+            state['last_status'] = status
+            if entries:
+                state['shape'] = shape
+                pages[1] = entries
+                break
+            if entries is not None and QUERY_SHAPES[shape][1] == known:
+                # The remembered shape answered without entries: forget it
+                _update_query_shape(calculation_id, None)
+                known = None
+        if state['shape'] is None:
+            return [], state
+        _update_query_shape(calculation_id, QUERY_SHAPES[state['shape']][1])
+
+    # A short page is the end of the leaderboard: never ask for pages after it
+    failed = set()
+    def last_page():
+        short = [p for p in pages if len(pages[p]) < page_size]
+        return min(short + [page_count])
+
+    def fetch(page):
+        try:
+            return page, _request_page(get_session(), calculation_id, state['shape'], page, page_size, timeout)
+        except Exception as e:
+            logging.warning(f"Request attempt failed: {e}")
+            return page, (None, None)
+
+    # Pages are fetched in waves of `max_workers`, so a short page stops further requests
+    max_workers = max(1, max_workers)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while True:
+            missing = [p for p in range(1, last_page() + 1) if p not in pages and p not in failed]
+            if not missing:
+                break
+            for page, (entries, status) in executor.map(fetch, missing[:max_workers]):
+                if status is not None:
+                    state['last_status'] = status
+                if entries is not None:
+                    pages[page] = entries
+                else:
+                    failed.add(page)
+
+    # Highest page such that every page up to it succeeded
+    end = last_page()
+    last_good = 0
+    while last_good < end and last_good + 1 in pages:
+        last_good += 1
+    state['last_good_page'] = last_good
+    state['complete'] = last_good == end
+
+    return merge_pages({p: pages[p] for p in pages if p <= last_good})[:limit], state
+
+def fetch_leaderboard(calculation_id, limit=MAX_SIZE, timeout=REQUEST_TIMEOUT, quiet=False, sink=None):
+    """
+    Fetches leaderboard data for a given Calculation ID.
+    By default (CLI) it prints progress and a preview and writes <character>_dataset.csv.
+    With `quiet` (library/API use) there is no console output and no CSV.
+    `sink` is an optional object with write(calculation_id, profiles), e.g.
+    dataset_sink.LeaderboardDatasetSink, that receives every successful fetch.
+    """
+    say = (lambda *args, **kwargs: None) if quiet else print
+    say(i18n.get("FETCHING_LEADERBOARD", limit=limit), flush=True)
+
+    try:
+        # Resume a recent incomplete fetch of the same leaderboard from its last good page
+        with _partial_fetches_lock:
+            resume = _partial_fetches.pop((calculation_id, limit), None)
+        if resume and time.time() - resume['saved_at'] > RESUME_TTL:
+            resume = None
+        entries, state = fetch_leaderboard_pages(calculation_id, limit=limit, timeout=timeout, resume=resume)
+        last_status = state.get('last_status')
+        if not state.get('complete') and state.get('shape') is not None:
+            state['saved_at'] = time.time()
+            with _partial_fetches_lock:
+                _partial_fetches[(calculation_id, limit)] = state
+                while len(_partial_fetches) > MAX_PARTIAL_FETCHES:
+                    _partial_fetches.pop(next(iter(_partial_fetches)))
 
-        if not data or 'data' not in data or not data['data']:
-            print(i18n.get("NO_DATA_RETURNED"))
+        if not entries:
+            say(i18n.get("NO_DATA_RETURNED"))
             if last_status and last_status != 200:
-                print(i18n.get("ERROR_STATUS", status=last_status))
+                say(i18n.get("ERROR_STATUS", status=last_status))
                 if last_status == 403:
-                    print(i18n.get("CLOUDFLARE_BLOCK"))
-                    print("TIP: If running on VPS, consider using residential proxy or FlareSolverr")
+                    say(i18n.get("CLOUDFLARE_BLOCK"))
+                    say("TIP: If running on VPS, consider using residential proxy or FlareSolverr")
             return []
 
+        if not state.get('complete'):
+            say(i18n.get("PARTIAL_LEADERBOARD", count=len(entries), page=state.get('last_good_page')))
+
+        all_profiles = [parse_entry(entry) for entry in entries]
+
+        if sink is not None:
+            try:
+                sink.write(calculation_id, all_profiles)
+            except Exception as e:
+                logging.warning(f"Leaderboard sink failed for {calculation_id}: {e}")
+
+        if quiet:
+            return all_profiles
+
         # Get character name for filename
-        char_name = data['data'][0].get('name', 'character').lower()
+        char_name = entries[0].get('name', 'character').lower()
         safe_char_name = sanitize_filename(char_name)
         filename = f"{safe_char_name}_dataset.csv"
 
-        all_profiles = []
-
-        for entry in data['data']:
-            stats = entry.get('stats', {})
-            calc = entry.get('Leaderboard') or entry.get('calculation') or entry.get('Calculation') or {}
-            weapon = entry.get('weapon', {})
-            owner = entry.get('owner', {})
-
-            weapon_info = weapon.get('weaponInfo', {})
-            refine_obj = weapon_info.get('refinementLevel', {})
-
-            # Dynamically retrieve elemental bonus
-            elemental_bonus = None
-            for key in stats:
-                if 'DamageBonus' in key and key != 'physicalDamageBonus':
-                    elemental_bonus = round(get_value(stats.get(key, 0)) * 100, 2)
-                    break
-
-            all_profiles.append({
-                'Rank': entry.get('index'),
-                'Player': owner.get('nickname'),
-                'UID': entry.get('uid'),
-                # 'Build_ID': entry.get('_id'),
-                'Region': owner.get('region'),
-                'Weapon': weapon.get('name'),
-                'Refine': get_value(refine_obj) + 1 if refine_obj else None,
-                'HP': round(get_value(stats.get('maxHp', 0))),
-                'ATK': round(get_value(stats.get('atk', 0))),
-                'DEF': round(get_value(stats.get('def', 0))),
-                'EM': round(get_value(stats.get('elementalMastery', 0))),
-                'ER': round(get_value(stats.get('energyRecharge', 0)) * 100, 2),
-                'Crit_Rate': round(get_value(stats.get('critRate', 0)) * 100, 2),
-                'Crit_DMG': round(get_value(stats.get('critDamage', 0)) * 100, 2),
-                'Elem_Bonus': elemental_bonus,
-                'DMG_Result': round(get_value(calc.get('result', 0)))
-            })
-
         # Save
         df = pd.DataFrame(all_profiles)
         df.to_csv(filename, index=False)
@@ -159,6 +362,9 @@ def fetch_leaderboard(calculation_id, limit=MAX_SIZE, timeout=REQUEST_TIMEOUT):
         return all_profiles
 
     except Exception as e:
+        if quiet:
+            logging.exception(f"Leaderboard fetch failed for {calculation_id}")
+            return []
         print(i18n.get("CRASH_MSG", error=e))
         import traceback
         traceback.print_exc()
@@ -0,0 +1,269 @@
+"""
+Columnar analytics over the stored scans and leaderboard datasets.
+
+compact() rewrites the latest artifacts/characters table of every scan folder and
+the leaderboard dataset snapshots (dataset_sink) into Hive-partitioned Parquet:
+
+    <root>/artifacts.v<N>/Slot=<slot>/part-0.parquet      sorted by Set
+    <root>/characters.v<N>/part-0.parquet
+    <root>/leaderboards.v<N>/calc_id=<ID>/part-0.parquet
+
+Each compaction writes a new version directory, then publishes it by replacing the
+<root>/<name>.current pointer file (a single atomic rename): readers always find a
+complete dataset. The previous version is kept for readers still opening it, older
+ones are removed. CompactionScheduler runs compact() periodically (the API starts one).
+
+query() opens them as a pyarrow dataset on a memory-mapped filesystem: only the
+requested columns are read, and filters are pushed down to partition pruning and
+Parquet row-group statistics instead of loading whole CSV files.
+
+    python analytics.py compact [data_root]
+    python analytics.py mean artifacts Crit_Value Set="Emblem of Severed Fate" Slot=Sands
+
+Requires pyarrow.
+"""
+import os
+import sys
+import time
+import shutil
+import logging
+import threading
+from pathlib import Path
+
+import pandas as pd
+
+import delta_log
+import shards
+import locks
+import dataset_sink
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.fs as pafs
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+DATA_ROOT = Path(__file__).resolve().parent / "data"
+ANALYTICS_DIR = os.environ.get('ANALYTICS_DIR', str(DATA_ROOT / "analytics"))
+
+# Dataset -> (partition columns, sort columns)
+LAYOUT = {
+    'artifacts': (['Slot'], ['Set', 'Character']),
+    'characters': ([], ['Character']),
+    'leaderboards': (['calc_id'], ['fetched_at']),
+}
+NUMERIC_COLUMNS = {
+    'Main_Value', 'Crit_Value', 'Sub1_Val', 'Sub2_Val', 'Sub3_Val', 'Sub4_Val',
+    'Level', 'HP', 'ATK', 'DEF', 'EM', 'ER%', 'Crit_Rate%', 'Crit_DMG%', 'Elem_Bonus%', 'Total_CV',
+    'Weapon_Refine', 'Rank', 'Refine', 'DMG_Result', 'ER', 'Crit_Rate', 'Crit_DMG', 'Elem_Bonus', 'fetched_at',
+}
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise RuntimeError("pyarrow is required for the analytics datasets (pip install pyarrow)")
+
+
+def scan_tables(data_root, table):
+    """Latest version of `table` ('artifacts' or 'characters') of every scan folder, with UID/Folder columns."""
+    frames = []
+    for key, folder in shards.iter_scan_folders(data_root):
+        try:
+            df = delta_log.load(str(folder / table))
+        except delta_log.CorruptLogError as e:
+            logging.warning(f"Skipping {key}: {e}")
+            continue
+        if df is None or df.empty:
+            continue
+        frames.append(df.assign(UID=key if shards.UID_RE.match(key) else shards.legacy_uid(folder), Folder=key))
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True)
+
+
+def _to_table(df):
+    """Arrow table with one type per column (numbers where expected, strings otherwise)."""
+    df = df.copy()
+    for col in df.columns:
+        if col in NUMERIC_COLUMNS:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+        elif df[col].dtype == object or str(df[col].dtype) == 'str':
+            df[col] = df[col].map(lambda v: None if pd.isna(v) else str(v))
+    return pa.Table.from_pandas(df, preserve_index=False)
+
+
+def _pointer(root, name):
+    return Path(root) / f"{name}.current"
+
+
+def current_path(name, root=None):
+    """Directory of the published version of dataset `name` (None when it was never compacted)."""
+    root = Path(root or ANALYTICS_DIR)
+    try:
+        version = _pointer(root, name).read_text(encoding='utf-8').strip()
+    except FileNotFoundError:
+        # Published before the versioned layout
+        return root / name if (root / name).is_dir() else None
+    return root / version if version else None
+
+
+def _prune_versions(root, name, keep):
+    """Removes the version directories of `name` older than the `keep` newest ones."""
+    versions = sorted(p for p in root.glob(f"{name}.v*") if p.is_dir())
+    for path in versions[:-keep]:
+        shutil.rmtree(path, ignore_errors=True)
+    if (root / name).is_dir():
+        shutil.rmtree(root / name, ignore_errors=True)
+
+
+def write_dataset(df, name, root=None):
+    """
+    Replaces dataset `name` under `root` with the rows of `df`: the files are written
+    to a new version directory, published by replacing the pointer file.
+    """
+    _require_pyarrow()
+    root = Path(root or ANALYTICS_DIR)
+    partitions, sort_by = LAYOUT[name]
+    staging = root / f"{name}.v{time.time_ns():020d}"
+    root.mkdir(parents=True, exist_ok=True)
+
+    sort_by = [c for c in partitions + sort_by if c in df.columns]
+    if sort_by:
+        df = df.sort_values(sort_by, kind='stable', na_position='last')
+    table = _to_table(df)
+    ds.write_dataset(
+        table, str(staging), format='parquet', basename_template='part-{i}.parquet',
+        partitioning=ds.partitioning(pa.schema([table.schema.field(c) for c in partitions]), flavor='hive')
+        if partitions else None,
+        max_rows_per_group=64 * 1024,
+    )
+
+    pointer = _pointer(root, name)
+    tmp_path = pointer.with_name(f"{pointer.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp_path.write_text(staging.name, encoding='utf-8')
+    os.replace(tmp_path, pointer)
+    _prune_versions(root, name, keep=2)
+    return len(df)
+
+
+def compact(data_root=None, root=None, leaderboard_root=None):
+    """Rebuilds every analytics dataset. Returns {dataset: row count}."""
+    _require_pyarrow()
+    data_root = Path(data_root or DATA_ROOT)
+    root = Path(root or ANALYTICS_DIR)
+    leaderboard_root = leaderboard_root or data_root / "datasets" / "leaderboards"
+    counts = {}
+    root.mkdir(parents=True, exist_ok=True)
+    # One compaction at a time (the API scheduler and the CLI may overlap)
+    with locks.file_lock(root / ".compact.lock"):
+        for table in ('artifacts', 'characters'):
+            df = scan_tables(data_root, table)
+            if not df.empty:
+                counts[table] = write_dataset(df, table, root)
+        leaderboards = dataset_sink.LeaderboardDatasetSink(leaderboard_root).read()
+        if not leaderboards.empty:
+            counts['leaderboards'] = write_dataset(leaderboards, 'leaderboards', root)
+    logging.info(f"Analytics datasets compacted: {counts}")
+    return counts
+
+
+def open_dataset(name, root=None):
+    """pyarrow dataset over memory-mapped Parquet files (None when it was never compacted)."""
+    _require_pyarrow()
+    path = current_path(name, root)
+    if path is None or not path.is_dir():
+        return None
+    return ds.dataset(str(path), format='parquet', partitioning='hive',
+                      filesystem=pafs.LocalFileSystem(use_mmap=True))
+
+
+class CompactionScheduler:
+    """Runs compact() every `interval` seconds on a daemon thread."""
+    def __init__(self, data_root=None, root=None, interval=6 * 3600):
+        self.data_root = data_root
+        self.root = root
+        self.interval = interval
+        self.last_run = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                compact(self.data_root, self.root)
+                self.last_run = time.time()
+            except Exception:
+                logging.exception("Analytics compaction failed")
+            self._stop.wait(self.interval)
+
+    def start(self):
+        if self._thread is None and pa is not None and self.interval > 0:
+            self._thread = threading.Thread(target=self._loop, name="analytics-compaction", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+def _expression(filters):
+    """[(column, op, value), ...] (AND-ed) -> dataset expression."""
+    if not filters:
+        return None
+    return pq.filters_to_expression([tuple(f) for f in filters])
+
+
+def query(name, columns=None, filters=None, root=None):
+    """Rows of a dataset as a DataFrame, reading only `columns` and the fragments matching `filters`."""
+    dataset = open_dataset(name, root)
+    if dataset is None:
+        return pd.DataFrame(columns=columns or [])
+    return dataset.to_table(columns=columns, filter=_expression(filters)).to_pandas()
+
+
+def aggregate(name, column, filters=None, by=None, root=None):
+    """
+    Mean / count / min / max of `column` over the filtered rows, grouped by the `by` columns.
+    E.g. aggregate('artifacts', 'Crit_Value', [('Set', '==', 'Emblem of Severed Fate'), ('Slot', '==', 'Sands')])
+    """
+    by = list(by or [])
+    dataset = open_dataset(name, root)
+    if dataset is None:
+        return pd.DataFrame()
+    table = dataset.to_table(columns=by + [column], filter=_expression(filters))
+    if not by:
+        values = table.column(column)
+        return pd.DataFrame([{
+            'count': pc.count(values).as_py(),
+            'mean': pc.mean(values).as_py(),
+            'min': pc.min(values).as_py(),
+            'max': pc.max(values).as_py(),
+        }])
+    result = table.group_by(by).aggregate([(column, 'count'), (column, 'mean'), (column, 'min'), (column, 'max')])
+    return result.to_pandas().rename(columns=lambda c: c.replace(f"{column}_", ''))
+
+
+def _parse_filter(arg):
+    column, value = arg.split('=', 1)
+    try:
+        value = float(value)
+    except ValueError:
+        pass
+    return (column, '==', value)
+
+
+def main(argv):
+    if len(argv) >= 1 and argv[0] == 'compact':
+        print(compact(argv[1] if len(argv) > 1 else None))
+    elif len(argv) >= 3 and argv[0] == 'mean':
+        print(aggregate(argv[1], argv[2], [_parse_filter(a) for a in argv[3:]]).to_string(index=False))
+    else:
+        print(__doc__)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -3,9 +3,11 @@ import os
 import re
 import time
 from functools import partial
+from contextlib import asynccontextmanager
 from typing import Any, Dict, List, Optional
-from fastapi import FastAPI, HTTPException, Request, Depends
+from fastapi import FastAPI, HTTPException, Request, Depends, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, FileResponse, Response
 from pydantic import BaseModel
 import time
 from collections import defaultdict
@@ -13,6 +15,11 @@ from google import genai
 import ollama as ollama_client
 import shutil
 import logging
+import json
+import gzip
+import threading
+from email.utils import parsedate_to_datetime
+import uuid
 
 # Ollama configuration
 OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://host.docker.internal:11434")
@@ -29,9 +36,41 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import enka
 import akasha
 import leaderboard
+import task_queue
+import dataset_sink
+import scan_db
+import raw_store
+import manifest
+import shards
+import locks
+import write_behind
+import delta_log
+import analytics
 from backend import logic
-
-app = FastAPI(title="Genshin AI Mentor API")
+from backend import jobs
+from backend import benchmarks
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    benchmark_scheduler.start()
+    analytics_scheduler.start()
+    if leaderboard_sink is not None:
+        leaderboard_sink.start()
+    if scan_writer is not None:
+        scan_writer.start()
+    threading.Thread(target=prepare_data_root, name="data-root-maintenance", daemon=True).start()
+    yield
+    # Stop background work on shutdown
+    benchmark_scheduler.stop()
+    analytics_scheduler.stop()
+    job_manager.shutdown()
+    if leaderboard_sink is not None:
+        leaderboard_sink.stop()
+    if scan_writer is not None:
+        # Scans not written within the timeout stay spooled and are replayed on the next start
+        scan_writer.close(timeout=float(os.getenv("SCAN_WRITE_DRAIN_TIMEOUT", "30")))
+
+app = FastAPI(title="Genshin AI Mentor API", lifespan=lifespan)
 
 # Basic logging
 logging.basicConfig(level=logging.INFO)
@@ -88,6 +127,65 @@ scan_limiter = RateLimiter(limit=5, window=60)      # 5 scans per minute
 analyze_limiter = RateLimiter(limit=10, window=60)  # 10 analysis per minute
 chat_limiter = RateLimiter(limit=20, window=60)     # 20 chat messages per minute
 verify_limiter = RateLimiter(limit=5, window=60)    # 5 key verifications per minute
+job_limiter = RateLimiter(limit=10, window=60)      # 10 deep leaderboard jobs per minute
+stream_limiter = RateLimiter(limit=10, window=60)   # 10 deep leaderboard streams per minute
+
+# Deep leaderboard builds run here instead of holding an HTTP connection open.
+# With ENRICH_QUEUE_PATH set, the Enka fetches are done by worker.py processes.
+job_manager = jobs.JobManager(
+    max_workers=int(os.getenv("DEEP_JOB_WORKERS", "2")),
+    max_pending=int(os.getenv("DEEP_JOB_MAX_PENDING", "20")),
+    queue=task_queue.TaskQueue(os.environ["ENRICH_QUEUE_PATH"]) if os.getenv("ENRICH_QUEUE_PATH") else None,
+)
+
+# With LEADERBOARD_DATASET=on, the leaderboards fetched by the API are kept in a columnar dataset
+# for later analytics: buffered in memory, flushed and compacted in the background
+leaderboard_sink = (
+    dataset_sink.BufferedDatasetSink(
+        dataset_sink.LeaderboardDatasetSink(DATA_ROOT / "datasets" / "leaderboards"),
+        flush_interval=int(os.getenv("LEADERBOARD_DATASET_FLUSH", "300")),
+    )
+    if os.getenv("LEADERBOARD_DATASET", "off").lower() in ("1", "on", "true") else None
+)
+
+# Every persisted scan is indexed in SQLite; the /data endpoints query it instead of walking DATA_ROOT
+scan_repository = scan_db.ScanRepository(DATA_ROOT / "scans.db")
+manifest_index = manifest.ManifestIndex(DATA_ROOT)
+
+# /scan returns as soon as the data is parsed; the scans are persisted in order by a background
+# writer (SCAN_WRITE_BEHIND=off writes them before answering instead)
+scan_writer = (
+    write_behind.ScanWriter(DATA_ROOT, repository=scan_repository,
+                            max_pending=int(os.getenv("SCAN_WRITE_MAX_PENDING", "32")))
+    if os.getenv("SCAN_WRITE_BEHIND", "on").lower() not in ("0", "off", "false") else None
+)
+
+def prepare_data_root():
+    """
+    Startup maintenance: move flat-layout folders to their UID shard, compress legacy
+    raw.json snapshots, then index the folders missing from the database and rebuild
+    the manifest index (folders may have changed while the API was down).
+    """
+    shards.migrate(DATA_ROOT, repository=scan_repository, index=manifest_index)
+    raw_store.migrate_all(DATA_ROOT)
+    scan_db.backfill(scan_repository, DATA_ROOT)
+    manifest_index.rebuild()
+
+# Popular leaderboards refreshed in the background into per-character benchmark tables.
+# BENCHMARK_CALC_IDS is a comma separated list of Akasha calculation IDs.
+benchmark_store = benchmarks.BenchmarkStore(DATA_ROOT / "benchmarks")
+benchmark_scheduler = benchmarks.BenchmarkScheduler(
+    benchmark_store,
+    [c.strip() for c in os.getenv("BENCHMARK_CALC_IDS", "").split(",") if CALC_ID_PATTERN.match(c.strip())],
+    interval=int(os.getenv("BENCHMARK_INTERVAL", str(6 * 3600))),
+    limit=int(os.getenv("BENCHMARK_LIMIT", "100")),
+)
+
+# Analytics datasets (analytics.py) rebuilt in the background when pyarrow is installed.
+# ANALYTICS_INTERVAL=0 disables it.
+analytics_scheduler = analytics.CompactionScheduler(
+    DATA_ROOT, interval=int(os.getenv("ANALYTICS_INTERVAL", str(6 * 3600))),
+)
 
 class VerifyKeyRequest(BaseModel):
     api_key: str
@@ -101,6 +199,13 @@ class AnalyzeRequest(BaseModel):
     build_notes: Optional[str] = None
     provider: Optional[str] = "ollama"  # "ollama" or "gemini"
 
+class DeepJobRequest(BaseModel):
+    calc_id: str
+    character: str
+    limit: int = 20
+    shallow: bool = False
+    incremental: bool = False
+
 class ChatRequest(BaseModel):
     api_key: Optional[str] = None
     user_data: List[Dict[str, Any]]
@@ -212,7 +317,8 @@ async def scan_uid(uid: str):
         # This is a bit "hacky" but safer than rewriting the whole large script right now.
         
         api_data, error = await anyio.to_thread.run_sync(
-            partial(enka.fetch_player_data, uid, output_root=DATA_ROOT)
+            partial(enka.fetch_player_data, uid, output_root=DATA_ROOT, repository=scan_repository,
+                    writer=scan_writer)
         )
         
         if error:
@@ -220,7 +326,9 @@ async def scan_uid(uid: str):
              print(f"Scan failed for {uid}: {error}")
              raise HTTPException(status_code=500, detail=f"Scan failed: {error}")
              
-        return {"data": api_data}
+        if scan_writer is None:
+            return {"data": api_data, "persistence": {"uid": uid, "state": "saved"}}
+        return {"data": api_data, "persistence": scan_writer.status(uid)}
         
     except HTTPException as e:
         raise e
@@ -229,6 +337,23 @@ async def scan_uid(uid: str):
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
 
+@app.get("/scan/writer/stats")
+async def get_scan_writer_stats():
+    """Queue depth and counters of the write-behind scan writer."""
+    if scan_writer is None:
+        return {"enabled": False}
+    return {"enabled": True, **scan_writer.stats()}
+
+@app.get("/scan/{uid}/status")
+async def get_scan_status(uid: str):
+    """Persistence status of the last scan of a player: pending, saved or failed (with the error)."""
+    if not UID_PATTERN.match(uid):
+        raise HTTPException(status_code=400, detail="Invalid UID format")
+    status = scan_writer.status(uid) if scan_writer is not None else None
+    if status is None:
+        raise HTTPException(status_code=404, detail="No scan submitted for this UID since the server started")
+    return status
+
 @app.get("/leaderboard/{calc_id}")
 async def get_leaderboard(calc_id: str):
     """
@@ -240,7 +365,7 @@ async def get_leaderboard(calc_id: str):
     try:
         # fetch_leaderboard now returns the full list of dicts with stats
         data = await anyio.to_thread.run_sync(
-            partial(akasha.fetch_leaderboard, calc_id, limit=20)
+            partial(akasha.fetch_leaderboard, calc_id, limit=20, quiet=True, sink=leaderboard_sink)
         )
         try:
             ln = len(data) if data is not None and hasattr(data, '__len__') else 'unknown'
@@ -256,14 +381,27 @@ async def get_leaderboard(calc_id: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def validate_sampling(tolerance: Optional[float], order: str):
+    if tolerance is not None and not 0 < tolerance < 1:
+        raise HTTPException(status_code=400, detail="Tolerance must be between 0 and 1")
+    if order not in ("rank", "stratified"):
+        raise HTTPException(status_code=400, detail="Invalid sampling order")
+
 @app.get("/leaderboard/deep/{calc_id}")
-async def get_leaderboard_deep(calc_id: str, character: str, limit: int = 20):
+async def get_leaderboard_deep(calc_id: str, character: str, limit: int = 20, shallow: bool = False,
+                               incremental: bool = False, tolerance: Optional[float] = None, order: str = "rank"):
     """
     Fetches leaderboard entries, then enriches with Enka data and filters to a single character.
+    `shallow=true` builds the rows from Akasha's stats and set bonuses, calling Enka only when Akasha lacks them.
+    `incremental=true` (refreshes) reuses the rows of entries unchanged since the previous build
+    and saves a snapshot for the next one; one-off builds write nothing.
+    `tolerance` stops sampling once the stat averages are that precise (relative 95% CI, e.g. 0.02).
     """
     if not CALC_ID_PATTERN.match(calc_id):
         raise HTTPException(status_code=400, detail="Invalid Calculation ID format")
 
+    validate_sampling(tolerance, order)
+
     if not character:
         raise HTTPException(status_code=400, detail="Character name required")
     try:
@@ -272,7 +410,11 @@ async def get_leaderboard_deep(calc_id: str, character: str, limit: int = 20):
                 leaderboard.fetch_leaderboard_character,
                 calc_id,
                 character,
-                limit=limit
+                limit=limit,
+                shallow=shallow,
+                incremental=incremental,
+                tolerance=tolerance,
+                order=order,
             )
         )
         try:
@@ -289,6 +431,196 @@ async def get_leaderboard_deep(calc_id: str, character: str, limit: int = 20):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# Stop signals for running deep streams (stream_id -> threading.Event)
+deep_streams: Dict[str, threading.Event] = {}
+# Each open stream holds a worker thread while it waits for the next row: stay well under
+# anyio's thread pool (40 threads by default) so /scan and the other to_thread calls keep running
+MAX_DEEP_STREAMS = int(os.getenv("MAX_DEEP_STREAMS", "16"))
+
+def format_stream_event(event: Dict[str, Any], fmt: str) -> str:
+    """Serializes a leaderboard event as one NDJSON line or one SSE message."""
+    payload = json.dumps(event, ensure_ascii=False, default=str)
+    if fmt == "sse":
+        return f"event: {event.get('event', 'message')}\ndata: {payload}\n\n"
+    return payload + "\n"
+
+@app.get("/leaderboard/deep/{calc_id}/stream", dependencies=[Depends(stream_limiter)])
+async def stream_leaderboard_deep(calc_id: str, character: str, limit: int = 20,
+                                  max_rows: Optional[int] = None, format: str = "ndjson", shallow: bool = False,
+                                  incremental: bool = False, tolerance: Optional[float] = None, order: str = "rank"):
+    """
+    Streaming variant of /leaderboard/deep.
+    Emits each enriched row as soon as its Enka fetch finishes, followed by progress and summary events.
+    The scan stops early when the client disconnects, when `max_rows` rows were sent,
+    or when DELETE /leaderboard/deep/stream/{stream_id} is called.
+    """
+    if not CALC_ID_PATTERN.match(calc_id):
+        raise HTTPException(status_code=400, detail="Invalid Calculation ID format")
+
+    if not character:
+        raise HTTPException(status_code=400, detail="Character name required")
+
+    if format not in ("ndjson", "sse"):
+        raise HTTPException(status_code=400, detail="Invalid stream format")
+
+    if not 1 <= limit <= 100:
+        raise HTTPException(status_code=400, detail="Limit must be between 1 and 100")
+
+    validate_sampling(tolerance, order)
+
+    if len(deep_streams) >= MAX_DEEP_STREAMS:
+        raise HTTPException(status_code=429, detail="Too many running deep scans. Please try again later.")
+
+    stream_id = uuid.uuid4().hex
+    stop_event = threading.Event()
+    events = leaderboard.iter_leaderboard_character(
+        calc_id,
+        character,
+        limit=limit,
+        stop_event=stop_event,
+        max_rows=max_rows,
+        shallow=shallow,
+        incremental=incremental,
+        tolerance=tolerance,
+        order=order,
+    )
+
+    async def event_stream():
+        # Registered only once the body is being sent: the finally below then always runs,
+        # even when the client is gone before the first chunk
+        deep_streams[stream_id] = stop_event
+        try:
+            yield format_stream_event({"event": "stream", "stream_id": stream_id}, format)
+            while True:
+                event = await anyio.to_thread.run_sync(next, events, None)
+                if event is None:
+                    break
+                yield format_stream_event(event, format)
+        except Exception as e:
+            logging.exception(f"Deep stream failed for id={calc_id}")
+            yield format_stream_event({"event": "error", "detail": str(e)}, format)
+        finally:
+            # Client disconnects cancel this generator: make sure the worker stops too
+            stop_event.set()
+            deep_streams.pop(stream_id, None)
+            events.close()
+            logging.info(f"Deep stream {stream_id} for id={calc_id}, character={character} closed")
+
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    return StreamingResponse(event_stream(), media_type=media_type, headers={"Cache-Control": "no-cache"})
+
+@app.delete("/leaderboard/deep/stream/{stream_id}")
+async def stop_leaderboard_deep_stream(stream_id: str):
+    """Early-stop signal for a running deep stream. Rows already sent are kept by the client."""
+    stop_event = deep_streams.get(stream_id)
+    if not stop_event:
+        raise HTTPException(status_code=404, detail="Stream not found")
+    stop_event.set()
+    return {"success": True, "stream_id": stream_id}
+
+# --- DEEP LEADERBOARD JOBS ---
+
+def get_job_or_404(job_id: str) -> jobs.DeepLeaderboardJob:
+    job = job_manager.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.post("/jobs/leaderboard/deep", dependencies=[Depends(job_limiter)])
+async def create_deep_leaderboard_job(request: DeepJobRequest):
+    """
+    Starts a deep leaderboard build in the background and returns its ID immediately.
+    An identical running job (or a recent finished one) is reused instead of starting a new fetch.
+    """
+    if not CALC_ID_PATTERN.match(request.calc_id):
+        raise HTTPException(status_code=400, detail="Invalid Calculation ID format")
+
+    if not request.character:
+        raise HTTPException(status_code=400, detail="Character name required")
+
+    if not 1 <= request.limit <= 100:
+        raise HTTPException(status_code=400, detail="Limit must be between 1 and 100")
+
+    try:
+        job, reused = job_manager.submit(request.calc_id, request.character, request.limit, shallow=request.shallow,
+                                         incremental=request.incremental)
+    except OverflowError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+
+    logging.info(f"POST /jobs/leaderboard/deep {request.calc_id}/{request.character} -> job={job.id} reused={reused}")
+    return {"job_id": job.id, "status": job.status, "reused": reused}
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, offset: int = 0):
+    """Polls a job. Rows before `offset` are omitted so clients only fetch what is new."""
+    job = get_job_or_404(job_id)
+    return job.to_dict(offset=max(offset, 0))
+
+@app.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str, offset: int = 0):
+    """
+    Subscribes to a job as NDJSON: one 'row' event per new row and a 'status'
+    event whenever progress changes, until the job is finished.
+    """
+    job = get_job_or_404(job_id)
+
+    async def event_stream():
+        sent = max(offset, 0)
+        version = -1
+        while True:
+            snapshot = job.to_dict(offset=sent)
+            if snapshot["version"] != version:
+                version = snapshot["version"]
+                for row in snapshot.pop("rows"):
+                    yield json.dumps({"event": "row", "data": row}, ensure_ascii=False, default=str) + "\n"
+                sent = snapshot["total_rows"]
+                yield json.dumps({"event": "status", **snapshot}, ensure_ascii=False, default=str) + "\n"
+            if snapshot["status"] in jobs.FINISHED_STATES:
+                break
+            # Polling the in-memory job keeps subscribers off the worker thread pool
+            await anyio.sleep(0.5)
+
+    return StreamingResponse(event_stream(), media_type="application/x-ndjson", headers={"Cache-Control": "no-cache"})
+
+@app.get("/jobs/workers/stats")
+async def get_worker_stats():
+    """Queue depth and per-worker throughput when enrichment runs in worker processes."""
+    if job_manager.queue is None:
+        return {"enabled": False}
+    stats = await anyio.to_thread.run_sync(job_manager.queue.stats)
+    return {"enabled": True, **stats}
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    job = get_job_or_404(job_id)
+    job_manager.cancel(job_id)
+    return {"job_id": job.id, "status": job.status, "cancelling": not job.finished}
+
+@app.get("/benchmarks")
+async def list_benchmarks():
+    """Characters with a materialized benchmark table."""
+    tables = await anyio.to_thread.run_sync(benchmark_store.list)
+    return {"benchmarks": [
+        {"character": t["character"], "sample_size": t["sample_size"], "sources": t["sources"], "updated": t["updated"]}
+        for t in tables
+    ]}
+
+@app.get("/benchmarks/{character}")
+async def get_benchmark(character: str):
+    table = await anyio.to_thread.run_sync(benchmark_store.get, character)
+    if not table:
+        raise HTTPException(status_code=404, detail="No benchmark for this character")
+    return table
+
+async def context_benchmark(context_data, character: str):
+    """
+    Benchmark table of the character, only used when the client sent no leaderboard data:
+    the leaderboard it picked always takes precedence over the pooled tables.
+    """
+    if context_data:
+        return None
+    return await anyio.to_thread.run_sync(benchmark_store.get, character)
+
 @app.post("/analyze", dependencies=[Depends(analyze_limiter)])
 async def analyze_build(request: AnalyzeRequest):
     """
@@ -311,7 +643,7 @@ async def analyze_build(request: AnalyzeRequest):
         raise HTTPException(status_code=400, detail="API Key required for Gemini")
 
     # 1. Logic
-    context_summary = logic.prepare_context(context_data)
+    context_summary = logic.prepare_context(context_data, benchmark=await context_benchmark(context_data, target_char_name))
     inventory, error = logic.prepare_inventory(user_data, target_char_name)
     
     if error:
@@ -418,7 +750,7 @@ async def chat_build(request: ChatRequest):
     if provider == "gemini" and not api_key:
         raise HTTPException(status_code=400, detail="API Key required for Gemini")
 
-    context_summary = logic.prepare_context(context_data)
+    context_summary = logic.prepare_context(context_data, benchmark=await context_benchmark(context_data, target_char_name))
     inventory, error = logic.prepare_inventory(user_data, target_char_name)
     if error:
         raise HTTPException(status_code=400, detail=error)
@@ -468,42 +800,56 @@ async def chat_build(request: ChatRequest):
 @app.get("/data/list")
 def list_data_folders():
     """
-    Lists all directory folders that look like scan data.
-    Filters out system/project directories.
+    Lists the scan folders recorded in the scan database, with the table versions
+    and row counts of their manifests (one read of the root index).
     """
-    root = DATA_ROOT
-    folders = []
     try:
-        for item in root.iterdir():
-            if item.is_dir() and not item.name.startswith("."):
-                # Simple heuristic: scan folders usually have _ or numbers, but we'll list all non-ignored dirs
-                # We can check if they contain 'raw.json' to be sure it's a scan folder
-                if (item / "raw.json").exists() or (item / "characters_v1.csv").exists():
-                    stats = item.stat()
-                    folders.append({
-                        "name": item.name,
-                        "created": stats.st_ctime,
-                    })
+        manifests = manifest_index.folders()
+        folders = []
+        for f in scan_repository.folders():
+            tables = manifests.get(f["folder"], {}).get("tables", {})
+            folders.append({
+                "name": f["folder"], "created": f["created"], "updated": f["updated"], "uid": f["uid"],
+                "scans": f["scans"],
+                "nickname": manifests.get(f["folder"], {}).get("nickname"),
+                "versions": {name: t.get("version") for name, t in tables.items()},
+                "rows": {name: t.get("rows") for name, t in tables.items()},
+            })
     except Exception as e:
          raise HTTPException(status_code=500, detail=str(e))
          
     return {"folders": folders}
 
+@app.get("/data/artifacts")
+def find_stored_artifacts(set_name: Optional[str] = Query(None, alias="set"), slot: Optional[str] = None,
+                          main_stat: Optional[str] = None, character: Optional[str] = None,
+                          uid: Optional[str] = None, limit: int = 100):
+    """
+    Artifacts of the latest scan of every stored player, filtered through the indexed columns.
+    """
+    if uid is not None and not UID_PATTERN.match(uid):
+        raise HTTPException(status_code=400, detail="Invalid UID format")
+    limit = max(1, min(limit, 1000))
+    artifacts = scan_repository.find_artifacts(
+        limit=limit, set_name=set_name, slot=slot, main_stat=main_stat, character=character, uid=uid,
+    )
+    return {"artifacts": artifacts, "count": len(artifacts)}
+
 @app.delete("/data/delete/{folder_name}")
 def delete_data_folder(folder_name: str):
     path = resolve_data_path(folder_name)
-    # Security check: prevent deleting root or outside dirs
-    if not path.exists() or not path.is_dir():
+    # resolve_data_path keeps us inside DATA_ROOT; the folder must be known or on disk
+    if not scan_repository.has_folder(folder_name) and not path.is_dir():
         raise HTTPException(status_code=404, detail="Folder not found")
-        
-    # Extra safety: check if it looks like a scan folder
-    if not ((path / "raw.json").exists() or (path / "characters_v1.csv").exists() or "Mondo" in folder_name): # fallback check
-         # Allow deleting if user really renamed it to something else, but maybe warn?
-         # For MVP, we trust the list_data_folders output.
-         pass
 
     try:
-        shutil.rmtree(path)
+        # A scan of the same player cannot write into the folder while it is removed
+        with locks.uid_lock(shards.folder_uid(folder_name, path), DATA_ROOT):
+            if path.is_dir():
+                shutil.rmtree(path)
+                shards.remove_empty_parents(path, DATA_ROOT)
+            scan_repository.delete_folder(folder_name)
+            manifest_index.remove(folder_name)
         return {"success": True, "message": f"Deleted {folder_name}"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -516,15 +862,22 @@ class RenameRequest(BaseModel):
 def rename_data_folder(request: RenameRequest):
     old_path = resolve_data_path(request.old_name)
     new_path = resolve_data_path(request.new_name)
-    
+
+    if shards.UID_RE.match(request.old_name):
+        raise HTTPException(status_code=400, detail="Sharded scan folders are named after their UID")
+
     if not old_path.exists():
         raise HTTPException(status_code=404, detail="Source folder not found")
         
-    if new_path.exists():
+    if new_path.exists() or scan_repository.has_folder(request.new_name):
         raise HTTPException(status_code=400, detail="Destination folder already exists")
         
     try:
-        os.rename(old_path, new_path)
+        with locks.uid_lock(shards.folder_uid(request.old_name, old_path), DATA_ROOT):
+            new_path.parent.mkdir(parents=True, exist_ok=True)
+            os.rename(old_path, new_path)
+            scan_repository.rename_folder(request.old_name, request.new_name)
+            manifest_index.rename(request.old_name, request.new_name)
         return {"success": True, "message": f"Renamed to {request.new_name}"}
     except Exception as e:
          raise HTTPException(status_code=500, detail=str(e))
@@ -533,18 +886,113 @@ def rename_data_folder(request: RenameRequest):
 def clear_data_folders():
     deleted = 0
     try:
-        for item in DATA_ROOT.iterdir():
-            if item.is_dir() and not item.name.startswith("."):
-                shutil.rmtree(item)
-                deleted += 1
+        # Only the scan folders: benchmark tables, datasets and databases live under DATA_ROOT too
+        for key, folder in list(shards.iter_scan_folders(DATA_ROOT)):
+            with locks.uid_lock(shards.folder_uid(key, folder), DATA_ROOT):
+                shutil.rmtree(folder)
+                shards.remove_empty_parents(folder, DATA_ROOT)
+            deleted += 1
+        scan_repository.clear()
+        manifest_index.clear()
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     return {"success": True, "deleted": deleted}
 
+STORED_TABLES = ("combined", "characters", "artifacts")
+EXPORT_MEDIA_TYPES = {"json": "application/json", "csv": "text/csv; charset=utf-8"}
+
+def is_not_modified(request: Request, response: Response) -> bool:
+    """Conditional GET: If-None-Match (ETag), else If-Modified-Since (Last-Modified)."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        etag = response.headers.get("etag")
+        tags = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and "last-modified" in response.headers:
+        try:
+            return parsedate_to_datetime(if_modified_since) >= parsedate_to_datetime(response.headers["last-modified"])
+        except (TypeError, ValueError):
+            return False
+    return False
+
+def stored_file_response(request: Request, path, media_type: str, headers: Optional[Dict[str, str]] = None):
+    """
+    Serves a stored file as is: sendfile when the server supports it, byte ranges and
+    ETag/Last-Modified validators (304 on a matching conditional request).
+    """
+    try:
+        stat_result = os.stat(path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="File not found")
+    response = FileResponse(path, media_type=media_type, stat_result=stat_result,
+                            headers={"Cache-Control": "no-cache", **(headers or {})})
+    if is_not_modified(request, response):
+        kept = ("etag", "last-modified", "cache-control", "vary", "content-encoding", "x-table-version")
+        return Response(status_code=304, headers={k: v for k, v in response.headers.items() if k in kept})
+    return response
+
+def resolve_scan_folder(folder_name: str) -> Path:
+    path = resolve_data_path(folder_name)
+    if not path.is_dir():
+        raise HTTPException(status_code=404, detail="Folder not found")
+    return path
+
+@app.get("/data/{folder_name}/raw")
+def get_stored_raw(folder_name: str, request: Request):
+    """
+    The stored Enka snapshot of a scan folder, straight from disk.
+    Compressed snapshots are sent as gzip-encoded JSON lines (first line: playerInfo and
+    the other top-level fields, then one avatar per line), decompressed by the client;
+    folders not migrated yet send their raw.json.
+    """
+    path = resolve_scan_folder(folder_name)
+    raw_path = raw_store.raw_path(path)
+    if raw_path is None:
+        raise HTTPException(status_code=404, detail="No raw snapshot stored for this folder")
+    if raw_path.name == raw_store.LEGACY_RAW_FILE:
+        return stored_file_response(request, raw_path, "application/json")
+    if "gzip" in request.headers.get("accept-encoding", ""):
+        return stored_file_response(request, raw_path, "application/x-ndjson",
+                                    headers={"Content-Encoding": "gzip", "Vary": "Accept-Encoding"})
+
+    # Rare clients without gzip support: decompressed on the fly (no ranges)
+    def lines():
+        with gzip.open(raw_path, "rb") as f:
+            yield from f
+    return StreamingResponse(lines(), media_type="application/x-ndjson", headers={"Vary": "Accept-Encoding"})
+
+@app.get("/data/{folder_name}/tables/{table}")
+def get_stored_table(folder_name: str, table: str, request: Request, version: Optional[int] = None,
+                     format: str = "json"):
+    """
+    A stored table (the latest version by default) as JSON records or CSV, served from a
+    per-version export file written on first request.
+    """
+    if table not in STORED_TABLES:
+        raise HTTPException(status_code=404, detail="Unknown table")
+    if format not in EXPORT_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail="Format must be json or csv")
+    folder = resolve_scan_folder(folder_name)
+    base_name = str(folder / table)
+    version = version or enka.get_current_version(base_name)[0]
+    # Exports are written under the folder lock, like the scans that add versions
+    lock = locks.uid_lock(shards.folder_uid(folder_name, folder), DATA_ROOT)
+    try:
+        export = delta_log.cached_export(base_name, version, format, lock=lock) if version > 0 else None
+    except delta_log.CorruptLogError as e:
+        logging.error(str(e))
+        raise HTTPException(status_code=500, detail="Stored table is corrupt")
+    if export is None:
+        raise HTTPException(status_code=404, detail="Table version not found")
+    return stored_file_response(request, export, EXPORT_MEDIA_TYPES[format],
+                                headers={"X-Table-Version": str(version)})
+
 def resolve_data_path(name: str) -> Path:
+    """Folder of a folder key: a UID resolves to its shard directly, other names are flat-layout folders."""
     if not SAFE_FOLDER_RE.match(name):
         raise HTTPException(status_code=400, detail="Invalid folder name")
-    path = (DATA_ROOT / name).resolve()
+    path = shards.folder_path(DATA_ROOT, name).resolve()
     if DATA_ROOT not in path.parents:
         raise HTTPException(status_code=400, detail="Invalid folder path")
     return path
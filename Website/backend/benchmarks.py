@@ -0,0 +1,183 @@
+"""
+Materialized per-character benchmark tables.
+
+A background scheduler refreshes a configured set of popular Akasha leaderboards
+and aggregates them into one small JSON table per character (stat means and
+quantiles, weapon and artifact set distributions). The analyze and chat
+endpoints read these tables from memory instead of re-fetching and
+re-aggregating leaderboard rows on every request.
+"""
+import os
+import re
+import json
+import time
+import threading
+import logging
+
+import pandas as pd
+
+import akasha
+
+STAT_COLUMNS = ['HP', 'ATK', 'DEF', 'EM', 'ER', 'Crit_Rate', 'Crit_DMG', 'Elem_Bonus']
+QUANTILES = [0.1, 0.25, 0.5, 0.75, 0.9]
+TOP_N = 5
+
+
+def character_key(name: str) -> str:
+    """'Raiden Shogun' -> 'raidenshogun'. Used for lookups and file names."""
+    return re.sub(r'[^a-z0-9]', '', str(name).lower())
+
+
+def _distribution(values):
+    series = pd.Series([v for v in values if v])
+    if series.empty:
+        return []
+    shares = series.value_counts(normalize=True).head(TOP_N)
+    return [{"name": name, "share": round(float(share), 3)} for name, share in shares.items()]
+
+
+def build_table(character: str, rows, sources=()):
+    """Aggregates leaderboard rows (akasha.parse_entry format) into a benchmark table."""
+    df = pd.DataFrame(rows)
+    stats = {}
+    for col in STAT_COLUMNS:
+        if col not in df:
+            continue
+        values = pd.to_numeric(df[col], errors='coerce').dropna()
+        if values.empty:
+            continue
+        quantiles = values.quantile(QUANTILES)
+        stats[col] = {
+            "mean": round(float(values.mean()), 2),
+            **{f"p{int(q * 100)}": round(float(v), 2) for q, v in quantiles.items()},
+        }
+
+    return {
+        "character": character,
+        "key": character_key(character),
+        "sample_size": len(df),
+        "sources": list(sources),
+        "updated": time.time(),
+        "stats": stats,
+        "weapons": _distribution(df['Weapon'] if 'Weapon' in df else []),
+        "sets": _distribution(df['Artifact_Sets'] if 'Artifact_Sets' in df else []),
+    }
+
+
+class BenchmarkStore:
+    """
+    One JSON file per character under `root`, mirrored in memory.
+    get() is a dict lookup; files written by another process are picked up
+    through their modification time.
+    """
+    def __init__(self, root):
+        self.root = str(root)
+        self._tables = {}
+        self._mtimes = {}
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        return os.path.join(self.root, f"{key}.json")
+
+    def get(self, character: str):
+        key = character_key(character)
+        path = self._path(key)
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return None
+
+        with self._lock:
+            if self._mtimes.get(key) == mtime:
+                return self._tables[key]
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                table = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logging.warning(f"Unreadable benchmark table {path}: {e}")
+            return None
+        with self._lock:
+            self._tables[key] = table
+            self._mtimes[key] = mtime
+        return table
+
+    def save(self, table):
+        os.makedirs(self.root, exist_ok=True)
+        path = self._path(table["key"])
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(table, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._tables[table["key"]] = table
+            self._mtimes[table["key"]] = os.path.getmtime(path)
+
+    def list(self):
+        if not os.path.isdir(self.root):
+            return []
+        keys = sorted(name[:-5] for name in os.listdir(self.root) if name.endswith(".json"))
+        return [table for table in (self.get(key) for key in keys) if table]
+
+
+class BenchmarkScheduler:
+    """
+    Refreshes the configured leaderboards every `interval` seconds on a daemon thread.
+    Leaderboards of the same character are pooled into one table.
+    """
+    def __init__(self, store: BenchmarkStore, calc_ids, interval: int = 6 * 3600, limit: int = 100):
+        self.store = store
+        self.calc_ids = list(calc_ids)
+        self.interval = interval
+        self.limit = limit
+        self.last_run = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def refresh_once(self):
+        """Fetches every configured leaderboard and rewrites the affected tables."""
+        pooled = {}
+        for calc_id in self.calc_ids:
+            if self._stop.is_set():
+                break
+            try:
+                entries, state = akasha.fetch_leaderboard_pages(calc_id, limit=self.limit)
+            except Exception:
+                logging.exception(f"Benchmark refresh failed for {calc_id}")
+                continue
+            if not entries:
+                logging.warning(f"Benchmark refresh: no data for {calc_id}")
+                continue
+
+            character = entries[0].get('name') or calc_id
+            group = pooled.setdefault(character_key(character), {
+                "character": character, "rows": [], "sources": [], "uids": set(),
+            })
+            group["sources"].append(calc_id)
+            for entry in entries:
+                # A player on two leaderboards of the same character counts once
+                if entry.get('uid') and entry['uid'] in group["uids"]:
+                    continue
+                group["uids"].add(entry.get('uid'))
+                group["rows"].append(akasha.parse_entry(entry))
+
+        tables = []
+        for group in pooled.values():
+            table = build_table(group["character"], group["rows"], group["sources"])
+            self.store.save(table)
+            tables.append(table)
+            logging.info(f"Benchmark table {table['key']} refreshed ({table['sample_size']} players)")
+        self.last_run = time.time()
+        return tables
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self.refresh_once()
+            self._stop.wait(self.interval)
+
+    def start(self):
+        if self._thread is None and self.calc_ids:
+            self._thread = threading.Thread(target=self._loop, name="benchmark-refresh", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,195 @@
+"""
+Background jobs for deep leaderboard builds.
+
+A job wraps leaderboard.iter_leaderboard_character and runs it on a small, fixed
+thread pool, so the number of threads stays flat no matter how many clients start
+long fetches. Clients poll (or stream) the job for progress and partial rows.
+Identical pending/running jobs are deduplicated and finished results are kept
+for a while so they can be reused.
+"""
+import threading
+import time
+import uuid
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import leaderboard
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+
+
+class DeepLeaderboardJob:
+    """State of one deep leaderboard build. Updated by the worker thread, read by the API."""
+    def __init__(self, calc_id: str, character: str, limit: int, shallow: bool = False,
+                 incremental: bool = False):
+        self.id = uuid.uuid4().hex
+        self.key = (calc_id, character, limit, shallow, incremental)
+        self.calc_id = calc_id
+        self.character = character
+        self.limit = limit
+        self.shallow = shallow
+        self.incremental = incremental
+        self.status = PENDING
+        self.created_at = time.time()
+        self.finished_at = None
+        self.rows = []
+        self.progress = {}
+        self.summary = None
+        self.error = None
+        # Incremented on every change so subscribers can cheaply detect updates
+        self.version = 0
+        self.stop_event = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATES
+
+    def update(self, **fields):
+        with self._lock:
+            for name, value in fields.items():
+                setattr(self, name, value)
+            self.version += 1
+
+    def add_row(self, row):
+        with self._lock:
+            self.rows.append(row)
+            self.version += 1
+
+    def to_dict(self, offset: int = 0):
+        """Snapshot for the API. `offset` skips rows the client already has."""
+        with self._lock:
+            return {
+                "job_id": self.id,
+                "status": self.status,
+                "calc_id": self.calc_id,
+                "character": self.character,
+                "limit": self.limit,
+                "shallow": self.shallow,
+                "incremental": self.incremental,
+                "created": self.created_at,
+                "finished": self.finished_at,
+                "progress": dict(self.progress),
+                "summary": self.summary,
+                "error": self.error,
+                "total_rows": len(self.rows),
+                "offset": offset,
+                "rows": self.rows[offset:],
+                "version": self.version,
+            }
+
+
+class JobManager:
+    """
+    Runs deep leaderboard jobs on a bounded thread pool.
+    - max_workers: number of jobs fetching at the same time (others wait as 'pending')
+    - max_pending: pending + running jobs accepted before submit() refuses new work
+    - max_jobs: jobs kept in memory (oldest finished jobs are evicted first)
+    - result_ttl: seconds a finished job is reused for an identical request
+    - queue: optional task_queue.TaskQueue; when set, the Enka enrichment is handed
+      to worker.py processes instead of running inside this process
+    """
+    def __init__(self, max_workers: int = 2, max_pending: int = 20, max_jobs: int = 200, result_ttl: int = 3600,
+                 queue=None):
+        self.queue = queue
+        self.max_pending = max_pending
+        self.max_jobs = max_jobs
+        self.result_ttl = result_ttl
+        self.jobs = OrderedDict()
+        self._by_key = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="deep-job")
+
+    def submit(self, calc_id: str, character: str, limit: int, shallow: bool = False, incremental: bool = False):
+        """
+        Returns (job, reused). An identical job that is still running, or finished
+        successfully less than `result_ttl` seconds ago, is returned instead of a new one.
+        `incremental` jobs (refreshes) reuse and update the snapshot of the previous build.
+        Raises OverflowError when too many jobs are already queued.
+        """
+        key = (calc_id, character, limit, shallow, incremental)
+        with self._lock:
+            self._evict()
+            existing = self.jobs.get(self._by_key.get(key))
+            if existing and (not existing.finished or existing.status == DONE):
+                return existing, True
+
+            active = sum(1 for job in self.jobs.values() if not job.finished)
+            if active >= self.max_pending:
+                raise OverflowError("Too many deep leaderboard jobs in progress")
+
+            job = DeepLeaderboardJob(calc_id, character, limit, shallow=shallow, incremental=incremental)
+            self.jobs[job.id] = job
+            self._by_key[key] = job.id
+
+        self._executor.submit(self._run, job)
+        return job, False
+
+    def get(self, job_id: str):
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def cancel(self, job_id: str):
+        job = self.get(job_id)
+        if job and not job.finished:
+            job.stop_event.set()
+        return job
+
+    def shutdown(self):
+        for job in list(self.jobs.values()):
+            job.stop_event.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, job: DeepLeaderboardJob):
+        if job.stop_event.is_set():
+            job.update(status=CANCELLED, finished_at=time.time())
+            return
+
+        job.update(status=RUNNING)
+        # Shallow jobs barely call Enka, they are not worth a round trip through the queue
+        if self.queue is not None and not job.shallow:
+            events = leaderboard.iter_leaderboard_character_queued(
+                job.calc_id, job.character, self.queue, limit=job.limit, stop_event=job.stop_event,
+                incremental=job.incremental,
+            )
+        else:
+            events = leaderboard.iter_leaderboard_character(
+                job.calc_id, job.character, limit=job.limit, stop_event=job.stop_event, shallow=job.shallow,
+                incremental=job.incremental,
+            )
+        try:
+            for event in events:
+                if event["event"] == "row":
+                    job.add_row(event["data"])
+                elif event["event"] == "progress":
+                    job.update(progress={k: v for k, v in event.items() if k != "event"})
+                elif event["event"] == "summary":
+                    job.update(summary={k: v for k, v in event.items() if k != "event"})
+
+            status = CANCELLED if job.stop_event.is_set() else DONE
+            job.update(status=status, finished_at=time.time())
+        except Exception as e:
+            logging.exception(f"Deep leaderboard job {job.id} failed")
+            job.update(status=FAILED, error=str(e), finished_at=time.time())
+
+    def _evict(self):
+        """Drops expired results, then the oldest finished jobs above max_jobs. Caller holds the lock."""
+        now = time.time()
+        for job_id, job in list(self.jobs.items()):
+            if job.finished and now - job.finished_at > self.result_ttl:
+                self._drop(job_id)
+
+        finished = [job_id for job_id, job in self.jobs.items() if job.finished]
+        while len(self.jobs) >= self.max_jobs and finished:
+            self._drop(finished.pop(0))
+
+    def _drop(self, job_id: str):
+        job = self.jobs.pop(job_id, None)
+        if job and self._by_key.get(job.key) == job_id:
+            del self._by_key[job.key]
@@ -1,10 +1,43 @@
 
 import pandas as pd
 
-def prepare_context(leaderboard_data):
+def prepare_benchmark_context(benchmark):
+    """
+    Formats a materialized benchmark table (see benchmarks.py) for the AI:
+    median targets with the interquartile range, top weapons and artifact sets.
+    """
+    stats = benchmark.get('stats', {})
+    labels = [('HP', 'HP', '.0f', ''), ('ATK', 'ATK', '.0f', ''), ('DEF', 'DEF', '.0f', ''), ('EM', 'EM', '.0f', ''),
+              ('ER', 'ER', '.1f', '%'), ('Crit_Rate', 'Crit Rate', '.1f', '%'), ('Crit_DMG', 'Crit DMG', '.1f', '%'),
+              ('Elem_Bonus', 'Elemental DMG Bonus', '.1f', '%')]
+    stat_lines = []
+    for col, label, fmt, unit in labels:
+        s = stats.get(col)
+        if s:
+            stat_lines.append(f"    - {label}: {s['mean']:{fmt}}{unit} (median {s['p50']:{fmt}}{unit}, "
+                              f"middle 50% {s['p25']:{fmt}}-{s['p75']:{fmt}}{unit})")
+
+    def shares(items):
+        return ", ".join(f"{i['name']} ({i['share'] * 100:.0f}%)" for i in items) or "N/A"
+
+    stat_block = "\n".join(stat_lines)
+    return f"""
+    --- LEADERBOARD BENCHMARK ({benchmark.get('character')}, {benchmark.get('sample_size')} top players) ---
+    Average Stats Targets:
+{stat_block}
+
+    Top Weapons: {shares(benchmark.get('weapons', []))}
+    Top Artifact Sets: {shares(benchmark.get('sets', []))}
+    """
+
+def prepare_context(leaderboard_data, benchmark=None):
     """
     Summarizes the leaderboard data to provide a concise context for the AI.
+    A precomputed benchmark table is used instead when one is given (the API only
+    passes one when the client sent no leaderboard data).
     """
+    if benchmark:
+        return prepare_benchmark_context(benchmark)
     if not leaderboard_data:
         return "No leaderboard data available."
     
@@ -0,0 +1,227 @@
+"""
+Columnar leaderboard dataset.
+
+Every leaderboard fetch handed to the sink is appended as one immutable file in a
+Hive-style partitioned folder:
+
+    <root>/calc_id=<ID>/<timestamp>-<suffix>.parquet
+
+Parquet (zstd) is used when pyarrow is installed, gzip CSV otherwise. Files are
+written to a temporary name and renamed, so readers never see partial snapshots.
+
+The API does not write a file per request: BufferedDatasetSink keeps the snapshots in
+memory and flushes them from a background thread (one file per leaderboard and flush),
+then compact() periodically merges the files of each partition into one.
+"""
+import os
+import re
+import time
+import uuid
+import logging
+import threading
+from datetime import datetime, timezone
+
+import pandas as pd
+
+import locks
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+SAFE_ID_RE = re.compile(r'^[A-Za-z0-9_-]+$')
+
+
+class LeaderboardDatasetSink:
+    """Appends leaderboard snapshots under `root`. Pass an instance as akasha.fetch_leaderboard(sink=...)."""
+    def __init__(self, root, use_parquet=None):
+        self.root = str(root)
+        self.use_parquet = (pa is not None) if use_parquet is None else use_parquet
+
+    def _partition(self, calculation_id):
+        if not SAFE_ID_RE.match(str(calculation_id)):
+            raise ValueError(f"Invalid calculation ID: {calculation_id!r}")
+        return os.path.join(self.root, f"calc_id={calculation_id}")
+
+    def write(self, calculation_id, profiles):
+        """Stores one snapshot. Returns the file path (None when there is nothing to store)."""
+        if not profiles:
+            return None
+        fetched_at = time.time()
+        return self.write_rows(calculation_id, [dict(p, fetched_at=fetched_at) for p in profiles])
+
+    def write_rows(self, calculation_id, rows):
+        """Stores rows that already carry their fetched_at, as one file. Returns its path."""
+        if isinstance(rows, pd.DataFrame):
+            if rows.empty:
+                return None
+        elif not rows:
+            return None
+        folder = self._partition(calculation_id)
+        os.makedirs(folder, exist_ok=True)
+
+        stamp = datetime.fromtimestamp(time.time(), tz=timezone.utc).strftime("%Y%m%dT%H%M%S")
+        ext = ".parquet" if self.use_parquet else ".csv.gz"
+        path = os.path.join(folder, f"{stamp}-{uuid.uuid4().hex[:8]}{ext}")
+        tmp_path = path + ".tmp"
+
+        if self.use_parquet:
+            table = pa.Table.from_pandas(rows, preserve_index=False) if isinstance(rows, pd.DataFrame) \
+                else pa.Table.from_pylist(rows)
+            pq.write_table(table, tmp_path, compression="zstd")
+        else:
+            (rows if isinstance(rows, pd.DataFrame) else pd.DataFrame(rows)).to_csv(
+                tmp_path, index=False, compression="gzip")
+        os.replace(tmp_path, path)
+        return path
+
+    def compact(self, calculation_id=None, min_files=2):
+        """
+        Merges the files of each partition holding at least `min_files` into one.
+        The merged file is in place before the small ones are removed. Returns the
+        number of files removed.
+        """
+        removed = 0
+        with locks.file_lock(os.path.join(self.root, ".compact.lock")):
+            partitions = {}
+            for path in self.files(calculation_id):
+                partitions.setdefault(os.path.basename(os.path.dirname(path)).split("=", 1)[1], []).append(path)
+            for calc_id, paths in partitions.items():
+                if len(paths) < min_files:
+                    continue
+                df = self._read_files(paths)
+                if df is None:
+                    continue
+                self.write_rows(calc_id, df)
+                for path in paths:
+                    os.remove(path)
+                removed += len(paths)
+        return removed
+
+    def _read_files(self, paths):
+        """All the rows of `paths`, None when one of them cannot be read."""
+        frames = []
+        for path in paths:
+            try:
+                frames.append(self._read_file(path))
+            except Exception as e:
+                logging.warning(f"Not compacting {os.path.dirname(path)}: {path} is unreadable ({e})")
+                return None
+        return pd.concat(frames, ignore_index=True)
+
+    def _read_file(self, path, columns=None):
+        if path.endswith(".parquet"):
+            if pq is None:
+                raise RuntimeError("pyarrow is not installed")
+            return pq.read_table(path, columns=columns).to_pandas()
+        return pd.read_csv(path, compression="gzip", usecols=columns)
+
+    def files(self, calculation_id=None):
+        """Snapshot files, oldest first."""
+        if calculation_id is not None:
+            folders = [self._partition(calculation_id)]
+        elif os.path.isdir(self.root):
+            folders = [os.path.join(self.root, d) for d in sorted(os.listdir(self.root)) if d.startswith("calc_id=")]
+        else:
+            folders = []
+
+        found = []
+        for folder in folders:
+            if not os.path.isdir(folder):
+                continue
+            found.extend(os.path.join(folder, name) for name in sorted(os.listdir(folder))
+                         if name.endswith((".parquet", ".csv.gz")))
+        return found
+
+    def read(self, calculation_id=None, columns=None):
+        """Loads the stored snapshots as one DataFrame with a calc_id column."""
+        frames = []
+        for path in self.files(calculation_id):
+            calc_id = os.path.basename(os.path.dirname(path)).split("=", 1)[1]
+            try:
+                df = self._read_file(path, columns)
+            except Exception as e:
+                logging.warning(f"Unreadable leaderboard snapshot {path}: {e}")
+                continue
+            df["calc_id"] = calc_id
+            frames.append(df)
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, ignore_index=True)
+
+
+class BufferedDatasetSink:
+    """
+    Write-behind front of a LeaderboardDatasetSink, for the API: write() only buffers
+    the snapshot; a background thread flushes the buffer every `flush_interval` seconds
+    (sooner once `max_rows` rows wait), one file per leaderboard, and compacts the
+    partitions every `compact_interval` seconds. stop() flushes what is left.
+    """
+    def __init__(self, sink, flush_interval=300, max_rows=5000, compact_interval=6 * 3600):
+        self.sink = sink
+        self.flush_interval = flush_interval
+        self.max_rows = max_rows
+        self.compact_interval = compact_interval
+        self._buffer = {}
+        self._rows = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._last_compact = time.time()
+
+    def write(self, calculation_id, profiles):
+        if not profiles:
+            return
+        self.sink._partition(calculation_id)  # Invalid IDs fail now, not in the background
+        fetched_at = time.time()
+        with self._lock:
+            self._buffer.setdefault(str(calculation_id), []).extend(dict(p, fetched_at=fetched_at) for p in profiles)
+            self._rows += len(profiles)
+            full = self._rows >= self.max_rows
+        if full:
+            self._wake.set()
+
+    def pending_rows(self):
+        with self._lock:
+            return self._rows
+
+    def flush(self):
+        """Writes the buffered rows. Returns the written paths."""
+        with self._lock:
+            buffer, self._buffer, self._rows = self._buffer, {}, 0
+        written = []
+        for calc_id, rows in buffer.items():
+            try:
+                written.append(self.sink.write_rows(calc_id, rows))
+            except Exception:
+                logging.exception(f"Could not write the leaderboard dataset of {calc_id}")
+        return written
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+            if time.time() - self._last_compact >= self.compact_interval:
+                self._last_compact = time.time()
+                try:
+                    self.sink.compact()
+                except Exception:
+                    logging.exception("Leaderboard dataset compaction failed")
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="dataset-sink", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=30):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self.flush()
@@ -0,0 +1,352 @@
+"""
+Append-only version log for the tables of a scan folder (characters, artifacts, combined).
+
+Instead of a full `<table>_vN.csv` copy per version, each table has one
+`<table>.log.jsonl` file where every line is a version:
+
+    {"version": 1, "kind": "snapshot", "time": ..., "columns": [...], "rows": [[...], ...]}
+    {"version": 2, "kind": "delta", "time": ..., "columns": [...],
+     "updates": [[row, column, value], ...], "appends": [[...], ...]}
+
+A delta holds the changed cells and the added rows relative to the previous version.
+A full snapshot is written for the first version, every SNAPSHOT_EVERY versions, and
+whenever a delta would not be smaller (rows removed, columns reordered...). Version N
+is rebuilt by replaying the deltas that follow the nearest snapshot; export_csv()
+still produces the `<table>_vN.csv` layout on demand, and cached_export() the
+JSON/CSV files the API serves from disk.
+
+Folders scanned before the log existed keep their `_vN.csv` files: they are read as a
+fallback and the log continues their numbering.
+
+    python delta_log.py <scan folder> [version]    # exports every table as <table>_vN.csv
+"""
+import os
+import re
+import sys
+import json
+import glob
+import logging
+import contextlib
+import math
+import time
+import threading
+
+import pandas as pd
+
+LOG_SUFFIX = ".log.jsonl"
+SNAPSHOT_EVERY = 10
+EXPORT_DIR = ".exports"
+EXPORT_FORMATS = ('json', 'csv')
+# Exports of superseded versions are kept this long after their last write, so a
+# response that already resolved the path can still open it
+EXPORT_GRACE = 300
+
+# Records are written with "version" and "kind" first, so the replay can locate the
+# nearest snapshot without decoding the lines before it
+_HEADER_RE = re.compile(r'^\{"version": (\d+), "kind": "(snapshot|delta)"')
+_LEGACY_RE = re.compile(r'_v(\d+)\.csv$')
+
+
+def log_path(base_name):
+    return f"{base_name}{LOG_SUFFIX}"
+
+
+def legacy_path(base_name, version):
+    return f"{base_name}_v{version}.csv"
+
+
+def _cell(value):
+    """JSON-friendly cell: NaN/NA -> None, numpy scalars -> Python."""
+    if value is None:
+        return None
+    if hasattr(value, 'item'):
+        value = value.item()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    try:
+        if pd.isna(value):
+            return None
+    except (TypeError, ValueError):
+        pass
+    return value
+
+
+def _table_rows(df):
+    return [[_cell(v) for v in row] for row in df.astype(object).itertuples(index=False, name=None)]
+
+
+class CorruptLogError(Exception):
+    """A line the requested version depends on cannot be read: the table cannot be rebuilt."""
+
+
+def _headers(path):
+    """
+    [(version, kind, line_number)] of the valid-looking lines of the log. An unterminated
+    last line is a write torn by a crash and is left out, as is a torn line that an older
+    append() terminated and followed with the same version.
+    """
+    headers = []
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            for number, line in enumerate(f):
+                match = _HEADER_RE.match(line)
+                if match and line.endswith('\n'):
+                    headers.append((int(match.group(1)), match.group(2), number))
+    except OSError:
+        return []
+    return [h for i, h in enumerate(headers) if i + 1 == len(headers) or headers[i + 1][0] != h[0]]
+
+
+def _drop_torn_tail(path):
+    """Truncates an unterminated last line (a write torn by a crash) before appending."""
+    try:
+        with open(path, 'rb+') as f:
+            end = f.seek(0, os.SEEK_END)
+            position = end
+            while position > 0:
+                start = max(0, position - 65536)
+                f.seek(start)
+                chunk = f.read(position - start)
+                if position == end and chunk.endswith(b'\n'):
+                    return
+                newline = chunk.rfind(b'\n')
+                if newline >= 0:
+                    f.truncate(start + newline + 1)
+                    return
+                position = start
+            f.truncate(0)
+    except FileNotFoundError:
+        pass
+
+
+def latest_version(base_name):
+    """Last version stored in the log (0 when there is no log)."""
+    headers = _headers(log_path(base_name))
+    return headers[-1][0] if headers else 0
+
+
+def legacy_versions(base_name):
+    """{version: path} of the `<table>_vN.csv` files of the folder."""
+    found = {}
+    for path in glob.glob(f"{glob.escape(base_name)}_v*.csv"):
+        match = _LEGACY_RE.search(path)
+        if match:
+            found[int(match.group(1))] = path
+    return found
+
+
+def versions(base_name):
+    """Every version available for the table, from the log or legacy CSV files."""
+    return sorted(set(legacy_versions(base_name)) | {v for v, _, _ in _headers(log_path(base_name))})
+
+
+def current_version(base_name):
+    """Latest version of the table, whether it lives in the log or in a legacy CSV."""
+    return max(versions(base_name), default=0)
+
+
+def _replay(base_name, version):
+    """
+    (columns, rows) of `version` rebuilt from the log, or None when the log does not have it.
+    Raises CorruptLogError when a line of its chain is unreadable.
+    """
+    path = log_path(base_name)
+    headers = [h for h in _headers(path) if h[0] <= version]
+    if not headers or headers[-1][0] != version:
+        return None
+    start = max((i for i, h in enumerate(headers) if h[1] == 'snapshot'), default=None)
+    if start is None:
+        return None
+    wanted = {number for _, _, number in headers[start:]}
+
+    columns, rows = [], []
+    with open(path, 'r', encoding='utf-8') as f:
+        for number, line in enumerate(f):
+            if number not in wanted:
+                continue
+            # Every wanted line is terminated: a corrupt one breaks the chain, and skipping
+            # it would rebuild a wrong table
+            try:
+                record = json.loads(line)
+                if record['kind'] == 'snapshot':
+                    columns, rows = record['columns'], [list(r) for r in record['rows']]
+                    continue
+                extra = len(record['columns']) - len(columns)
+                if extra:
+                    for row in rows:
+                        row.extend([None] * extra)
+                columns = record['columns']
+                for i, j, value in record['updates']:
+                    rows[i][j] = value
+                rows.extend(list(r) for r in record['appends'])
+            except (ValueError, KeyError, IndexError, TypeError) as e:
+                raise CorruptLogError(f"Corrupt line {number + 1} in {path}, cannot rebuild version {version}: {e}")
+    return columns, rows
+
+
+def load(base_name, version=None):
+    """
+    DataFrame of `version` (latest by default). Falls back to the legacy
+    `<table>_vN.csv` file; None when the version does not exist.
+    Raises CorruptLogError when the log cannot rebuild it and there is no legacy file:
+    returning None would let a scan save a table that has lost its earlier rows.
+    """
+    if version is None:
+        version = current_version(base_name)
+        if not version:
+            return None
+    legacy = legacy_versions(base_name).get(version)
+    try:
+        state = _replay(base_name, version)
+    except CorruptLogError as e:
+        if not legacy:
+            raise
+        logging.warning(f"{e}; reading {legacy} instead")
+        state = None
+    if state is not None:
+        columns, rows = state
+        return pd.DataFrame(rows, columns=columns)
+    if legacy:
+        try:
+            return pd.read_csv(legacy)
+        except Exception:
+            return None
+    return None
+
+
+def _delta(columns, rows, new_columns, new_rows):
+    """(updates, appends) turning the previous table into the new one, None when only a snapshot can."""
+    if new_columns[:len(columns)] != columns or len(new_rows) < len(rows):
+        return None
+    updates = []
+    for i, (old, new) in enumerate(zip(rows, new_rows)):
+        for j, value in enumerate(new):
+            previous = old[j] if j < len(old) else None
+            if previous != value:
+                updates.append([i, j, value])
+    return updates, new_rows[len(rows):]
+
+
+def append(base_name, df, version=None, snapshot_every=SNAPSHOT_EVERY):
+    """
+    Appends `df` as a new version (latest + 1 by default) and returns its number.
+    Writes a delta against the previous logged version when that is smaller than a snapshot.
+    """
+    path = log_path(base_name)
+    headers = _headers(path)
+    last = headers[-1][0] if headers else 0
+    version = version if version is not None else max(last, current_version(base_name)) + 1
+    if version <= last:
+        raise ValueError(f"Version {version} is not newer than {last} in {path}")
+
+    columns = [str(c) for c in df.columns]
+    rows = _table_rows(df)
+    record = None
+    last_snapshot = max((v for v, kind, _ in headers if kind == 'snapshot'), default=None)
+    if last_snapshot is not None and version - last_snapshot < snapshot_every:
+        try:
+            previous = _replay(base_name, last)
+        except CorruptLogError:
+            previous = None  # A snapshot does not depend on the broken chain
+        delta = _delta(*previous, columns, rows) if previous else None
+        if delta is not None:
+            updates, appends = delta
+            if 3 * len(updates) + len(appends) * len(columns) < len(rows) * len(columns):
+                record = {"version": version, "kind": "delta", "time": time.time(), "columns": columns,
+                          "updates": updates, "appends": appends}
+    if record is None:
+        record = {"version": version, "kind": "snapshot", "time": time.time(), "columns": columns, "rows": rows}
+
+    line = json.dumps(record, ensure_ascii=False, default=str)
+    _drop_torn_tail(path)
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(line + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+    return version
+
+
+def export_csv(base_name, version=None, path=None):
+    """Writes `version` (latest by default) as `<table>_vN.csv`. Returns the path, None when missing."""
+    version = version or current_version(base_name)
+    df = load(base_name, version) if version else None
+    if df is None:
+        return None
+    path = path or legacy_path(base_name, version)
+    tmp_path = f"{path}.tmp"
+    df.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+    return path
+
+
+def export_path(base_name, version, fmt):
+    """<folder>/.exports/<table>.vN.<fmt>: kept apart from the legacy `_vN.csv` files."""
+    folder, table = os.path.split(str(base_name))
+    return os.path.join(folder, EXPORT_DIR, f"{table}.v{version}.{fmt}")
+
+
+def _prune_exports(base_name, latest, keep):
+    """Removes the exports of versions older than `latest` (except `keep`) not written recently."""
+    folder, table = os.path.split(str(base_name))
+    pattern = re.compile(rf'^{re.escape(table)}\.v(\d+)\.(?:{"|".join(EXPORT_FORMATS)})$')
+    cutoff = time.time() - EXPORT_GRACE
+    for path in glob.glob(os.path.join(glob.escape(os.path.join(folder, EXPORT_DIR)), f"{glob.escape(table)}.v*")):
+        match = pattern.match(os.path.basename(path))
+        if not match or int(match.group(1)) >= latest or int(match.group(1)) == keep:
+            continue
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def cached_export(base_name, version=None, fmt='json', lock=None):
+    """
+    Path of `version` (latest by default) exported as JSON records or CSV, written on
+    first use. Versions never change once logged, so each export is reused; exports of
+    versions older than the latest one are removed after EXPORT_GRACE seconds.
+    `lock` (e.g. locks.uid_lock of the folder) is held while an export is written.
+    Returns None when the version does not exist.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    version = version or current_version(base_name)
+    if not version:
+        return None
+    path = export_path(base_name, version, fmt)
+    if os.path.exists(path):
+        return path
+    with lock if lock is not None else contextlib.nullcontext():
+        if os.path.exists(path):
+            return path  # Written while we waited for the lock
+        df = load(base_name, version)
+        if df is None:
+            return None
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        if fmt == 'json':
+            df.to_json(tmp_path, orient='records', force_ascii=False)
+        else:
+            df.to_csv(tmp_path, index=False)
+        os.replace(tmp_path, path)
+        _prune_exports(base_name, current_version(base_name), version)
+    return path
+
+
+def export_folder(folder, version=None):
+    """Exports every logged table of a scan folder. Returns the written paths."""
+    written = []
+    for log in sorted(glob.glob(os.path.join(glob.escape(str(folder)), f"*{LOG_SUFFIX}"))):
+        exported = export_csv(log[:-len(LOG_SUFFIX)], version)
+        if exported:
+            written.append(exported)
+    return written
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python delta_log.py <scan folder> [version]")
+        sys.exit(1)
+    for exported in export_folder(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else None):
+        print(exported)
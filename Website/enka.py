@@ -1,12 +1,21 @@
 import pandas as pd
+import numpy as np
 import json
 import os
 import re
 import glob
+import hashlib
+import threading
 from datetime import datetime
 import i18n
 from pathlib import Path
 import http_client
+import delta_log
+import raw_store
+import manifest
+import shards
+import locks
+import records
 
 # --- CONFIGURATION ---
 API_URL = "https://enka.network/api/uid/{uid}"
@@ -249,39 +258,44 @@ def normalize_value(val):
     except (ValueError, TypeError):
         return str(val).strip()
 
+# Columns making up the comparison keys (see merge_dataframes)
+ARTIFACT_KEY_FIELDS = ('Character', 'Slot', 'Set', 'Main_Stat', 'Main_Value',
+                       'Sub1', 'Sub1_Val', 'Sub2', 'Sub2_Val', 'Sub3', 'Sub3_Val', 'Sub4', 'Sub4_Val')
+CHARACTER_KEY_FIELDS = ('Character', 'HP', 'ATK', 'DEF', 'Crit_Rate%', 'Crit_DMG%', 'Total_CV')
+
 def create_artifact_key(artifact):
     """Creates a unique key to identify an artifact."""
     # Key based on: Character + Slot + Set + Main Stat + Substats
-    key_parts = [
-        normalize_value(artifact.get('Character', '')),
-        normalize_value(artifact.get('Slot', '')),
-        normalize_value(artifact.get('Set', '')),
-        normalize_value(artifact.get('Main_Stat', '')),
-        normalize_value(artifact.get('Main_Value', '')),
-        normalize_value(artifact.get('Sub1', '')),
-        normalize_value(artifact.get('Sub1_Val', '')),
-        normalize_value(artifact.get('Sub2', '')),
-        normalize_value(artifact.get('Sub2_Val', '')),
-        normalize_value(artifact.get('Sub3', '')),
-        normalize_value(artifact.get('Sub3_Val', '')),
-        normalize_value(artifact.get('Sub4', '')),
-        normalize_value(artifact.get('Sub4_Val', '')),
-    ]
-    return "|".join(key_parts)
+    return "|".join(normalize_value(artifact.get(field, '')) for field in ARTIFACT_KEY_FIELDS)
 
 def create_character_key(char):
     """Creates a unique key to identify a character and their build."""
     # Key based on main stats (changes when build changes)
-    key_parts = [
-        normalize_value(char.get('Character', '')),
-        normalize_value(char.get('HP', '')),
-        normalize_value(char.get('ATK', '')),
-        normalize_value(char.get('DEF', '')),
-        normalize_value(char.get('Crit_Rate%', '')),
-        normalize_value(char.get('Crit_DMG%', '')),
-        normalize_value(char.get('Total_CV', '')),
+    return "|".join(normalize_value(char.get(field, '')) for field in CHARACTER_KEY_FIELDS)
+
+# Key functions merge_dataframes knows how to vectorize
+KEY_FUNC_FIELDS = {
+    create_artifact_key: ARTIFACT_KEY_FIELDS,
+    create_character_key: CHARACTER_KEY_FIELDS,
+}
+
+def _normalized_column(df, field):
+    """normalize_value applied to a whole column, calling it once per distinct value."""
+    if field not in df.columns:
+        return pd.Series('', index=df.index, dtype=object)
+    codes, uniques = pd.factorize(df[field], use_na_sentinel=True)
+    # Missing values get code -1, which picks the trailing '' (normalize_value(NaN) == '')
+    lookup = np.array([normalize_value(u) for u in uniques] + [''], dtype=object)
+    return pd.Series(lookup[codes], index=df.index, dtype=object)
+
+def _key_column(df, fields, normalize):
+    """Joins the given fields with '|' for every row (same strings as the row-wise keys)."""
+    parts = [
+        _normalized_column(df, f) if normalize
+        else (df[f].map(str) if f in df.columns else pd.Series('', index=df.index, dtype=object))
+        for f in fields
     ]
-    return "|".join(key_parts)
+    return parts[0].str.cat(parts[1:], sep='|') if len(parts) > 1 else parts[0]
 
 def merge_dataframes(existing_df, new_df, key_func, key_columns):
     """
@@ -289,11 +303,63 @@ def merge_dataframes(existing_df, new_df, key_func, key_columns):
     - If data already exists (same key), do not add
     - If data is new, add it
     - If data has changed (same ID but different values), update it
-    
+
+    Column-wise version of _merge_dataframes_rowwise: keys are built per column,
+    matched with hash lookups, then updates and additions are applied in bulk.
+    Key functions it does not know fall back to the row-wise merge.
+
     Returns: (merged_df, stats_dict)
     """
     if existing_df is None or existing_df.empty:
         return new_df, {'added': len(new_df), 'updated': 0, 'unchanged': 0}
+
+    fields = KEY_FUNC_FIELDS.get(key_func)
+    if fields is None:
+        return _merge_dataframes_rowwise(existing_df, new_df, key_func, key_columns)
+
+    # Convert all columns to object to avoid type conflicts
+    existing_df = existing_df.astype(object)
+    new_df = new_df.astype(object)
+
+    existing_keys = set(_key_column(existing_df, fields, normalize=True))
+    # ID = Character + Slot for artifacts, Character for chars; the last row wins
+    existing_ids = _key_column(existing_df, key_columns, normalize=False)
+    id_to_index = dict(zip(existing_ids, existing_df.index))
+
+    new_keys = _key_column(new_df, fields, normalize=True)
+    new_ids = _key_column(new_df, key_columns, normalize=False)
+
+    unchanged = new_keys.isin(existing_keys)
+    updated = ~unchanged & new_ids.isin(id_to_index.keys())
+    added = ~unchanged & ~updated
+    stats = {'added': int(added.sum()), 'updated': int(updated.sum()), 'unchanged': int(unchanged.sum())}
+
+    result_df = existing_df.copy()
+
+    # Apply updates: several new rows for the same ID overwrite each other, the last one wins
+    if stats['updated']:
+        targets = new_ids[updated].map(id_to_index)
+        last = ~targets.duplicated(keep='last')
+        updates = new_df[updated][last.to_numpy()]
+        for col in new_df.columns:
+            if col not in result_df.columns:
+                result_df[col] = np.nan
+        result_df.loc[targets[last].to_numpy(), list(new_df.columns)] = updates.to_numpy(dtype=object)
+
+    # Add new lines
+    if stats['added']:
+        new_rows_df = new_df[added].infer_objects()
+        result_df = pd.concat([result_df, new_rows_df], ignore_index=True)
+
+    return result_df, stats
+
+def _merge_dataframes_rowwise(existing_df, new_df, key_func, key_columns):
+    """
+    Original row-by-row merge (iterrows + .at). Kept for arbitrary key functions
+    and as the reference implementation for merge_dataframes.
+    """
+    if existing_df is None or existing_df.empty:
+        return new_df, {'added': len(new_df), 'updated': 0, 'unchanged': 0}
     
     # Convert all columns to object to avoid type conflicts
     existing_df = existing_df.astype(object)
@@ -366,61 +432,51 @@ def sanitize_filename(name):
 
 def get_current_version(base_pattern):
     """
-    Finds the current version of existing files.
-    Returns (version_number, existing_filepath) or (0, None) if no file.
+    Finds the current version of a table: folder manifest first, then the delta log,
+    then legacy _vN.csv files.
+    Returns (version_number, source_path) or (0, None) if the table does not exist yet.
     """
-    # Search for all files matching the pattern
-    pattern = f"{base_pattern}_v*.csv"
-    existing_files = glob.glob(pattern)
-    
-    if not existing_files:
+    entry = manifest.table_entry(base_pattern)
+    if entry:
+        return entry['version'], delta_log.log_path(base_pattern)
+
+    version = delta_log.latest_version(base_pattern)
+    if version:
+        return version, delta_log.log_path(base_pattern)
+
+    legacy = delta_log.legacy_versions(base_pattern)
+    if not legacy:
         return 0, None
-    
-    # Find the highest version
-    max_version = 0
-    latest_file = None
-    
-    for filepath in existing_files:
-        match = re.search(r'_v(\d+)\.csv$', filepath)
-        if match:
-            version = int(match.group(1))
-            if version > max_version:
-                max_version = version
-                latest_file = filepath
-    
-    return max_version, latest_file
+    max_version = max(legacy)
+    return max_version, legacy[max_version]
+
+def load_current_version(base_name):
+    """DataFrame of the current version of a table, or None."""
+    return delta_log.load(base_name)
 
 def save_with_versioning(df, base_name, existing_df, stats):
     """
     Saves the DataFrame with intelligent versioning.
     - If no change: do nothing, keep current version
-    - If change (additions or updates): increment version
-    
+    - If change (additions or updates): append a new version to the table's delta log
+
     Returns: (saved_filename, version, has_changed)
     """
     current_version, current_file = get_current_version(base_name)
-    
+
     has_changes = stats['added'] > 0 or stats['updated'] > 0
-    
-    if current_version == 0:
-        # First time, create v1
-        new_version = 1
-        new_filename = f"{base_name}_v{new_version}.csv"
-        df.to_csv(new_filename, index=False)
-        return new_filename, new_version, True
-    
-    if has_changes:
-        # Changes present, increment version
-        new_version = current_version + 1
-        new_filename = f"{base_name}_v{new_version}.csv"
-        df.to_csv(new_filename, index=False)
-        return new_filename, new_version, True
+
+    if current_version == 0 or has_changes:
+        # First time (v1) or changes present: increment version
+        new_version = delta_log.append(base_name, df, version=current_version + 1)
+        manifest.record_table(base_name, new_version, df)
+        return delta_log.log_path(base_name), new_version, True
     else:
         # No change, keep current version
         return current_file, current_version, False
 
 def extract_artifacts(equip_list, char_name):
-    """Extracts data from all equipped artifacts."""
+    """Extracts data from all equipped artifacts (records.Artifact)."""
     artifacts = []
     
     for equip in equip_list:
@@ -435,51 +491,32 @@ def extract_artifacts(equip_list, char_name):
         level = reliquary.get('level', 1) - 1
         
         main_stat = flat.get('reliquaryMainstat', {})
-        main_prop = format_prop(main_stat.get('mainPropId', ''))
-        main_value = main_stat.get('statValue', 0)
-        
-        substats = flat.get('reliquarySubstats', [])
-        substat_data = {}
-        for i, sub in enumerate(substats):
-            prop_name = format_prop(sub.get('appendPropId', ''))
-            prop_value = sub.get('statValue', 0)
-            substat_data[f'Sub{i+1}'] = prop_name
-            substat_data[f'Sub{i+1}_Val'] = prop_value
-        
-        for i in range(len(substats), 4):
-            substat_data[f'Sub{i+1}'] = ""
-            substat_data[f'Sub{i+1}_Val'] = ""
         
+        # Up to 4 substats (name, value); missing ones stay empty
+        subs = ["", "", "", "", "", "", "", ""]
         crit_rate = 0
         crit_dmg = 0
-        for sub in substats:
+        for i, sub in enumerate(flat.get('reliquarySubstats', [])):
             prop = sub.get('appendPropId', '')
             val = sub.get('statValue', 0)
+            if i < 4:
+                subs[2 * i] = format_prop(prop)
+                subs[2 * i + 1] = val
             if prop == 'FIGHT_PROP_CRITICAL':
                 crit_rate = val
             elif prop == 'FIGHT_PROP_CRITICAL_HURT':
                 crit_dmg = val
-        crit_value = round(crit_rate * 2 + crit_dmg, 1)
         
-        artifact = {
-            'Character': char_name,
-            'Slot': EQUIP_TYPE_MAP.get(equip_type, equip_type),
-            'Set': SET_MAP.get(set_id, f"Set_{set_id}"),
-            'Level': f"+{level}",
-            'Main_Stat': main_prop,
-            'Main_Value': main_value,
-            'Sub1': substat_data.get('Sub1', ''),
-            'Sub1_Val': substat_data.get('Sub1_Val', ''),
-            'Sub2': substat_data.get('Sub2', ''),
-            'Sub2_Val': substat_data.get('Sub2_Val', ''),
-            'Sub3': substat_data.get('Sub3', ''),
-            'Sub3_Val': substat_data.get('Sub3_Val', ''),
-            'Sub4': substat_data.get('Sub4', ''),
-            'Sub4_Val': substat_data.get('Sub4_Val', ''),
-            'Crit_Value': crit_value,
-        }
-        
-        artifacts.append(artifact)
+        artifacts.append(records.Artifact(
+            char_name,
+            EQUIP_TYPE_MAP.get(equip_type, equip_type),
+            SET_MAP.get(set_id, f"Set_{set_id}"),
+            f"+{level}",
+            format_prop(main_stat.get('mainPropId', '')),
+            main_stat.get('statValue', 0),
+            *subs,
+            round(crit_rate * 2 + crit_dmg, 1),
+        ))
     
     return artifacts
 
@@ -501,7 +538,7 @@ def get_element_bonus(fight_props):
     return None, 0
 
 def extract_weapon_info(equip_list):
-    """Extracts equipped weapon info."""
+    """Extracts equipped weapon info (records.Weapon, None without weapon)."""
     for equip in equip_list:
         if 'weapon' in equip:
             flat = equip.get('flat', {})
@@ -518,290 +555,427 @@ def extract_weapon_info(equip_list):
                     substat_type = format_prop(stat.get('appendPropId', ''))
                     substat_value = stat.get('statValue', 0)
             
-            return {
-                'icon': flat.get('icon', ''),
-                'level': equip['weapon'].get('level', 0),
-                'refinement': list(equip['weapon'].get('affixMap', {}).values())[0] + 1 if equip['weapon'].get('affixMap') else 1,
-                'base_atk': base_atk,
-                'substat': substat_type,
-                'substat_value': substat_value
-            }
+            return records.Weapon(
+                icon=flat.get('icon', ''),
+                level=equip['weapon'].get('level', 0),
+                refinement=list(equip['weapon'].get('affixMap', {}).values())[0] + 1 if equip['weapon'].get('affixMap') else 1,
+                base_atk=base_atk,
+                substat=substat_type,
+                substat_value=substat_value,
+            )
     return None
 
-def fetch_player_data(uid, output_root=None):
-    """Fetches and formats player data."""
+def request_player_data(uid, verbose=True):
+    """
+    Downloads the raw Enka payload for a UID.
+    Returns (data, error). Nothing is written to disk; with verbose=False nothing is printed.
+    """
     if not str(uid).isdigit():
         return None, "Invalid UID format"
 
-    print(i18n.get("FETCHING_DATA_UID", uid=uid), flush=True)
-    output_root = Path(output_root) if output_root else Path.cwd()
-    output_root.mkdir(parents=True, exist_ok=True)
-    
-    try:
-        # Use optimized http_client with Cloudflare bypass
-        session = http_client.create_session(
-            browser='chrome',
-            platform='windows',
-            use_nodejs=True
-        )
-        
-        response = http_client.get_with_retry(
-            session,
-            API_URL.format(uid=uid),
-            timeout=REQUEST_TIMEOUT,
-            delay_min=2.0,  # Enka needs slower requests
-            delay_max=4.0,
-            max_retries=3
-        )
-        
-        if response.status_code == 200:
-            try:
-                data = response.json()
-            except json.JSONDecodeError as e:
+    if verbose:
+        print(i18n.get("FETCHING_DATA_UID", uid=uid), flush=True)
+
+    # Use optimized http_client with Cloudflare bypass
+    session = http_client.create_session(
+        browser='chrome',
+        platform='windows',
+        use_nodejs=True
+    )
+
+    response = http_client.get_with_retry(
+        session,
+        API_URL.format(uid=uid),
+        timeout=REQUEST_TIMEOUT,
+        delay_min=2.0,  # Enka needs slower requests
+        delay_max=4.0,
+        max_retries=3
+    )
+
+    if response.status_code == 200:
+        try:
+            return response.json(), None
+        except json.JSONDecodeError as e:
+            if verbose:
                 print(i18n.get("ERROR_PARSING_JSON", error=e))
                 # Log first 500 chars of response to identify if it's HTML/Cloudflare
                 snippet = response.text[:500].replace('\n', ' ')
                 print(f"Response snippet: {snippet}...")
-                return None, f"JSON Parse Error: {str(e)} (Response might be HTML)"
-            
-            player = data.get('playerInfo', {})
-            print(i18n.get("PLAYER_INFO", nickname=player.get('nickname')))
-            print(i18n.get("PLAYER_LEVEL", level=player.get('level'), world_level=player.get('worldLevel')))
-            
-            if 'avatarInfoList' not in data:
-                 # Sometimes data is incomplete or hidden
-                 if not data.get('playerInfo'):
-                     return None, "Profile hidden or no data"
-                 print(i18n.get("NO_CHARACTERS"))
-                 return None, "No characters found in showcase"
-
-            avatar_list = data.get('avatarInfoList', [])
-            if not avatar_list:
+            return None, f"JSON Parse Error: {str(e)} (Response might be HTML)"
+
+    errors = {
+        400: ("UID_INVALID", "UID invalid"),
+        404: ("PLAYER_NOT_FOUND", "Player not found"),
+        424: ("MAINTENANCE", "Maintenance"),
+        429: ("RATE_LIMITED", "Rate limited"),
+    }
+    message_key, error = errors.get(response.status_code, ("ERROR_STATUS", f"Error {response.status_code}"))
+    if verbose:
+        print(i18n.get(message_key, status=response.status_code))
+    return None, error
+
+def parse_character(avatar):
+    """Parses one avatarInfoList entry into a records.Character holding its weapon and artifacts."""
+    avatar_id = avatar.get('avatarId')
+    char_name = CHARACTER_MAP.get(avatar_id, f"ID_{avatar_id}")
+
+    prop_map = avatar.get('propMap', {})
+    level = int(prop_map.get('4001', {}).get('val', 0))
+
+    fight_props = avatar.get('fightPropMap', {})
+
+    element, elem_bonus = get_element_bonus(fight_props)
+    equip_list = avatar.get('equipList', [])
+    char_artifacts = extract_artifacts(equip_list, char_name)
+
+    return records.Character(
+        name=char_name,
+        level=level,
+        hp=round(fight_props.get('2000', 0)),
+        atk=round(fight_props.get('2001', 0)),
+        defense=round(fight_props.get('2002', 0)),
+        em=round(fight_props.get('28', 0)),
+        er=round(fight_props.get('23', 1) * 100, 1),
+        crit_rate=round(fight_props.get('20', 0) * 100, 1),
+        crit_dmg=round(fight_props.get('22', 0) * 100, 1),
+        element=element or "N/A",
+        elem_bonus=elem_bonus,
+        total_cv=sum(a.crit_value for a in char_artifacts),
+        weapon=extract_weapon_info(equip_list),
+        artifacts=char_artifacts,
+        avatar_id=avatar_id,
+    )
+
+def parse_player_data(data, characters=None):
+    """
+    Pure parse of an Enka payload (no disk I/O, no printing).
+    `characters` optionally restricts parsing to a set of character names;
+    other avatars are skipped before their artifacts are read.
+    Returns (parsed, error) with parsed = {'player', 'characters', 'artifacts'}: records.Character
+    and records.Artifact records (each character also holds its own artifacts).
+    """
+    if 'avatarInfoList' not in data:
+        # Sometimes data is incomplete or hidden
+        if not data.get('playerInfo'):
+            return None, "Profile hidden or no data"
+        return None, "No characters found in showcase"
+
+    avatar_list = data.get('avatarInfoList', [])
+    if not avatar_list:
+        return None, "No characters"
+
+    wanted = set(characters) if characters else None
+    all_characters = []
+    all_artifacts = []
+
+    for avatar in avatar_list:
+        if wanted is not None:
+            avatar_id = avatar.get('avatarId')
+            if CHARACTER_MAP.get(avatar_id, f"ID_{avatar_id}") not in wanted:
+                continue
+        character = parse_character(avatar)
+        all_characters.append(character)
+        all_artifacts.extend(character.artifacts)
+
+    return {
+        'player': data.get('playerInfo', {}),
+        'characters': all_characters,
+        'artifacts': all_artifacts,
+    }, None
+
+def to_api_data(parsed):
+    """Structures parsed data for the API (leaderboard.py expects {'stats': ..., 'artifacts': ...})."""
+    return [character.to_api() for character in parsed['characters']]
+
+def fetch_player_characters(uid, characters=None):
+    """
+    Side-effect-free fetch + parse: no files written, nothing printed.
+    Returns (api_data, error), optionally limited to the given character names.
+    """
+    try:
+        data, error = request_player_data(uid, verbose=False)
+        if error:
+            return None, error
+        parsed, error = parse_player_data(data, characters=characters)
+        if error:
+            return None, error
+        return to_api_data(parsed), None
+    except Exception as e:
+        return None, str(e)
+
+FINGERPRINTS_FILE = "fingerprints.json"
+
+def avatar_character_name(avatar):
+    avatar_id = avatar.get('avatarId')
+    return CHARACTER_MAP.get(avatar_id, f"ID_{avatar_id}")
+
+def _content_hash(obj):
+    return hashlib.sha256(json.dumps(obj, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+                          .encode('utf-8')).hexdigest()
+
+def showcase_fingerprints(data):
+    """
+    Content hashes of a payload: one per avatar (keyed by avatarId: several avatars can
+    share a character name) and one for the whole showcase (playerInfo + avatars).
+    Volatile fields such as 'ttl' are left out.
+    """
+    avatars = {str(a.get('avatarId')): _content_hash(a) for a in data.get('avatarInfoList', [])}
+    return {
+        'showcase': _content_hash({'playerInfo': data.get('playerInfo', {}), 'avatars': avatars}),
+        'avatars': avatars,
+    }
+
+def load_fingerprints(folder_path):
+    try:
+        with open(Path(folder_path) / FINGERPRINTS_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+def _write_json_atomic(path, obj, **kwargs):
+    # Unique per writer: concurrent saves of the same folder never share a tmp file
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(obj, f, ensure_ascii=False, **kwargs)
+    os.replace(tmp_path, path)
+
+def _merge_versioned(base_name, rows, key_func, key_columns, skipped):
+    """
+    Merges `rows` into the current version of the table and saves a new version if needed.
+    `skipped` rows (unchanged avatars that were not reprocessed) are counted as unchanged.
+    Returns (filename, version, changed, stats, total_rows); total_rows is None when nothing was merged.
+    """
+    if not rows:
+        version, filename = get_current_version(base_name)
+        return filename, version, False, {'added': 0, 'updated': 0, 'unchanged': skipped}, None
+
+    existing = load_current_version(base_name)
+    merged, stats = merge_dataframes(existing, pd.DataFrame(rows), key_func, key_columns)
+    filename, version, changed = save_with_versioning(merged, base_name, existing, stats)
+    stats['unchanged'] += skipped
+    return filename, version, changed, stats, len(merged)
+
+def save_player_data(uid, data, parsed, output_root=None, repository=None):
+    """
+    Persistence stage: intelligent merge with the versioned tables (delta logs) of the player folder,
+    combined file and compressed raw snapshot. Returns the folder path.
+
+    Avatars are fingerprinted (fingerprints.json): only avatars whose payload changed
+    since the last scan are merged, and nothing is written when the showcase is identical.
+
+    The whole read-merge-write runs under the UID lock (locks.uid_lock), so concurrent
+    scans of the same player, in any process, cannot pick the same next version.
+    """
+    output_root = Path(output_root) if output_root else Path.cwd()
+    output_root.mkdir(parents=True, exist_ok=True)
+    with locks.uid_lock(uid, output_root):
+        return _save_player_data(uid, data, parsed, output_root, repository)
+
+def _save_player_data(uid, data, parsed, output_root, repository):
+    player = parsed['player']
+    all_characters = parsed['characters']
+    all_artifacts = parsed['artifacts']
+
+    # --- INTELLIGENT MERGE ---
+    print("\n" + "=" * 70)
+    print(i18n.get("INTELLIGENT_MERGE"))
+    print("=" * 70)
+
+    # Prepare folder and base name for files (sharded by UID: <root>/73/41/734186982)
+    folder_path = shards.shard_dir(output_root, uid)
+    folder_name = shards.display_path(output_root, folder_path)
+
+    # Create folder if it doesn't exist
+    if not folder_path.exists():
+        folder_path.mkdir(parents=True, exist_ok=True)
+        print(i18n.get("FOLDER_CREATED", folder=folder_name))
+
+    # File paths in the folder
+    base_name_chars = str(folder_path / "characters")
+    base_name_artifacts = str(folder_path / "artifacts")
+
+    # Compare with the fingerprints of the previous scan (only if its files are still there)
+    fingerprints = showcase_fingerprints(data)
+    previous = load_fingerprints(folder_path)
+    has_files = raw_store.exists(folder_path) and get_current_version(base_name_chars)[0] > 0 \
+        and get_current_version(base_name_artifacts)[0] > 0
+    if not has_files:
+        previous = {}
+
+    if previous.get('showcase') == fingerprints['showcase']:
+        print(i18n.get("SHOWCASE_UNCHANGED"))
+        print(i18n.get("ALL_FILES_IN_FOLDER", folder=folder_name))
+        if repository is not None and not repository.has_folder(str(uid)):
+            _publish_scan(repository, uid, output_root, folder_path, parsed, fingerprints,
+                          {'characters': get_current_version(base_name_chars)[0],
+                           'artifacts': get_current_version(base_name_artifacts)[0]})
+        return folder_path
+
+    previous_avatars = previous.get('avatars', {})
+    # Fingerprints of older scans were keyed by name: none match, so every avatar is reprocessed once
+    changed = {avatar_id for avatar_id, fp in fingerprints['avatars'].items() if previous_avatars.get(avatar_id) != fp}
+    changed_chars = [c for c in all_characters if str(c.avatar_id) in changed]
+    changed_artifacts = [a for c in changed_chars for a in c.artifacts]
+    if previous:
+        print(i18n.get("AVATARS_CHANGED", changed=len(changed_chars), total=len(all_characters)))
+
+    # Characters - merged into the current version if exists
+    char_file, char_version, char_changed, char_stats, char_total = _merge_versioned(
+        base_name_chars,
+        [c.to_dict() for c in changed_chars],
+        create_character_key,
+        ['Character'],
+        skipped=len(all_characters) - len(changed_chars),
+    )
+
+    print(i18n.get("FILE_CHARACTERS", filename=char_file))
+    print(i18n.get("VERSION_INFO", version=char_version) + (i18n.get("NEW_TAG") if char_changed else i18n.get("UNCHANGED_TAG")))
+    print(i18n.get("STATS_ADDED", count=char_stats['added']))
+    print(i18n.get("STATS_UPDATED", count=char_stats['updated']))
+    print(i18n.get("STATS_UNCHANGED", count=char_stats['unchanged']))
+    if char_total is not None:
+        print(i18n.get("STATS_TOTAL_ENTRIES", count=char_total))
+
+    # Artifacts - merged into the current version if exists
+    art_file, art_version, art_changed, artifact_stats, art_total = _merge_versioned(
+        base_name_artifacts,
+        [a.to_dict() for a in changed_artifacts],
+        create_artifact_key,
+        ['Character', 'Slot'],
+        skipped=len(all_artifacts) - len(changed_artifacts),
+    )
+
+    print(i18n.get("FILE_ARTIFACTS", filename=art_file))
+    print(i18n.get("VERSION_INFO", version=art_version) + (i18n.get("NEW_TAG") if art_changed else i18n.get("UNCHANGED_TAG")))
+    print(i18n.get("STATS_ADDED", count=artifact_stats['added']))
+    print(i18n.get("STATS_UPDATED", count=artifact_stats['updated']))
+    print(i18n.get("STATS_UNCHANGED", count=artifact_stats['unchanged']))
+    if art_total is not None:
+        print(i18n.get("STATS_TOTAL_PIECES", count=art_total))
+
+    # --- COMBINED FILE (Stats + Artifacts per character) ---
+    base_name_combined = str(folder_path / "combined")
+    if not changed_chars:
+        # Only the player info changed: the combined snapshot is the same
+        _save_raw_snapshot(folder_path, folder_name, data, fingerprints)
+        _publish_scan(repository, uid, output_root, folder_path, parsed, fingerprints,
+                      {'characters': char_version, 'artifacts': art_version})
+        return folder_path
+
+    # Create combined DataFrame
+    combined_rows = []
+    empty_slot = {'Set': '', 'Main': '', 'MainVal': '', 'CV': '', 'Subs': ''}
+
+    for char_data in all_characters:
+        # Base row with character stats
+        row = char_data.to_dict()
+        del row['Weapon_Refine']
+
+        # Each artifact of the character as columns
+        arts_by_slot = char_data.artifacts_by_slot()
+        for slot in records.SLOT_ORDER:
+            art = arts_by_slot.get(slot)
+            prefix = slot[:2].upper()  # FL, PL, SA, GO, CI
+
+            if art is None:
+                for column, value in empty_slot.items():
+                    row[f'{prefix}_{column}'] = value
+                continue
+            row[f'{prefix}_Set'] = art.set_name
+            row[f'{prefix}_Main'] = art.main_stat
+            row[f'{prefix}_MainVal'] = art.main_value
+            row[f'{prefix}_CV'] = art.crit_value
+            # Condensed substats
+            row[f'{prefix}_Subs'] = ' | '.join(f"{name}:{value}" for name, value in art.substats())
+
+        combined_rows.append(row)
+
+    combined_df = pd.DataFrame(combined_rows)
+
+    # Versioning for combined file
+    has_combined_changes = char_stats['added'] > 0 or char_stats['updated'] > 0 or \
+                           artifact_stats['added'] > 0 or artifact_stats['updated'] > 0
+    combined_stats = {
+        'added': char_stats['added'],
+        'updated': max(char_stats['updated'], artifact_stats['updated']),
+        'unchanged': 0 if has_combined_changes else len(combined_rows)
+    }
+
+    existing_combined = load_current_version(base_name_combined)
+
+    comb_file, comb_version, comb_changed = save_with_versioning(
+        combined_df, base_name_combined, existing_combined, combined_stats
+    )
+
+    print(i18n.get("FILE_COMBINED", filename=comb_file))
+    print(i18n.get("VERSION_INFO", version=comb_version) + (i18n.get("NEW_TAG") if comb_changed else i18n.get("UNCHANGED_TAG")))
+    print(i18n.get("COMBINED_INFO", count=len(combined_df)))
+
+    _save_raw_snapshot(folder_path, folder_name, data, fingerprints)
+    _publish_scan(repository, uid, output_root, folder_path, parsed, fingerprints,
+                  {'characters': char_version, 'artifacts': art_version})
+    return folder_path
+
+def _save_raw_snapshot(folder_path, folder_name, data, fingerprints):
+    """Raw JSON, compressed (overwritten when the showcase changed - it's a snapshot), then the fingerprints."""
+    json_filename = str(raw_store.write_raw(folder_path, data))
+    # Written last: a crash before this point simply reprocesses the avatars next time
+    _write_json_atomic(folder_path / FINGERPRINTS_FILE, fingerprints, indent=2)
+    print(i18n.get("RAW_JSON", filename=json_filename))
+    print(i18n.get("ALL_FILES_IN_FOLDER", folder=folder_name))
+
+def _publish_scan(repository, uid, output_root, folder_path, parsed, fingerprints, versions):
+    """
+    Stamps the folder manifest (and the root index of manifests), then records the
+    persisted scan in the scan database (scan_db.ScanRepository) when one is given.
+    """
+    manifest.record_scan(folder_path, uid, parsed['player'].get('nickname'), root=output_root)
+    if repository is None:
+        return
+    try:
+        repository.record_scan(uid, folder_path.name, parsed['player'], parsed['characters'], parsed['artifacts'],
+                               showcase_hash=fingerprints['showcase'], versions=versions)
+    except Exception as e:
+        # The files are written: the scan can still be indexed later (scan_db.backfill)
+        print(i18n.get("SCAN_DB_ERROR", error=e))
+
+def fetch_player_data(uid, output_root=None, repository=None, writer=None):
+    """
+    Fetches and formats player data, then saves it (versioned tables + raw snapshot).
+    With a scan_db.ScanRepository, the scan is also indexed in the scan database.
+    With a write_behind.ScanWriter, saving is handed to its background thread and the
+    data is returned as soon as it is parsed.
+    """
+    if not str(uid).isdigit():
+        return None, "Invalid UID format"
+
+    try:
+        data, error = request_player_data(uid)
+        if error:
+            return None, error
+
+        player = data.get('playerInfo', {})
+        print(i18n.get("PLAYER_INFO", nickname=player.get('nickname')))
+        print(i18n.get("PLAYER_LEVEL", level=player.get('level'), world_level=player.get('worldLevel')))
+
+        parsed, error = parse_player_data(data)
+        if error:
+            if error != "Profile hidden or no data":
                 print(i18n.get("NO_CHARACTERS"))
-                return None, "No characters"
-            
-            print(i18n.get("SHOWCASE_COUNT", count=len(avatar_list)))
-            
-            all_characters = []
-            all_artifacts = []
-            
-            for avatar in avatar_list:
-                avatar_id = avatar.get('avatarId')
-                char_name = CHARACTER_MAP.get(avatar_id, f"ID_{avatar_id}")
-                
-                prop_map = avatar.get('propMap', {})
-                level = int(prop_map.get('4001', {}).get('val', 0))
-                
-                fight_props = avatar.get('fightPropMap', {})
-                
-                max_hp = round(fight_props.get('2000', 0))
-                atk = round(fight_props.get('2001', 0))
-                defense = round(fight_props.get('2002', 0))
-                em = round(fight_props.get('28', 0))
-                er = round(fight_props.get('23', 1) * 100, 1)
-                crit_rate = round(fight_props.get('20', 0) * 100, 1)
-                crit_dmg = round(fight_props.get('22', 0) * 100, 1)
-                
-                element, elem_bonus = get_element_bonus(fight_props)
-                weapon_info = extract_weapon_info(avatar.get('equipList', []))
-                
-                char_artifacts = extract_artifacts(avatar.get('equipList', []), char_name)
-                all_artifacts.extend(char_artifacts)
-                
-                total_cv = sum(a['Crit_Value'] for a in char_artifacts)
-                
-                print(f"  🎭 {char_name} (Lv.{level})")
-                print(f"     Crit: {crit_rate}% / {crit_dmg}%  |  CV: {total_cv}")
-                
-                all_characters.append({
-                    'Character': char_name,
-                    'Level': level,
-                    'HP': max_hp,
-                    'ATK': atk,
-                    'DEF': defense,
-                    'EM': em,
-                    'ER%': er,
-                    'Crit_Rate%': crit_rate,
-                    'Crit_DMG%': crit_dmg,
-                    'Element': element or "N/A",
-                    'Elem_Bonus%': elem_bonus,
-                    'Total_CV': total_cv,
-                    'Weapon_Refine': weapon_info['refinement'] if weapon_info else 0,
-                })
-            
-            # --- INTELLIGENT MERGE ---
-            print("\n" + "=" * 70)
-            print(i18n.get("INTELLIGENT_MERGE"))
-            print("=" * 70)
-            
-            # Prepare folder and base name for files
-            nickname = player.get('nickname', 'Unknown')
-            safe_nickname = sanitize_filename(nickname)
-            folder_name = f"{safe_nickname}_{uid}"
-            folder_path = output_root / folder_name
-            
-            # Create folder if it doesn't exist
-            if not folder_path.exists():
-                folder_path.mkdir(parents=True, exist_ok=True)
-                print(i18n.get("FOLDER_CREATED", folder=folder_name))
-            
-            # File paths in the folder
-            base_name_chars = str(folder_path / "characters")
-            base_name_artifacts = str(folder_path / "artifacts")
-            
-            # Characters - Load current version if exists
-            current_char_version, current_char_file = get_current_version(base_name_chars)
-            existing_chars = load_existing_csv(current_char_file) if current_char_file else None
-            new_chars_df = pd.DataFrame(all_characters)
-            
-            merged_chars, char_stats = merge_dataframes(
-                existing_chars, 
-                new_chars_df,
-                create_character_key,
-                ['Character']
-            )
-            
-            char_file, char_version, char_changed = save_with_versioning(
-                merged_chars, base_name_chars, existing_chars, char_stats
-            )
-            
-            print(i18n.get("FILE_CHARACTERS", filename=char_file))
-            print(i18n.get("VERSION_INFO", version=char_version) + (i18n.get("NEW_TAG") if char_changed else i18n.get("UNCHANGED_TAG")))
-            print(i18n.get("STATS_ADDED", count=char_stats['added']))
-            print(i18n.get("STATS_UPDATED", count=char_stats['updated']))
-            print(i18n.get("STATS_UNCHANGED", count=char_stats['unchanged']))
-            print(i18n.get("STATS_TOTAL_ENTRIES", count=len(merged_chars)))
-            
-            # Artifacts - Load current version if exists
-            current_art_version, current_art_file = get_current_version(base_name_artifacts)
-            existing_artifacts = load_existing_csv(current_art_file) if current_art_file else None
-            new_artifacts_df = pd.DataFrame(all_artifacts)
-            
-            merged_artifacts, artifact_stats = merge_dataframes(
-                existing_artifacts,
-                new_artifacts_df,
-                create_artifact_key,
-                ['Character', 'Slot']
-            )
-            
-            art_file, art_version, art_changed = save_with_versioning(
-                merged_artifacts, base_name_artifacts, existing_artifacts, artifact_stats
-            )
-            
-            print(i18n.get("FILE_ARTIFACTS", filename=art_file))
-            print(i18n.get("VERSION_INFO", version=art_version) + (i18n.get("NEW_TAG") if art_changed else i18n.get("UNCHANGED_TAG")))
-            print(i18n.get("STATS_ADDED", count=artifact_stats['added']))
-            print(i18n.get("STATS_UPDATED", count=artifact_stats['updated']))
-            print(i18n.get("STATS_UNCHANGED", count=artifact_stats['unchanged']))
-            print(i18n.get("STATS_TOTAL_PIECES", count=len(merged_artifacts)))
-            
-            # --- COMBINED FILE (Stats + Artifacts per character) ---
-            base_name_combined = str(folder_path / "combined")
-            
-            # Create combined DataFrame
-            combined_rows = []
-            slot_order = ['Flower', 'Plume', 'Sands', 'Goblet', 'Circlet']
-            
-            for char_data in all_characters:
-                char_name = char_data['Character']
-                
-                # Base row with character stats
-                row = {
-                    'Character': char_name,
-                    'Level': char_data['Level'],
-                    'HP': char_data['HP'],
-                    'ATK': char_data['ATK'],
-                    'DEF': char_data['DEF'],
-                    'EM': char_data['EM'],
-                    'ER%': char_data['ER%'],
-                    'Crit_Rate%': char_data['Crit_Rate%'],
-                    'Crit_DMG%': char_data['Crit_DMG%'],
-                    'Element': char_data['Element'],
-                    'Elem_Bonus%': char_data['Elem_Bonus%'],
-                    'Total_CV': char_data['Total_CV'],
-                }
-                
-                # Fetch artifacts for this character
-                char_arts = [a for a in all_artifacts if a['Character'] == char_name]
-                arts_by_slot = {a['Slot']: a for a in char_arts}
-                
-                # Add each artifact as columns
-                for slot in slot_order:
-                    art = arts_by_slot.get(slot, {})
-                    prefix = slot[:2].upper()  # FL, PL, SA, GO, CI
-                    
-                    row[f'{prefix}_Set'] = art.get('Set', '')
-                    row[f'{prefix}_Main'] = art.get('Main_Stat', '')
-                    row[f'{prefix}_MainVal'] = art.get('Main_Value', '')
-                    row[f'{prefix}_CV'] = art.get('Crit_Value', '')
-                    # Condensed substats
-                    subs = []
-                    for i in range(1, 5):
-                        sub_name = art.get(f'Sub{i}', '')
-                        sub_val = art.get(f'Sub{i}_Val', '')
-                        if sub_name:
-                            subs.append(f"{sub_name}:{sub_val}")
-                    row[f'{prefix}_Subs'] = ' | '.join(subs)
-                
-                combined_rows.append(row)
-            
-            combined_df = pd.DataFrame(combined_rows)
-            
-            # Versioning for combined file
-            has_combined_changes = char_stats['added'] > 0 or char_stats['updated'] > 0 or \
-                                   artifact_stats['added'] > 0 or artifact_stats['updated'] > 0
-            combined_stats = {
-                'added': char_stats['added'],
-                'updated': max(char_stats['updated'], artifact_stats['updated']),
-                'unchanged': 0 if has_combined_changes else len(combined_rows)
-            }
-            
-            current_comb_version, current_comb_file = get_current_version(base_name_combined)
-            existing_combined = load_existing_csv(current_comb_file) if current_comb_file else None
-            
-            comb_file, comb_version, comb_changed = save_with_versioning(
-                combined_df, base_name_combined, existing_combined, combined_stats
-            )
-            
-            print(i18n.get("FILE_COMBINED", filename=comb_file))
-            print(i18n.get("VERSION_INFO", version=comb_version) + (i18n.get("NEW_TAG") if comb_changed else i18n.get("UNCHANGED_TAG")))
-            print(i18n.get("COMBINED_INFO", count=len(combined_df)))
-            
-            # Raw JSON (always overwritten - it's a snapshot)
-            json_filename = str(folder_path / "raw.json")
-            with open(json_filename, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
-            print(i18n.get("RAW_JSON", filename=json_filename))
-            print(i18n.get("ALL_FILES_IN_FOLDER", folder=folder_name))
-            
-            # Structure data for API (leaderboard.py expects {'stats': ..., 'artifacts': ...})
-            api_data = []
-            for char_stat in all_characters:
-                c_name = char_stat['Character']
-                c_arts = [a for a in all_artifacts if a['Character'] == c_name]
-                api_data.append({
-                    'stats': char_stat,
-                    'artifacts': c_arts
-                })
-
-            return api_data, None
-            
-        elif response.status_code == 400:
-            print(i18n.get("UID_INVALID"))
-            return None, "UID invalid"
-        elif response.status_code == 404:
-            print(i18n.get("PLAYER_NOT_FOUND"))
-            return None, "Player not found"
-        elif response.status_code == 424:
-            print(i18n.get("MAINTENANCE"))
-            return None, "Maintenance"
-        elif response.status_code == 429:
-            print(i18n.get("RATE_LIMITED"))
-            return None, "Rate limited"
+            return None, error
+
+        print(i18n.get("SHOWCASE_COUNT", count=len(data['avatarInfoList'])))
+        for char_data in parsed['characters']:
+            print(f"  🎭 {char_data.name} (Lv.{char_data.level})")
+            print(f"     Crit: {char_data.crit_rate}% / {char_data.crit_dmg}%  |  CV: {char_data.total_cv}")
+
+        if writer is not None:
+            writer.submit(uid, data, parsed)
         else:
-            print(i18n.get("ERROR_STATUS", status=response.status_code))
-            return None, f"Error {response.status_code}"
-            
+            save_player_data(uid, data, parsed, output_root=output_root, repository=repository)
+
+        return to_api_data(parsed), None
+
     except Exception as e:
         print(i18n.get("CRASH_MSG", error=e))
         import traceback
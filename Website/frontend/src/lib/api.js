@@ -33,6 +33,52 @@ export const getLeaderboardDeep = async (calcId, character, limit = 20) => {
     return response.data;
 };
 
+// Streams deep leaderboard rows (NDJSON) as soon as each Enka fetch finishes.
+// onEvent receives {event: 'stream'|'start'|'row'|'progress'|'summary'|'error', ...}
+export const streamLeaderboardDeep = async (calcId, character, limit = 20, onEvent = () => {}, signal, shallow = false) => {
+    const params = new URLSearchParams({ character, limit: String(limit), shallow: String(shallow) });
+    const response = await fetch(`${API_URL}/leaderboard/deep/${calcId}/stream?${params}`, { signal });
+    if (!response.ok) {
+        const body = await response.json().catch(() => ({}));
+        throw new Error(body.detail || `Deep stream failed (${response.status})`);
+    }
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    for (;;) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split('\n');
+        buffer = lines.pop();
+        for (const line of lines) {
+            if (line.trim()) onEvent(JSON.parse(line));
+        }
+    }
+    if (buffer.trim()) onEvent(JSON.parse(buffer));
+};
+
+export const stopLeaderboardDeepStream = async (streamId) => {
+    const response = await api.delete(`/leaderboard/deep/stream/${streamId}`);
+    return response.data;
+};
+
+// Background deep leaderboard jobs (survive page reloads, poll with offset for new rows)
+export const createDeepJob = async (calcId, character, limit = 20, shallow = false) => {
+    const response = await api.post('/jobs/leaderboard/deep', { calc_id: calcId, character, limit, shallow });
+    return response.data;
+};
+
+export const getJob = async (jobId, offset = 0) => {
+    const response = await api.get(`/jobs/${jobId}`, { params: { offset } });
+    return response.data;
+};
+
+export const cancelJob = async (jobId) => {
+    const response = await api.delete(`/jobs/${jobId}`);
+    return response.data;
+};
+
 export const analyzeBuild = async (apiKey, userData, contextData, targetChar, modelName, buildNotes, provider = 'ollama') => {
     // Local AI (Mistral) can take several minutes on CPU - set 10 min timeout
     const response = await api.post('/analyze', {
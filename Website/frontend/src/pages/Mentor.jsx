@@ -1,6 +1,6 @@
 import React, { useEffect, useMemo, useState } from "react";
 import { useParams, useNavigate } from "react-router-dom";
-import { getLeaderboard, getLeaderboardDeep, analyzeBuild } from "../lib/api";
+import { getLeaderboard, streamLeaderboardDeep, stopLeaderboardDeepStream, analyzeBuild } from "../lib/api";
 import {
   Brain,
   BookOpen,
@@ -211,6 +211,7 @@ const Mentor = () => {
   });
   const [loadingContext, setLoadingContext] = useState(false);
   const [loadingDeep, setLoadingDeep] = useState(false);
+  const [deepStreamId, setDeepStreamId] = useState(null);
   const [loadingAI, setLoadingAI] = useState(false);
   const [loadingMessage, setLoadingMessage] = useState("");
   const [errorFragment, setErrorFragment] = useState(null);
@@ -518,18 +519,45 @@ const Mentor = () => {
     setErrorFragment(null);
     try {
       const target = displayName || charName;
-      const res = await getLeaderboardDeep(calcId.trim(), target, safeLimit);
-      const payload = res?.data ?? res;
-      setContextData(payload);
-      sessionStorage.setItem("context_data", JSON.stringify(payload));
+      const rows = [];
+      let summary = null;
+      await streamLeaderboardDeep(calcId.trim(), target, safeLimit, (event) => {
+        if (event.event === "stream") {
+          setDeepStreamId(event.stream_id);
+        } else if (event.event === "row") {
+          rows.push(event.data);
+          setContextData([...rows]);
+        } else if (event.event === "summary") {
+          summary = event;
+        } else if (event.event === "error") {
+          throw new Error(event.detail);
+        }
+      });
+      if (!rows.length) {
+        throw new Error(
+          summary?.total ? "No entry found for this character." : "No data found or ID invalid",
+        );
+      }
+      sessionStorage.setItem("context_data", JSON.stringify(rows));
     } catch (err) {
-      console.error("getLeaderboardDeep error", err, err.response?.data);
+      console.error("streamLeaderboardDeep error", err);
       setErrorFragment(
-        err.response?.data?.detail ||
+        err.message ||
         "Deep scan failed. This can take time or hit rate limits.",
       );
     } finally {
       setLoadingDeep(false);
+      setDeepStreamId(null);
+    }
+  };
+
+  // Early stop: the server ends the stream with a summary, the rows already received are kept
+  const handleStopDeepContext = async () => {
+    if (!deepStreamId) return;
+    try {
+      await stopLeaderboardDeepStream(deepStreamId);
+    } catch (err) {
+      console.error("stopLeaderboardDeepStream error", err);
     }
   };
 
@@ -1056,6 +1084,14 @@ const Mentor = () => {
                       "Deep"
                     )}
                   </button>
+                  {loadingDeep && deepStreamId && (
+                    <button
+                      onClick={handleStopDeepContext}
+                      className="px-3 py-2 rounded-md border border-[var(--color-line)] text-[var(--color-text-strong)]"
+                    >
+                      Stop
+                    </button>
+                  )}
                 </div>
                 {errorFragment && (
                   <div className="text-xs text-red-400">{errorFragment}</div>
@@ -56,6 +56,10 @@ TRANSLATIONS = {
         "FR": "\n🚀 Récupération du leaderboard (top {limit})...",
         "EN": "\n🚀 Fetching leaderboard (top {limit})..."
     },
+    "PARTIAL_LEADERBOARD": {
+        "FR": "⚠️ Classement incomplet : {count} entrées (pages 1 à {page}). Relance pour reprendre.",
+        "EN": "⚠️ Incomplete leaderboard: {count} entries (pages 1 to {page}). Run again to resume."
+    },
     "NO_DATA_RETURNED": {
         "FR": "⚠️ Aucune donnée retournée. Vérifie le Leaderboard ID.",
         "EN": "⚠️ No data returned. Check the Leaderboard ID."
@@ -198,6 +202,18 @@ Examples of common IDs:
         "FR": "   📊 {count} personnages avec artéfacts intégrés",
         "EN": "   📊 {count} characters with integrated artifacts"
     },
+    "SHOWCASE_UNCHANGED": {
+        "FR": "✅ Vitrine identique au dernier scan : aucun fichier réécrit.",
+        "EN": "✅ Showcase identical to the last scan: no file rewritten."
+    },
+    "AVATARS_CHANGED": {
+        "FR": "🔄 {changed}/{total} personnages modifiés depuis le dernier scan.",
+        "EN": "🔄 {changed}/{total} characters changed since the last scan."
+    },
+    "SCAN_DB_ERROR": {
+        "FR": "⚠️ Scan non indexé dans la base de données : {error}",
+        "EN": "⚠️ Scan not indexed in the database: {error}"
+    },
     "RAW_JSON": {
         "FR": "\n📁 JSON brut: '{filename}' (snapshot actuel)",
         "EN": "\n📁 Raw JSON: '{filename}' (current snapshot)"
@@ -322,9 +338,13 @@ without creating duplicates!
         "FR": "❌ Échec ({error})",
         "EN": "❌ Failed ({error})"
     },
-    "INTERMEDIATE_SAVE": {
-        "FR": "   💾 (Sauvegarde intermédiaire...)",
-        "EN": "   💾 (Intermediate save...)"
+    "RESUMING_SCAN": {
+        "FR": "   ⏩ Reprise : {count} UID déjà traités, ignorés.",
+        "EN": "   ⏩ Resuming: {count} UIDs already completed, skipped."
+    },
+    "RESUME_HINT": {
+        "FR": "   ⏸️  Progression conservée dans {folder}. Relancez avec --resume pour continuer.",
+        "EN": "   ⏸️  Progress kept in {folder}. Run again with --resume to continue."
     },
     "USER_INTERRUPT": {
         "FR": "\n\n⚠️ Interruption utilisateur detected!",
@@ -338,6 +358,18 @@ without creating duplicates!
         "FR": "\n💾 Étape 3: Sauvegarde finale...",
         "EN": "\n💾 Step 3: Final save..."
     },
+    "BATCH_TITLE": {
+        "FR": "🗂️  MODE BATCH : {count} classements",
+        "EN": "🗂️  BATCH MODE: {count} leaderboards"
+    },
+    "BATCH_UNIQUE_UIDS": {
+        "FR": "\n🔗 {entries} entrées, {uids} joueurs uniques à récupérer sur Enka.",
+        "EN": "\n🔗 {entries} entries, {uids} unique players to fetch from Enka."
+    },
+    "BATCH_FETCHES_SAVED": {
+        "FR": "\n♻️  Déduplication : {saved} requêtes Enka évitées sur {entries} entrées.",
+        "EN": "\n♻️  Deduplication: {saved} Enka fetches saved out of {entries} entries."
+    },
     "CHOOSE_LANG": {
         "FR": "🌐 Choisissez la langue / Choose language (FR/EN) [FR]: ",
         "EN": "🌐 Choose language / Choisissez la langue (FR/EN) [EN]: " 
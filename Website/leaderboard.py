@@ -2,6 +2,8 @@ import time
 import pandas as pd
 import akasha
 import enka
+import snapshots
+import sampling
 try:
     import exportmd
 except ImportError:
@@ -16,6 +18,7 @@ import i18n
 # --- CONFIGURATION ---
 REQUEST_DELAY = 5.0  # Seconds between requests
 MAX_RETRIES = 3      # Max retries for Enka API
+QUEUE_IDLE_TIMEOUT = 300  # Seconds a queued job waits without any worker before failing
 
 def save_data(rows, calculation_id, errors=None):
     """Save data to CSV and JSON."""
@@ -73,6 +76,259 @@ def save_data(rows, calculation_id, errors=None):
     if errors:
         print(i18n.get("ERRORS_ENCOUNTERED", count=len(errors)))
 
+class ScanJournal:
+    """
+    Append-only progress of one scan, kept next to the reports in scan_<ID>/:
+    - rows.jsonl: one row per line, appended as soon as a player is fetched
+    - checkpoint.jsonl: one completed UID per line, written after its rows
+    Rows whose UID never reached the checkpoint (crash in between) are dropped on resume.
+    """
+    ROWS_FILE = "rows.jsonl"
+    CHECKPOINT_FILE = "checkpoint.jsonl"
+
+    def __init__(self, calculation_id, resume=False):
+        self.folder = f"scan_{calculation_id}"
+        os.makedirs(self.folder, exist_ok=True)
+        self.rows_path = os.path.join(self.folder, self.ROWS_FILE)
+        self.checkpoint_path = os.path.join(self.folder, self.CHECKPOINT_FILE)
+        self.completed = set()
+        self.rows = []
+
+        if resume:
+            self._load()
+        else:
+            for path in (self.rows_path, self.checkpoint_path):
+                if os.path.exists(path):
+                    os.remove(path)
+
+        self._rows_file = open(self.rows_path, 'a', encoding='utf-8')
+        self._checkpoint_file = open(self.checkpoint_path, 'a', encoding='utf-8')
+
+    @staticmethod
+    def _read_lines(path):
+        if not os.path.exists(path):
+            return []
+        items = []
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    items.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # Torn last line from an interrupted write
+                    break
+        return items
+
+    def _load(self):
+        self.completed = {str(item['uid']) for item in self._read_lines(self.checkpoint_path)}
+        self.rows = [r for r in self._read_lines(self.rows_path) if str(r.get('UID')) in self.completed]
+
+        # Rewrite the row log once so orphaned rows cannot be duplicated later
+        tmp_path = self.rows_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for row in self.rows:
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+        os.replace(tmp_path, self.rows_path)
+
+    def is_done(self, uid):
+        return str(uid) in self.completed
+
+    def record(self, uid, rows):
+        """Appends the rows of one player, then marks the UID as completed."""
+        for row in rows:
+            self._rows_file.write(json.dumps(row, ensure_ascii=False) + "\n")
+        self._rows_file.flush()
+        os.fsync(self._rows_file.fileno())
+
+        self._checkpoint_file.write(json.dumps({'uid': str(uid)}) + "\n")
+        self._checkpoint_file.flush()
+        os.fsync(self._checkpoint_file.fileno())
+
+        self.rows.extend(rows)
+        self.completed.add(str(uid))
+
+    def close(self):
+        self._rows_file.close()
+        self._checkpoint_file.close()
+
+    def discard(self):
+        """Removes the journal once the final reports are written."""
+        self.close()
+        for path in (self.rows_path, self.checkpoint_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+def build_scan_rows(entry, char_data_list):
+    """Combines one Akasha leaderboard entry with every character of its Enka showcase."""
+    rows = []
+    slot_map = {'Flower': 'FL', 'Plume': 'PL', 'Sands': 'SA', 'Goblet': 'GO', 'Circlet': 'CI'}
+
+    for char_data in char_data_list:
+        stats = char_data['stats']
+        artifacts = char_data['artifacts']
+
+        # Base row info (Leaderboard context)
+        row = {
+            'UID': entry['UID'],
+            'Player': entry['Player'],
+            'Region': entry['Region'],
+            'LB_Rank': entry['Rank'],
+            'LB_Weapon': entry['Weapon'],
+            'LB_DMG': entry['DMG_Result'],
+        }
+
+        # Add Character Stats
+        row.update(stats)
+
+        # Add Artifacts (Columns)
+        for art in artifacts:
+            slot = art['Slot']
+            prefix = slot_map.get(slot)
+            if prefix:
+                row[f'{prefix}_Set'] = art['Set']
+                row[f'{prefix}_Main'] = f"{art['Main_Stat']} {art['Main_Value']}"
+                row[f'{prefix}_CV'] = art['Crit_Value']
+
+                # Substats formatting
+                subs = []
+                for k in range(1, 5):
+                    s_name = art.get(f'Sub{k}')
+                    s_val = art.get(f'Sub{k}_Val')
+                    if s_name:
+                        subs.append(f"{s_name}:{s_val}")
+                row[f'{prefix}_Subs'] = " | ".join(subs)
+
+        rows.append(row)
+    return rows
+
+def read_batch_ids(argv):
+    """
+    Collects calculation IDs from `--batch id1,id2` and/or `--batch-file path`
+    (one or more IDs per line, '#' starts a comment). Duplicates are dropped, order is kept.
+    """
+    raw = []
+    if "--batch" in argv:
+        idx = argv.index("--batch")
+        if idx + 1 < len(argv):
+            raw.extend(argv[idx + 1].split(','))
+    if "--batch-file" in argv:
+        idx = argv.index("--batch-file")
+        if idx + 1 < len(argv):
+            with open(argv[idx + 1], 'r', encoding='utf-8') as f:
+                for line in f:
+                    raw.extend(line.split('#', 1)[0].replace(',', ' ').split())
+
+    calc_ids = []
+    for calc_id in (c.strip() for c in raw):
+        if calc_id and calc_id not in calc_ids:
+            calc_ids.append(calc_id)
+    return calc_ids
+
+def _finalize_scan(journal, calc_id, errors, interrupted):
+    """Writes the reports once. The journal is kept when the scan has to be resumed."""
+    save_data(journal.rows, calc_id, errors)
+    if interrupted or errors:
+        journal.close()
+        print(i18n.get("RESUME_HINT", folder=journal.folder))
+    else:
+        journal.discard()
+
+def run_batch(calc_ids, limit=50, request_delay=REQUEST_DELAY, resume=False):
+    """
+    Scans several leaderboards at once. Each UID is fetched from Enka only once,
+    even if the player appears on many leaderboards, and the result is fanned out
+    to every leaderboard dataset. With `resume`, UIDs already completed for a
+    leaderboard in a previous run are skipped. Returns the deduplication stats.
+    """
+    print("=" * 70)
+    print(i18n.get("BATCH_TITLE", count=len(calc_ids)))
+    print("=" * 70)
+
+    # --- STEP 1: AKASHA (all leaderboards) ---
+    leaderboards = {}
+    for calc_id in calc_ids:
+        print(f"\n📌 {calc_id}")
+        entries = akasha.fetch_leaderboard(calc_id, limit=limit)
+        if not entries:
+            print(i18n.get("CANNOT_FETCH_LEADERBOARD"))
+            continue
+        leaderboards[calc_id] = entries
+        print(i18n.get("PLAYERS_FOUND", count=len(entries)))
+
+    # Union of UIDs, in order of first appearance: uid -> [(calc_id, entry), ...]
+    uid_refs = {}
+    for calc_id, entries in leaderboards.items():
+        for entry in entries:
+            if entry.get('UID'):
+                uid_refs.setdefault(entry['UID'], []).append((calc_id, entry))
+
+    total_entries = sum(len(refs) for refs in uid_refs.values())
+    stats = {
+        'leaderboards': len(leaderboards),
+        'entries': total_entries,
+        'unique_uids': len(uid_refs),
+        'fetches_saved': total_entries - len(uid_refs),
+    }
+    print(i18n.get("BATCH_UNIQUE_UIDS", entries=total_entries, uids=len(uid_refs)))
+
+    # --- STEP 2: ENKA (once per UID) ---
+    print(i18n.get("STEP_2_ENKA"))
+    print(i18n.get("RATE_LIMIT_DELAY", seconds=request_delay))
+
+    journals = {calc_id: ScanJournal(calc_id, resume=resume) for calc_id in leaderboards}
+    errors = {calc_id: [] for calc_id in leaderboards}
+
+    # Only the leaderboards that still miss a UID need it
+    pending = {}
+    for uid, refs in uid_refs.items():
+        todo = [(calc_id, entry) for calc_id, entry in refs if not journals[calc_id].is_done(uid)]
+        if todo:
+            pending[uid] = todo
+    if len(pending) < len(uid_refs):
+        print(i18n.get("RESUMING_SCAN", count=len(uid_refs) - len(pending)))
+
+    interrupted = False
+    try:
+        for i, (uid, refs) in enumerate(pending.items(), 1):
+            player_name = refs[0][1]['Player']
+            print(f"\n   [{i}/{len(pending)}] {player_name} (UID: {uid}) x{len(refs)}...", end=" ", flush=True)
+
+            char_data_list, error = _fetch_player_with_retry(uid)
+            if not char_data_list:
+                print(i18n.get("FAILED_FETCH", error=error))
+                for calc_id, _ in refs:
+                    errors[calc_id].append({'uid': uid, 'error': error})
+            else:
+                print(i18n.get("SHOWCASE_COUNT", count=len(char_data_list)))
+                for calc_id, entry in refs:
+                    journals[calc_id].record(uid, build_scan_rows(entry, char_data_list))
+
+            # Rate limiting
+            if i < len(pending):
+                time.sleep(request_delay)
+
+    except KeyboardInterrupt:
+        interrupted = True
+        print(i18n.get("USER_INTERRUPT"))
+        print(i18n.get("SAVING_BEFORE_EXIT"))
+
+    # --- STEP 3: one dataset per leaderboard ---
+    print(i18n.get("STEP_3_FINAL_SAVE"))
+    for calc_id, journal in journals.items():
+        print(f"\n📌 {calc_id}")
+        _finalize_scan(journal, calc_id, errors[calc_id], interrupted)
+
+    print(i18n.get("BATCH_FETCHES_SAVED", saved=stats['fetches_saved'], entries=total_entries))
+    return stats
+
+def parse_limit(argv, default=50):
+    """Reads `--limit N` from the command line."""
+    if "--limit" in argv:
+        try:
+            return int(argv[argv.index("--limit") + 1])
+        except (ValueError, IndexError):
+            print(i18n.get("INVALID_LIMIT_DEFAULT"))
+    return default
+
 def main():
     # 0. Ask for language
     lang_input = input(i18n.get("CHOOSE_LANG")).strip().upper()
@@ -80,9 +336,19 @@ def main():
     
     calc_id = ""
     limit = 50
+    resume = "--resume" in sys.argv
+
+    # Batch mode: several leaderboards, each UID fetched once
+    if "--batch" in sys.argv or "--batch-file" in sys.argv:
+        calc_ids = read_batch_ids(sys.argv)
+        if not calc_ids:
+            print(i18n.get("ID_REQUIRED_STOP"))
+            return
+        run_batch(calc_ids, limit=parse_limit(sys.argv), resume=resume)
+        return
 
     # 1. Check CLI args first
-    if len(sys.argv) >= 2:
+    if len(sys.argv) >= 2 and not sys.argv[1].startswith("--"):
         calc_id = sys.argv[1]
     
     # 2. If no CLI arg, ask interactively
@@ -97,11 +363,7 @@ def main():
 
     # 3. Check for limit flag or ask interactively
     if "--limit" in sys.argv:
-        try:
-            limit_idx = sys.argv.index("--limit")
-            limit = int(sys.argv[limit_idx + 1])
-        except (ValueError, IndexError):
-            print(i18n.get("INVALID_LIMIT_DEFAULT"))
+        limit = parse_limit(sys.argv, limit)
     elif len(sys.argv) < 2: 
         # Only ask for limit if we are in interactive mode (no args provided at start)
         limit_input = input(i18n.get("ENTER_LIMIT")).strip()
@@ -127,149 +389,373 @@ def main():
     print(i18n.get("STEP_2_ENKA"))
     print(i18n.get("RATE_LIMIT_DELAY", seconds=REQUEST_DELAY))
     
-    all_rows = []
+    journal = ScanJournal(calc_id, resume=resume)
+    if journal.completed:
+        print(i18n.get("RESUMING_SCAN", count=len(journal.completed)))
     errors = []
-    
+    interrupted = False
+
     try:
         for i, entry in enumerate(leaderboard, 1):
             uid = entry['UID']
             player_name = entry['Player']
+            if journal.is_done(uid):
+                continue
             print(f"\n   [{i}/{len(leaderboard)}] {player_name} (UID: {uid})...", end=" ", flush=True)
             
-            # Retry logic
-            char_data_list = None
-            for attempt in range(MAX_RETRIES):
-                char_data_list, error = enka.fetch_player_data(uid)
-                if char_data_list:
-                    break
-                # Only retry if it's a timeout/network error, not 404
-                if "404" in str(error):
-                    break
-                time.sleep(2) # Short wait before retry
+            # Retry logic (only retries timeouts/network errors, not 404)
+            char_data_list, error = _fetch_player_with_retry(uid)
 
             if not char_data_list:
                 print(i18n.get("FAILED_FETCH", error=error))
                 errors.append({'uid': uid, 'error': error})
             else:
                 print(i18n.get("SHOWCASE_COUNT", count=len(char_data_list)))
-                
-                # Combine Akasha info with Enka info
-                for char_data in char_data_list:
-                    stats = char_data['stats']
-                    artifacts = char_data['artifacts']
-                    
-                    # Base row info (Leaderboard context)
-                    row = {
-                        'UID': uid,
-                        'Player': player_name,
-                        'Region': entry['Region'],
-                        'LB_Rank': entry['Rank'],
-                        'LB_Weapon': entry['Weapon'],
-                        'LB_DMG': entry['DMG_Result'],
-                    }
-                    
-                    # Add Character Stats
-                    row.update(stats)
-                    
-                    # Add Artifacts (Columns)
-                    slot_map = {'Flower': 'FL', 'Plume': 'PL', 'Sands': 'SA', 'Goblet': 'GO', 'Circlet': 'CI'}
-                    
-                    for art in artifacts:
-                        slot = art['Slot']
-                        prefix = slot_map.get(slot)
-                        if prefix:
-                            row[f'{prefix}_Set'] = art['Set']
-                            row[f'{prefix}_Main'] = f"{art['Main_Stat']} {art['Main_Value']}"
-                            row[f'{prefix}_CV'] = art['Crit_Value']
-                            
-                            # Substats formatting
-                            subs = []
-                            for k in range(1, 5):
-                                s_name = art.get(f'Sub{k}')
-                                s_val = art.get(f'Sub{k}_Val')
-                                if s_name:
-                                    subs.append(f"{s_name}:{s_val}")
-                            row[f'{prefix}_Subs'] = " | ".join(subs)
-                            
-                    all_rows.append(row)
-
-            # Intermediate save
-            if i % 10 == 0 and all_rows:
-                 print(i18n.get("INTERMEDIATE_SAVE"))
-                 save_data(all_rows, calc_id)
+                # Appended and checkpointed right away, nothing to lose on Ctrl-C
+                journal.record(uid, build_scan_rows(entry, char_data_list))
 
             # Rate limiting
             if i < len(leaderboard):
                 time.sleep(REQUEST_DELAY)
                 
     except KeyboardInterrupt:
+        interrupted = True
         print(i18n.get("USER_INTERRUPT"))
         print(i18n.get("SAVING_BEFORE_EXIT"))
-        save_data(all_rows, calc_id, errors)
-        return
 
     # Step 3: Save final combined CSV
     print(i18n.get("STEP_3_FINAL_SAVE"))
-    save_data(all_rows, calc_id, errors)
-
-if __name__ == "__main__":
-    main()
+    _finalize_scan(journal, calc_id, errors, interrupted)
 
 # --- API helper (non-interactive) ---
-def fetch_leaderboard_character(calculation_id, target_character_name, limit=50, request_delay=REQUEST_DELAY, max_retries=MAX_RETRIES):
+def _fetch_player_with_retry(uid, max_retries=MAX_RETRIES, characters=None):
     """
-    Fetches leaderboard entries, then pulls Enka data per UID and returns only the target character.
-    Returns a list of dicts compatible with backend context summary.
+    Calls enka.fetch_player_characters (no disk writes) with the usual retry policy (no retry on 404).
+    `characters` limits parsing to the given character names.
     """
-    leaderboard = akasha.fetch_leaderboard(calculation_id, limit=limit)
+    char_data_list = None
+    error = None
+    for _ in range(max_retries):
+        char_data_list, error = enka.fetch_player_characters(uid, characters=characters)
+        if char_data_list:
+            break
+        if error and "404" in str(error):
+            break
+        time.sleep(2)
+    return char_data_list, error
+
+def build_character_row(entry, target_char):
+    """Combines an Akasha leaderboard entry with the matching Enka character."""
+    stats = target_char['stats']
+    return {
+        'Rank': entry.get('Rank'),
+        'Player': entry.get('Player'),
+        'UID': entry.get('UID'),
+        'Region': entry.get('Region'),
+        'Weapon': entry.get('Weapon'),
+        'DMG_Result': entry.get('DMG_Result'),
+        'Character': stats.get('Character'),
+        'HP': stats.get('HP'),
+        'ATK': stats.get('ATK'),
+        'DEF': stats.get('DEF'),
+        'EM': stats.get('EM'),
+        'ER': stats.get('ER%') if stats.get('ER%') is not None else stats.get('ER'),
+        'Crit_Rate': stats.get('Crit_Rate%') if stats.get('Crit_Rate%') is not None else stats.get('Crit_Rate'),
+        'Crit_DMG': stats.get('Crit_DMG%') if stats.get('Crit_DMG%') is not None else stats.get('Crit_DMG'),
+        'Elem_Bonus': stats.get('Elem_Bonus%') if stats.get('Elem_Bonus%') is not None else stats.get('Elem_Bonus'),
+        'Artifacts': target_char.get('artifacts', []),
+        'Artifact_Sets': entry.get('Artifact_Sets'),
+    }
+
+# Stats Akasha must return for a row to be built without Enka
+SHALLOW_REQUIRED_STATS = ('HP', 'ATK', 'Crit_Rate', 'Crit_DMG')
+
+def build_shallow_row(entry, target_character_name):
+    """
+    Builds a deep leaderboard row from the Akasha entry alone (final stats and set bonuses,
+    no per-piece artifacts). Returns None when Akasha lacks stats, Enka is needed then.
+    """
+    if not all(entry.get(stat) for stat in SHALLOW_REQUIRED_STATS):
+        return None
+    return {
+        'Rank': entry.get('Rank'),
+        'Player': entry.get('Player'),
+        'UID': entry.get('UID'),
+        'Region': entry.get('Region'),
+        'Weapon': entry.get('Weapon'),
+        'DMG_Result': entry.get('DMG_Result'),
+        'Character': entry.get('Character') or target_character_name,
+        'HP': entry.get('HP'),
+        'ATK': entry.get('ATK'),
+        'DEF': entry.get('DEF'),
+        'EM': entry.get('EM'),
+        'ER': entry.get('ER'),
+        'Crit_Rate': entry.get('Crit_Rate'),
+        'Crit_DMG': entry.get('Crit_DMG'),
+        'Elem_Bonus': entry.get('Elem_Bonus'),
+        'Artifacts': [],
+        'Artifact_Sets': entry.get('Artifact_Sets'),
+    }
+
+def enrich_entry(entry, target_character_name, max_retries=MAX_RETRIES):
+    """
+    Enriches one leaderboard entry with Enka data for the target character.
+    Returns (row, status, error) where status is 'fetched', 'skipped' or 'failed'.
+    """
+    uid = entry.get('UID')
+    if not uid:
+        return None, 'skipped', None
+
+    char_data_list, error = _fetch_player_with_retry(uid, max_retries=max_retries, characters=[target_character_name])
+    if not char_data_list:
+        return None, 'failed', error
+
+    target_char = next((c for c in char_data_list if c['stats'].get('Character') == target_character_name), None)
+    if not target_char:
+        return None, 'skipped', None
+
+    return build_character_row(entry, target_char), 'fetched', None
+
+def iter_leaderboard_character(calculation_id, target_character_name, limit=50, request_delay=REQUEST_DELAY,
+                               max_retries=MAX_RETRIES, stop_event=None, max_rows=None, shallow=False,
+                               incremental=False, tolerance=None, order='rank', min_samples=sampling.MIN_SAMPLES):
+    """
+    Generator version of fetch_leaderboard_character.
+    Yields events as soon as they are known:
+      {'event': 'start', 'total': N}
+      {'event': 'row', 'index': i, 'data': row}       (one per enriched entry)
+      {'event': 'progress', 'processed': i, 'total': N, 'fetched': .., 'skipped': .., 'failed': ..}
+      {'event': 'summary', 'total': N, 'fetched': .., 'skipped': .., 'failed': .., 'stopped': bool, 'enka_calls': ..}
+    Setting `stop_event` (threading.Event) or reaching `max_rows` stops the scan early;
+    the summary event is still emitted.
+    With `shallow`, rows are built from the Akasha payload and Enka is only called
+    for entries whose stats Akasha did not return.
+    With `incremental`, entries unchanged since the last snapshot of this leaderboard
+    reuse their stored row (summary 'reused') and the snapshot is updated at the end.
+    With `tolerance` (e.g. 0.02 for +/-2%), the scan stops once the 95% confidence interval
+    of every target stat mean is within that relative tolerance; entries are visited in
+    `order` ('rank' or 'stratified'). The summary then carries 'precision', 'converged'
+    and 'fetches_saved'.
+    """
+    leaderboard = akasha.fetch_leaderboard(calculation_id, limit=limit, quiet=True)
     if not leaderboard:
-        return []
+        yield {'event': 'summary', 'total': 0, 'fetched': 0, 'skipped': 0, 'failed': 0, 'stopped': False,
+               'enka_calls': 0, 'reused': 0}
+        return
 
-    rows = []
+    total = len(leaderboard)
+    visit_order = sampling.sampling_order(total, order)
+    running = sampling.RunningStats() if tolerance else None
+    converged = False
+    processed = 0
+    counts = {'fetched': 0, 'skipped': 0, 'failed': 0}
+    enka_calls = 0
+    reused = 0
+    stopped = False
+    previous = snapshots.load_snapshot(calculation_id, target_character_name) if incremental else {}
+    current = {}
+    yield {'event': 'start', 'total': total}
+
+    try:
+        for processed, position in enumerate(visit_order, 1):
+            i = position + 1
+            entry = leaderboard[position]
+            if stop_event is not None and stop_event.is_set():
+                processed -= 1
+                stopped = True
+                break
+
+            uid = str(entry['UID']) if entry.get('UID') else None
+            fingerprint = snapshots.entry_fingerprint(entry) if incremental else None
+            used_enka = False
+
+            if uid and snapshots.is_unchanged(previous.get(uid), fingerprint, shallow):
+                row = snapshots.reuse_row(previous[uid], entry)
+                status = 'fetched' if row is not None else 'skipped'
+                source = previous[uid].get('source')
+                reused += 1
+            else:
+                row = build_shallow_row(entry, target_character_name) if shallow else None
+                used_enka = row is None
+                source = 'enka' if used_enka else 'akasha'
+                if used_enka:
+                    row, status, _ = enrich_entry(entry, target_character_name, max_retries=max_retries)
+                    enka_calls += 1 if uid else 0
+                else:
+                    status = 'fetched'
+
+            # Failed fetches are not recorded: they are retried on the next refresh
+            if incremental and uid and status != 'failed':
+                current[uid] = {'fingerprint': fingerprint, 'source': source, 'row': row}
+
+            counts[status] += 1
+            if row is not None:
+                yield {'event': 'row', 'index': i, 'data': row}
+
+            yield {'event': 'progress', 'processed': processed, 'total': total, **counts}
+
+            if max_rows and counts['fetched'] >= max_rows:
+                stopped = processed < total
+                break
+
+            if running is not None and row is not None:
+                running.add(row)
+                if running.converged(tolerance, min_samples):
+                    converged = True
+                    stopped = processed < total
+                    break
+
+            # Rows built from Akasha alone or reused did not hit Enka: no need to wait
+            if used_enka and row is not None and processed < total:
+                if stop_event is not None:
+                    if stop_event.wait(request_delay):
+                        stopped = True
+                        break
+                else:
+                    time.sleep(request_delay)
+    finally:
+        if incremental:
+            # Entries not reached this time stay valid; players who left the board are dropped
+            on_board = {str(e['UID']) for e in leaderboard if e.get('UID')}
+            entries = {uid: item for uid, item in previous.items() if uid in on_board}
+            entries.update(current)
+            snapshots.save_snapshot(calculation_id, target_character_name, entries)
+
+    summary = {'event': 'summary', 'total': total, **counts, 'stopped': stopped, 'enka_calls': enka_calls,
+               'reused': reused}
+    if running is not None:
+        summary.update(precision=running.precision(), converged=converged, fetches_saved=total - processed)
+    yield summary
+
+def iter_leaderboard_character_queued(calculation_id, target_character_name, queue, limit=50,
+                                      stop_event=None, max_rows=None, poll_interval=1.0, incremental=False,
+                                      idle_timeout=QUEUE_IDLE_TIMEOUT):
+    """
+    Same events as iter_leaderboard_character, but the Enka enrichment is done by
+    worker.py processes through a task_queue.TaskQueue (one task per UID).
+    Rows are yielded in completion order as workers report them.
+    With `incremental`, entries unchanged since the last snapshot reuse their stored row
+    and are not queued; the snapshot is updated at the end.
+    Raises TimeoutError when none of its tasks finished and no worker was seen for
+    `idle_timeout` seconds.
+    """
+    leaderboard = akasha.fetch_leaderboard(calculation_id, limit=limit, quiet=True)
+    if not leaderboard:
+        yield {'event': 'summary', 'total': 0, 'fetched': 0, 'skipped': 0, 'failed': 0, 'stopped': False,
+               'reused': 0}
+        return
+
+    total = len(leaderboard)
+    previous = snapshots.load_snapshot(calculation_id, target_character_name) if incremental else {}
+    current = {}
+    fingerprints = {}
+    reused_rows = []
+    queued = []
     for i, entry in enumerate(leaderboard, 1):
-        uid = entry.get('UID')
-        if not uid:
-            continue
+        uid = str(entry['UID']) if entry.get('UID') else None
+        fingerprint = snapshots.entry_fingerprint(entry) if incremental else None
+        if uid and snapshots.is_unchanged(previous.get(uid), fingerprint):
+            row = snapshots.reuse_row(previous[uid], entry)
+            reused_rows.append((i, row))
+            current[uid] = {'fingerprint': fingerprint, 'source': previous[uid].get('source'), 'row': row}
+        else:
+            fingerprints[i] = fingerprint
+            queued.append((i, entry))
 
-        char_data_list = None
-        error = None
-        for _ in range(max_retries):
-            char_data_list, error = enka.fetch_player_data(uid)
-            if char_data_list:
+    batch_id = queue.enqueue([e for _, e in queued], target_character_name,
+                             positions=[i for i, _ in queued]) if queued else None
+    yield {'event': 'start', 'total': total, 'batch_id': batch_id}
+
+    counts = {'fetched': 0, 'skipped': 0, 'failed': 0}
+    processed = 0
+    stopped = False
+    finished = False
+    try:
+        for i, row in reused_rows:
+            processed += 1
+            counts['fetched' if row is not None else 'skipped'] += 1
+            if row is not None:
+                yield {'event': 'row', 'index': i, 'data': row}
+            yield {'event': 'progress', 'processed': processed, 'total': total, **counts}
+            if max_rows and counts['fetched'] >= max_rows:
+                stopped = processed < total
+                finished = True
                 break
-            if error and "404" in str(error):
+
+        seen = set()
+        last_progress = time.time()
+        while not finished and batch_id is not None:
+            if stop_event is not None and stop_event.is_set():
+                stopped = True
                 break
-            time.sleep(2)
 
-        if not char_data_list:
-            continue
+            for task in queue.batch_tasks(batch_id):
+                if task['id'] in seen or task['outcome'] is None:
+                    continue
+                seen.add(task['id'])
+                last_progress = time.time()
+                processed += 1
+                counts[task['outcome']] += 1
+                # Failed fetches are not recorded: they are retried on the next refresh
+                if incremental and task['uid'] and task['outcome'] != 'failed':
+                    current[task['uid']] = {'fingerprint': fingerprints.get(task['position']), 'source': 'enka',
+                                            'row': task['result']}
+                if task['result'] is not None:
+                    yield {'event': 'row', 'index': task['position'], 'data': task['result']}
+                yield {'event': 'progress', 'processed': processed, 'total': total, **counts}
 
-        target_char = next((c for c in char_data_list if c['stats'].get('Character') == target_character_name), None)
-        if not target_char:
-            continue
+                if max_rows and counts['fetched'] >= max_rows:
+                    stopped = processed < total
+                    finished = True
+                    break
 
-        stats = target_char['stats']
-        row = {
-            'Rank': entry.get('Rank'),
-            'Player': entry.get('Player'),
-            'UID': uid,
-            'Region': entry.get('Region'),
-            'Weapon': entry.get('Weapon'),
-            'DMG_Result': entry.get('DMG_Result'),
-            'Character': stats.get('Character'),
-            'HP': stats.get('HP'),
-            'ATK': stats.get('ATK'),
-            'DEF': stats.get('DEF'),
-            'EM': stats.get('EM'),
-            'ER': stats.get('ER%') if stats.get('ER%') is not None else stats.get('ER'),
-            'Crit_Rate': stats.get('Crit_Rate%') if stats.get('Crit_Rate%') is not None else stats.get('Crit_Rate'),
-            'Crit_DMG': stats.get('Crit_DMG%') if stats.get('Crit_DMG%') is not None else stats.get('Crit_DMG'),
-            'Elem_Bonus': stats.get('Elem_Bonus%') if stats.get('Elem_Bonus%') is not None else stats.get('Elem_Bonus'),
-            'Artifacts': target_char.get('artifacts', []),
-        }
-        rows.append(row)
+            if len(seen) >= len(queued):
+                finished = True
+            elif not finished:
+                # Do not wait for a worker's lease() to resolve tasks whose worker died
+                queue.reap_expired()
+                if time.time() - last_progress > idle_timeout and not queue.live_workers(idle_timeout):
+                    raise TimeoutError(f"No enrichment worker for {idle_timeout}s: {len(queued) - len(seen)} "
+                                       f"task(s) of {calculation_id} left")
+                if stop_event is not None:
+                    stop_event.wait(poll_interval)
+                else:
+                    time.sleep(poll_interval)
+    finally:
+        if batch_id is not None:
+            queue.purge_batch(batch_id)
+        if incremental:
+            # Entries not reached this time stay valid; players who left the board are dropped
+            on_board = {str(e['UID']) for e in leaderboard if e.get('UID')}
+            entries = {uid: item for uid, item in previous.items() if uid in on_board}
+            entries.update(current)
+            snapshots.save_snapshot(calculation_id, target_character_name, entries)
 
-        if i < len(leaderboard):
-            time.sleep(request_delay)
+    yield {'event': 'summary', 'total': total, **counts, 'stopped': stopped, 'reused': len(reused_rows)}
 
-    return rows
+def fetch_leaderboard_character(calculation_id, target_character_name, limit=50, request_delay=REQUEST_DELAY,
+                                max_retries=MAX_RETRIES, shallow=False, incremental=False, tolerance=None,
+                                order='rank'):
+    """
+    Fetches leaderboard entries, then pulls Enka data per UID and returns only the target character.
+    With `shallow`, rows come from the Akasha payload and Enka is only used as a fallback.
+    Returns a list of dicts compatible with backend context summary.
+    """
+    return [
+        event['data']
+        for event in iter_leaderboard_character(
+            calculation_id,
+            target_character_name,
+            limit=limit,
+            request_delay=request_delay,
+            max_retries=max_retries,
+            shallow=shallow,
+            incremental=incremental,
+            tolerance=tolerance,
+            order=order,
+        )
+        if event['event'] == 'row'
+    ]
+
+if __name__ == "__main__":
+    main()
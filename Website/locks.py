@@ -0,0 +1,81 @@
+"""
+Cross-process locks for the scan folders.
+
+Every read-merge-write of a scan folder (a scan, a delete, a migration) holds the
+lock of its UID, so concurrent /scan calls for the same player, or a scan racing a
+data endpoint, are serialized, including between several uvicorn workers.
+Locks are flock()ed files under <root>/.locks/; on platforms without fcntl they
+fall back to in-process locks.
+"""
+import os
+import re
+import time
+import threading
+from pathlib import Path
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+LOCK_DIR = ".locks"
+POLL_INTERVAL = 0.05
+
+_SAFE_KEY_RE = re.compile(r'[^A-Za-z0-9_.-]')
+_thread_locks = {}
+_thread_locks_guard = threading.Lock()
+
+
+def _thread_lock(path):
+    with _thread_locks_guard:
+        return _thread_locks.setdefault(str(path), threading.Lock())
+
+
+@contextmanager
+def file_lock(path, timeout=None):
+    """
+    Exclusive lock on `path` (created if needed). Raises TimeoutError when it
+    cannot be taken within `timeout` seconds (None waits forever).
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    deadline = None if timeout is None else time.monotonic() + timeout
+
+    if fcntl is None:
+        lock = _thread_lock(path)
+        if not lock.acquire(timeout=-1 if timeout is None else timeout):
+            raise TimeoutError(f"Could not lock {path} within {timeout}s")
+        try:
+            yield
+        finally:
+            lock.release()
+        return
+
+    # flock() locks belong to the open file: each holder opens its own descriptor,
+    # which makes the lock exclusive between threads as well as processes
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        while True:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | (0 if deadline is None else fcntl.LOCK_NB))
+                break
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    raise TimeoutError(f"Could not lock {path} within {timeout}s")
+                time.sleep(POLL_INTERVAL)
+        try:
+            yield
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+    finally:
+        os.close(fd)
+
+
+def lock_path(root, key):
+    return Path(root) / LOCK_DIR / f"{_SAFE_KEY_RE.sub('_', str(key))}.lock"
+
+
+def uid_lock(uid, root, timeout=None):
+    """Lock of one player's scan folder under `root`."""
+    return file_lock(lock_path(root, uid), timeout=timeout)
@@ -0,0 +1,201 @@
+"""
+Per-folder manifests and the root index of the scan folders.
+
+Every scan folder holds a manifest.json describing its tables, updated atomically
+whenever a version is written:
+
+    {"uid": "...", "nickname": "...", "scanned_at": ...,
+     "tables": {"characters": {"version": 3, "rows": 12, "hash": "...", "log_size": 4096, "updated": ...}, ...}}
+
+The current version of a table is then one small read (checked against the size of
+its delta log) instead of listing and parsing the folder. The root index
+(<root>/.index/manifests.json) gathers the manifests of all folders, so listing the
+scans is a single read too. Every change made through the app (update, remove,
+rename, clear) bumps the generation counter stored in the index; the index is only
+rebuilt from the folders when it is missing or on rebuild() (the API does it at
+startup, for folders changed while it was down).
+"""
+import os
+import json
+import time
+import hashlib
+import threading
+from pathlib import Path
+
+import pandas as pd
+
+import delta_log
+import locks
+import shards
+
+MANIFEST_FILE = "manifest.json"
+INDEX_DIR = ".index"
+INDEX_FILE = "manifests.json"
+
+_lock = threading.Lock()
+
+
+def _write_json_atomic(path, obj):
+    path = Path(path)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(obj, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def manifest_path(folder):
+    return Path(folder) / MANIFEST_FILE
+
+
+def read_manifest(folder):
+    """Manifest of a scan folder ({} when missing or unreadable)."""
+    return _read_json(manifest_path(folder))
+
+
+def content_hash(df):
+    """Stable hash of a table's content."""
+    hashed = pd.util.hash_pandas_object(df, index=False).values
+    digest = hashlib.sha256(hashed.tobytes())
+    digest.update(json.dumps([str(c) for c in df.columns]).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _log_size(base_name):
+    try:
+        return os.path.getsize(delta_log.log_path(base_name))
+    except OSError:
+        return None
+
+
+def record_table(base_name, version, df):
+    """Records a newly written version of the table `base_name` (<folder>/<table>)."""
+    folder, table = os.path.split(str(base_name))
+    with _lock:
+        manifest = read_manifest(folder)
+        manifest.setdefault('tables', {})[table] = {
+            'version': version,
+            'rows': len(df),
+            'hash': content_hash(df),
+            'log_size': _log_size(base_name),
+            'updated': time.time(),
+        }
+        _write_json_atomic(manifest_path(folder), manifest)
+    return manifest
+
+
+def table_entry(base_name):
+    """
+    Manifest entry of a table, or None when the manifest does not know it or its
+    delta log was written by something else since (size mismatch).
+    """
+    folder, table = os.path.split(str(base_name))
+    entry = read_manifest(folder).get('tables', {}).get(table)
+    if not entry or entry.get('log_size') != _log_size(base_name):
+        return None
+    return entry
+
+
+def record_scan(folder, uid, nickname, root=None):
+    """Stamps the manifest with the scan identity and publishes it in the root index."""
+    folder = Path(folder)
+    with _lock:
+        manifest = read_manifest(folder)
+        manifest.update({'uid': str(uid), 'nickname': nickname, 'scanned_at': time.time()})
+        _write_json_atomic(manifest_path(folder), manifest)
+    ManifestIndex(root or folder.parent).update(folder.name, manifest)
+    return manifest
+
+
+class ManifestIndex:
+    """Index of the manifests of the scan folders under `root`."""
+    _cache = {}
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self.path = self.root / INDEX_DIR / INDEX_FILE
+
+    def _stamp(self):
+        # The index is always replaced (os.replace): a new inode means a new index
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def _load(self):
+        stamp = self._stamp()
+        if stamp is None:
+            return None
+        cached = self._cache.get(str(self.path))
+        if cached and cached[0] == stamp:
+            return cached[1]
+        index = _read_json(self.path)
+        if 'folders' not in index:
+            return None
+        self._cache[str(self.path)] = (stamp, index)
+        return index
+
+    def _save(self, folders, previous):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        index = {'generation': (previous or {}).get('generation', 0) + 1, 'folders': folders}
+        _write_json_atomic(self.path, index)
+        self._cache[str(self.path)] = (self._stamp(), index)
+
+    def _scan(self):
+        folders = {}
+        for key, folder in shards.iter_scan_folders(self.root):
+            manifest = read_manifest(folder)
+            if manifest:
+                folders[key] = manifest
+        return folders
+
+    def rebuild(self):
+        """Reads the manifest of every folder (only needed when folders changed outside the app)."""
+        with _lock, locks.file_lock(self.path.with_suffix('.lock')):
+            folders = self._scan()
+            self._save(folders, self._load())
+        return folders
+
+    def folders(self):
+        """{folder name: manifest}. One read per generation of the index."""
+        index = self._load()
+        if index is None:
+            return self.rebuild()
+        return index['folders']
+
+    def generation(self):
+        """Number of changes made to the index (0 before it exists)."""
+        index = self._load()
+        return index.get('generation', 0) if index is not None else 0
+
+    def _modify(self, change):
+        # The file lock serializes the read-modify-write between processes too
+        with _lock, locks.file_lock(self.path.with_suffix('.lock')):
+            index = self._load()
+            folders = dict(index['folders']) if index is not None else self._scan()
+            change(folders)
+            self._save(folders, index)
+
+    def update(self, name, manifest):
+        self._modify(lambda folders: folders.__setitem__(name, manifest))
+
+    def remove(self, name):
+        self._modify(lambda folders: folders.pop(name, None))
+
+    def rename(self, old, new):
+        def change(folders):
+            if old in folders:
+                folders[new] = folders.pop(old)
+        self._modify(change)
+
+    def clear(self):
+        self._modify(lambda folders: folders.clear())
@@ -0,0 +1,198 @@
+"""
+Compressed storage of the raw Enka snapshot of a scan folder.
+
+The snapshot is stored as gzip-compressed JSON lines (raw.jsonl.gz) instead of an
+indented raw.json:
+
+    {"playerInfo": {...}, "uid": "...", "ttl": ...}     every top-level field but the avatars
+    {"avatarId": 10000042, ...}                          one line per avatar, avatarId first
+
+RawSnapshot reads the file lazily: player_info() only decompresses the first line,
+avatar() stops at the matching line and only decodes that one. load_raw() returns the
+original dict. Folders still holding a legacy raw.json are read transparently and
+converted by migrate_all(), which the API runs on a background thread.
+"""
+import os
+import re
+import gzip
+import json
+import logging
+import threading
+from pathlib import Path
+
+import locks
+import shards
+
+RAW_FILE = "raw.jsonl.gz"
+LEGACY_RAW_FILE = "raw.json"
+COMPRESS_LEVEL = 6
+
+_AVATAR_ID_RE = re.compile(r'^\{"avatarId": ?(\d+)')
+
+
+def raw_path(folder):
+    """Path of the stored snapshot (compressed first, then legacy), None when there is none."""
+    folder = Path(folder)
+    for name in (RAW_FILE, LEGACY_RAW_FILE):
+        if (folder / name).exists():
+            return folder / name
+    return None
+
+
+def exists(folder):
+    return raw_path(folder) is not None
+
+
+def _dumps(obj):
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':'))
+
+
+def write_raw(folder, data, remove_legacy=True):
+    """Atomically writes the compressed snapshot and drops a legacy raw.json. Returns the path."""
+    folder = Path(folder)
+    path = folder / RAW_FILE
+    tmp_path = folder / f"{RAW_FILE}.{os.getpid()}.{threading.get_ident()}.tmp"
+    header = {key: value for key, value in data.items() if key != 'avatarInfoList'}
+    with gzip.open(tmp_path, 'wt', encoding='utf-8', compresslevel=COMPRESS_LEVEL) as f:
+        f.write(_dumps(header) + '\n')
+        for avatar in data.get('avatarInfoList') or []:
+            # avatarId first, so avatar() can find a line without decoding it
+            f.write(_dumps({'avatarId': avatar.get('avatarId'), **avatar}) + '\n')
+    os.replace(tmp_path, path)
+    if remove_legacy:
+        try:
+            os.remove(folder / LEGACY_RAW_FILE)
+        except FileNotFoundError:
+            pass
+    return path
+
+
+class RawSnapshot:
+    """Lazy reader over the stored snapshot of a scan folder."""
+    def __init__(self, folder):
+        self.folder = Path(folder)
+        self.path = raw_path(folder)
+        self._legacy = None
+
+    def _is_compressed(self):
+        return self.path is not None and self.path.name == RAW_FILE
+
+    def _lines(self):
+        with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield line
+
+    def _legacy_data(self):
+        if self._legacy is None:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self._legacy = json.load(f)
+        return self._legacy
+
+    def header(self):
+        """Top-level fields except the avatar list."""
+        if self.path is None:
+            return {}
+        if not self._is_compressed():
+            return {k: v for k, v in self._legacy_data().items() if k != 'avatarInfoList'}
+        for line in self._lines():
+            return json.loads(line)
+        return {}
+
+    def player_info(self):
+        return self.header().get('playerInfo', {})
+
+    def iter_avatars(self):
+        """Avatars one by one, without building the whole list."""
+        if self.path is None:
+            return
+        if not self._is_compressed():
+            yield from self._legacy_data().get('avatarInfoList', [])
+            return
+        lines = self._lines()
+        next(lines, None)
+        for line in lines:
+            yield json.loads(line)
+
+    def avatar(self, avatar_id):
+        """Single avatar by id (None when absent); only its line is decoded."""
+        avatar_id = int(avatar_id)
+        if self.path is None:
+            return None
+        if not self._is_compressed():
+            avatars = self._legacy_data().get('avatarInfoList', [])
+            return next((a for a in avatars if a.get('avatarId') == avatar_id), None)
+        lines = self._lines()
+        next(lines, None)
+        for line in lines:
+            match = _AVATAR_ID_RE.match(line)
+            if match and int(match.group(1)) == avatar_id:
+                return json.loads(line)
+        return None
+
+    def load(self):
+        """The full snapshot, as returned by Enka."""
+        if self.path is None:
+            return None
+        if not self._is_compressed():
+            return self._legacy_data()
+        data = self.header()
+        avatars = list(self.iter_avatars())
+        if avatars:
+            data['avatarInfoList'] = avatars
+        return data
+
+
+def load_raw(folder):
+    """Full snapshot of a folder (None when there is none)."""
+    # A legacy file can be migrated between the lookup and the read: look again once
+    for _ in range(2):
+        try:
+            return RawSnapshot(folder).load()
+        except FileNotFoundError:
+            continue
+    return None
+
+
+def migrate_folder(folder):
+    """Converts a legacy raw.json to raw.jsonl.gz. Returns True when a file was converted."""
+    folder = Path(folder)
+    legacy = folder / LEGACY_RAW_FILE
+    if not legacy.exists():
+        return False
+    with open(legacy, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if (folder / RAW_FILE).exists():
+        # Already written by a newer scan: the legacy copy is stale
+        os.remove(legacy)
+        return False
+    path = write_raw(folder, data, remove_legacy=False)
+    if RawSnapshot(folder).load() != data:
+        os.remove(path)
+        raise ValueError(f"Compressed snapshot of {folder} does not match raw.json")
+    os.remove(legacy)
+    return True
+
+
+def migrate_all(root, stop_event=None):
+    """Migrates every scan folder under `root`. Returns the number of converted folders."""
+    converted = 0
+    for key, folder in shards.iter_scan_folders(root):
+        if stop_event is not None and stop_event.is_set():
+            break
+        try:
+            # Same lock as a scan of this player, so a fresh snapshot is never overwritten
+            with locks.uid_lock(shards.folder_uid(key, folder), root):
+                converted += migrate_folder(folder)
+        except Exception as e:
+            logging.warning(f"Could not migrate {folder / LEGACY_RAW_FILE}: {e}")
+    if converted:
+        logging.info(f"Compressed {converted} raw.json snapshot(s) under {root}")
+    return converted
+
+
+def start_migration(root, stop_event=None):
+    """Runs migrate_all on a daemon thread and returns the thread."""
+    thread = threading.Thread(target=migrate_all, args=(root, stop_event), name="raw-migration", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,127 @@
+"""
+Typed records of a parsed showcase.
+
+enka.parse_player_data builds one Character per avatar, holding its Weapon and its
+Artifacts, instead of one dict per row: slotted dataclasses are smaller and faster
+to build, and the artifacts are grouped under their character as they are parsed.
+The dicts the CSV tables, the scan database and the API work with (same keys as
+before) are only built at those boundaries, by to_dict() / to_api().
+"""
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+SLOT_ORDER = ('Flower', 'Plume', 'Sands', 'Goblet', 'Circlet')
+
+
+@dataclass(slots=True)
+class Artifact:
+    character: str
+    slot: str
+    set_name: str
+    level: str
+    main_stat: str
+    main_value: float
+    sub1: str = ""
+    sub1_val: object = ""
+    sub2: str = ""
+    sub2_val: object = ""
+    sub3: str = ""
+    sub3_val: object = ""
+    sub4: str = ""
+    sub4_val: object = ""
+    crit_value: float = 0
+
+    def substats(self):
+        """[(name, value)] of the rolled substats."""
+        return [(name, value) for name, value in (
+            (self.sub1, self.sub1_val), (self.sub2, self.sub2_val),
+            (self.sub3, self.sub3_val), (self.sub4, self.sub4_val),
+        ) if name]
+
+    def to_dict(self):
+        return {
+            'Character': self.character,
+            'Slot': self.slot,
+            'Set': self.set_name,
+            'Level': self.level,
+            'Main_Stat': self.main_stat,
+            'Main_Value': self.main_value,
+            'Sub1': self.sub1,
+            'Sub1_Val': self.sub1_val,
+            'Sub2': self.sub2,
+            'Sub2_Val': self.sub2_val,
+            'Sub3': self.sub3,
+            'Sub3_Val': self.sub3_val,
+            'Sub4': self.sub4,
+            'Sub4_Val': self.sub4_val,
+            'Crit_Value': self.crit_value,
+        }
+
+
+@dataclass(slots=True)
+class Weapon:
+    icon: str
+    level: int
+    refinement: int
+    base_atk: float
+    substat: str
+    substat_value: float
+
+    def to_dict(self):
+        return {
+            'icon': self.icon,
+            'level': self.level,
+            'refinement': self.refinement,
+            'base_atk': self.base_atk,
+            'substat': self.substat,
+            'substat_value': self.substat_value,
+        }
+
+
+@dataclass(slots=True)
+class Character:
+    name: str
+    level: int
+    hp: int
+    atk: int
+    defense: int
+    em: int
+    er: float
+    crit_rate: float
+    crit_dmg: float
+    element: str
+    elem_bonus: float
+    total_cv: float
+    weapon: Optional[Weapon] = None
+    artifacts: List[Artifact] = field(default_factory=list)
+    avatar_id: Optional[int] = None
+
+    def artifacts_by_slot(self):
+        return {a.slot: a for a in self.artifacts}
+
+    def to_dict(self):
+        """Stats row (the columns of the characters table)."""
+        return {
+            'Character': self.name,
+            'Level': self.level,
+            'HP': self.hp,
+            'ATK': self.atk,
+            'DEF': self.defense,
+            'EM': self.em,
+            'ER%': self.er,
+            'Crit_Rate%': self.crit_rate,
+            'Crit_DMG%': self.crit_dmg,
+            'Element': self.element,
+            'Elem_Bonus%': self.elem_bonus,
+            'Total_CV': self.total_cv,
+            'Weapon_Refine': self.weapon.refinement if self.weapon else 0,
+        }
+
+    def to_api(self):
+        """{'stats': ..., 'artifacts': [...]}, the shape leaderboard.py and the frontend expect."""
+        return {'stats': self.to_dict(), 'artifacts': [a.to_dict() for a in self.artifacts]}
+
+
+def as_dicts(items):
+    """Rows as dicts, whether they are records or already dicts."""
+    return [item.to_dict() if hasattr(item, 'to_dict') else item for item in items]
@@ -0,0 +1,84 @@
+"""
+Sampling helpers for deep leaderboard builds.
+
+A deep build only feeds stat averages (see backend/logic.prepare_context), so it can
+stop once those averages are known precisely enough instead of fetching every entry.
+"""
+import math
+
+# Stats whose averages are used as targets by the mentor
+TARGET_STATS = ('HP', 'ATK', 'DEF', 'EM', 'ER', 'Crit_Rate', 'Crit_DMG')
+Z_95 = 1.96
+MIN_SAMPLES = 5
+STRATA = 5
+
+
+def sampling_order(total, order='rank', strata=STRATA):
+    """
+    Indices in the order entries should be fetched.
+    - 'rank': top to bottom
+    - 'stratified': the board is split into `strata` bands taken in turn
+      (1st of each band, then 2nd of each band...), so early samples cover the whole board
+    """
+    if order == 'rank' or total <= strata:
+        return list(range(total))
+    if order != 'stratified':
+        raise ValueError(f"Unknown sampling order: {order}")
+    size = math.ceil(total / strata)
+    bands = [list(range(start, min(start + size, total))) for start in range(0, total, size)]
+    return [band[k] for k in range(size) for band in bands if k < len(band)]
+
+
+class RunningStats:
+    """Streaming mean/variance (Welford) for each target stat."""
+    def __init__(self, stats=TARGET_STATS):
+        self.stats = tuple(stats)
+        self._n = {s: 0 for s in self.stats}
+        self._mean = {s: 0.0 for s in self.stats}
+        self._m2 = {s: 0.0 for s in self.stats}
+
+    def add(self, row):
+        for s in self.stats:
+            value = row.get(s)
+            if value is None:
+                continue
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                continue
+            self._n[s] += 1
+            delta = value - self._mean[s]
+            self._mean[s] += delta / self._n[s]
+            self._m2[s] += delta * (value - self._mean[s])
+
+    def precision(self):
+        """
+        Relative half-width of the 95% confidence interval of each mean
+        (1.96 * s / sqrt(n) / |mean|). None when a stat has fewer than 2 values
+        or a zero mean with some spread.
+        """
+        result = {}
+        for s in self.stats:
+            n = self._n[s]
+            if n < 2:
+                result[s] = None
+                continue
+            half_width = Z_95 * math.sqrt(self._m2[s] / (n - 1)) / math.sqrt(n)
+            if half_width == 0:
+                result[s] = 0.0
+            elif self._mean[s] == 0:
+                result[s] = None
+            else:
+                result[s] = round(half_width / abs(self._mean[s]), 5)
+        return result
+
+    def converged(self, tolerance, min_samples=MIN_SAMPLES):
+        """
+        True when every stat has at least `min_samples` values and a precision within `tolerance`.
+        Stats that never appear in the rows are ignored.
+        """
+        seen = [s for s in self.stats if self._n[s]]
+        if not seen or any(self._n[s] < min_samples for s in seen):
+            return False
+        precision = self.precision()
+        return all(precision[s] is not None and precision[s] <= tolerance for s in seen)
@@ -0,0 +1,255 @@
+"""
+SQLite index of the scanned players.
+
+The scan folders (delta logs + raw snapshot) stay the source of truth for the files;
+this embedded database (WAL mode) indexes every scan so the data endpoints and
+cross-account lookups query B-tree indexes instead of walking DATA_ROOT:
+
+    players     one row per UID (nickname, level, latest scan)
+    scans       one row per persisted scan (folder, time, showcase fingerprint, versions)
+    characters  character rows of each scan
+    artifacts   artifact rows of each scan (indexed by set, slot and main stat)
+"""
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from pathlib import Path
+
+import raw_store
+import records
+import shards
+
+SCAN_DB_PATH = os.environ.get('SCAN_DB_PATH', str(Path(__file__).resolve().parent / "data" / "scans.db"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS players (
+    uid TEXT PRIMARY KEY,
+    nickname TEXT,
+    level INTEGER,
+    latest_scan_id INTEGER,
+    updated REAL
+);
+CREATE TABLE IF NOT EXISTS scans (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    uid TEXT NOT NULL REFERENCES players(uid) ON DELETE CASCADE,
+    folder TEXT NOT NULL,
+    scanned_at REAL NOT NULL,
+    showcase_hash TEXT,
+    characters_version INTEGER,
+    artifacts_version INTEGER
+);
+CREATE TABLE IF NOT EXISTS characters (
+    scan_id INTEGER NOT NULL REFERENCES scans(id) ON DELETE CASCADE,
+    uid TEXT NOT NULL,
+    character TEXT NOT NULL,
+    level INTEGER,
+    total_cv REAL,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS artifacts (
+    scan_id INTEGER NOT NULL REFERENCES scans(id) ON DELETE CASCADE,
+    uid TEXT NOT NULL,
+    character TEXT NOT NULL,
+    slot TEXT,
+    set_name TEXT,
+    main_stat TEXT,
+    main_value REAL,
+    crit_value REAL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_scans_uid ON scans(uid, scanned_at);
+CREATE INDEX IF NOT EXISTS idx_scans_folder ON scans(folder);
+CREATE INDEX IF NOT EXISTS idx_characters_scan ON characters(scan_id);
+CREATE INDEX IF NOT EXISTS idx_characters_uid ON characters(uid);
+CREATE INDEX IF NOT EXISTS idx_characters_character ON characters(character);
+CREATE INDEX IF NOT EXISTS idx_artifacts_scan ON artifacts(scan_id);
+CREATE INDEX IF NOT EXISTS idx_artifacts_uid ON artifacts(uid);
+CREATE INDEX IF NOT EXISTS idx_artifacts_character ON artifacts(character);
+CREATE INDEX IF NOT EXISTS idx_artifacts_set ON artifacts(set_name, slot);
+CREATE INDEX IF NOT EXISTS idx_artifacts_slot ON artifacts(slot, main_stat);
+CREATE INDEX IF NOT EXISTS idx_artifacts_main_stat ON artifacts(main_stat);
+"""
+
+ARTIFACT_FILTERS = {
+    'uid': 'a.uid',
+    'character': 'a.character',
+    'set_name': 'a.set_name',
+    'slot': 'a.slot',
+    'main_stat': 'a.main_stat',
+}
+
+
+class ScanRepository:
+    """
+    Thread-safe access to the scan database (one connection per thread).
+    The file and its schema are created on first use.
+    """
+    def __init__(self, path=None):
+        self.path = str(path or SCAN_DB_PATH)
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            with self._schema_lock:
+                if not self._schema_ready:
+                    conn.executescript(SCHEMA)
+                    self._schema_ready = True
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    # --- Writes ---
+
+    def record_scan(self, uid, folder, player, characters, artifacts, showcase_hash=None,
+                    versions=None, scanned_at=None):
+        """Stores one persisted scan with its character and artifact rows (records or dicts). Returns the scan id."""
+        uid = str(uid)
+        versions = versions or {}
+        scanned_at = scanned_at or time.time()
+        characters = records.as_dicts(characters)
+        artifacts = records.as_dicts(artifacts)
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO players (uid, nickname, level, updated) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(uid) DO UPDATE SET nickname = excluded.nickname, level = excluded.level, "
+                "updated = excluded.updated",
+                (uid, player.get('nickname'), player.get('level'), scanned_at),
+            )
+            scan_id = conn.execute(
+                "INSERT INTO scans (uid, folder, scanned_at, showcase_hash, characters_version, artifacts_version) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (uid, folder, scanned_at, showcase_hash, versions.get('characters'), versions.get('artifacts')),
+            ).lastrowid
+            conn.executemany(
+                "INSERT INTO characters (scan_id, uid, character, level, total_cv, data) VALUES (?, ?, ?, ?, ?, ?)",
+                [(scan_id, uid, c['Character'], c.get('Level'), c.get('Total_CV'), json.dumps(c, default=str))
+                 for c in characters],
+            )
+            conn.executemany(
+                "INSERT INTO artifacts (scan_id, uid, character, slot, set_name, main_stat, main_value, crit_value, data) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(scan_id, uid, a['Character'], a.get('Slot'), a.get('Set'), a.get('Main_Stat'),
+                  a.get('Main_Value'), a.get('Crit_Value'), json.dumps(a, default=str))
+                 for a in artifacts],
+            )
+            conn.execute("UPDATE players SET latest_scan_id = ? WHERE uid = ?", (scan_id, uid))
+        return scan_id
+
+    def rename_folder(self, old, new):
+        """Points the scans of folder `old` to `new`. Returns the number of scans moved."""
+        with self._connect() as conn:
+            return conn.execute("UPDATE scans SET folder = ? WHERE folder = ?", (new, old)).rowcount
+
+    def delete_folder(self, folder):
+        """Removes the scans of a folder (and the players left without scans)."""
+        with self._connect() as conn:
+            deleted = conn.execute("DELETE FROM scans WHERE folder = ?", (folder,)).rowcount
+            self._prune_players(conn)
+        return deleted
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM players")
+
+    @staticmethod
+    def _prune_players(conn):
+        conn.execute("DELETE FROM players WHERE uid NOT IN (SELECT uid FROM scans)")
+        conn.execute(
+            "UPDATE players SET latest_scan_id = (SELECT MAX(id) FROM scans WHERE scans.uid = players.uid) "
+            "WHERE latest_scan_id NOT IN (SELECT id FROM scans)"
+        )
+
+    # --- Reads ---
+
+    def folders(self):
+        """Scan folders with their first and last scan times, oldest first."""
+        rows = self._connect().execute(
+            "SELECT folder, uid, MIN(scanned_at) AS created, MAX(scanned_at) AS updated, COUNT(*) AS scans "
+            "FROM scans GROUP BY folder ORDER BY created"
+        ).fetchall()
+        return [dict(r) for r in rows]
+
+    def has_folder(self, folder):
+        return self._connect().execute("SELECT 1 FROM scans WHERE folder = ? LIMIT 1", (folder,)).fetchone() is not None
+
+    def player(self, uid):
+        row = self._connect().execute("SELECT * FROM players WHERE uid = ?", (str(uid),)).fetchone()
+        return dict(row) if row else None
+
+    def latest_characters(self, uid):
+        """Character rows of the latest scan of a player."""
+        rows = self._connect().execute(
+            "SELECT c.data FROM players p JOIN characters c ON c.scan_id = p.latest_scan_id WHERE p.uid = ?",
+            (str(uid),),
+        ).fetchall()
+        return [json.loads(r['data']) for r in rows]
+
+    def find_artifacts(self, limit=100, latest_only=True, **filters):
+        """
+        Artifact rows matching the given filters (uid, character, set_name, slot, main_stat).
+        With latest_only, only the latest scan of each player is searched.
+        """
+        unknown = set(filters) - set(ARTIFACT_FILTERS)
+        if unknown:
+            raise ValueError(f"Unknown artifact filter(s): {', '.join(sorted(unknown))}")
+        clauses, params = [], []
+        for name, value in filters.items():
+            if value is not None:
+                clauses.append(f"{ARTIFACT_FILTERS[name]} = ?")
+                params.append(value)
+        sql = "SELECT a.data FROM artifacts a"
+        if latest_only:
+            sql += " JOIN players p ON p.latest_scan_id = a.scan_id"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " LIMIT ?"
+        rows = self._connect().execute(sql, (*params, int(limit))).fetchall()
+        return [json.loads(r['data']) for r in rows]
+
+
+def backfill(repository, root):
+    """
+    Indexes the scan folders of `root` that are not in the database yet (folders
+    written before the database existed). Returns the number of folders added.
+    """
+    import enka
+
+    added = 0
+    for key, folder in shards.iter_scan_folders(root):
+        if not raw_store.exists(folder) or repository.has_folder(key):
+            continue
+        try:
+            scanned_at = raw_store.raw_path(folder).stat().st_mtime
+            data = raw_store.load_raw(folder)
+            parsed, error = enka.parse_player_data(data)
+            if error:
+                continue
+            uid = str(data.get('uid') or shards.legacy_uid(folder))
+            repository.record_scan(
+                uid, key, parsed['player'], parsed['characters'], parsed['artifacts'],
+                showcase_hash=enka.showcase_fingerprints(data)['showcase'],
+                versions={table: enka.get_current_version(str(folder / table))[0]
+                          for table in ('characters', 'artifacts')},
+                scanned_at=scanned_at,
+            )
+            added += 1
+        except Exception as e:
+            logging.warning(f"Could not index scan folder {folder}: {e}")
+    return added
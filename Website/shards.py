@@ -0,0 +1,164 @@
+"""
+Sharded layout of the scan folders.
+
+Scan folders live under two levels of UID-prefix directories instead of one flat
+directory of `<nickname>_<uid>` folders:
+
+    <root>/73/41/734186982/
+
+so a UID resolves to its folder without listing anything, and no directory grows
+past a few hundred entries. A folder is identified by its UID (the "folder key");
+folders of the old flat layout keep their name as key until migrate() moves them.
+
+    python shards.py migrate [root]
+"""
+import os
+import re
+import sys
+import json
+import logging
+from pathlib import Path
+
+import locks
+
+SHARD_RE = re.compile(r'^\d{2}$')
+UID_RE = re.compile(r'^\d{9,12}$')
+LEGACY_UID_RE = re.compile(r'_(\d{9,12})$')
+# Files that mark a directory of the flat layout as a scan folder
+SCAN_MARKERS = ('manifest.json', 'raw.jsonl.gz', 'raw.json', 'characters.log.jsonl', 'characters_v1.csv')
+
+
+def shard_dir(root, uid):
+    """<root>/<uid[0:2]>/<uid[2:4]>/<uid>"""
+    uid = str(uid)
+    if not UID_RE.match(uid):
+        raise ValueError(f"Invalid UID: {uid!r}")
+    return Path(root) / uid[:2] / uid[2:4] / uid
+
+
+def folder_path(root, key):
+    """Folder of a folder key: a UID (sharded) or the name of a flat-layout folder."""
+    key = str(key)
+    return shard_dir(root, key) if UID_RE.match(key) else Path(root) / key
+
+
+def display_path(root, folder):
+    """Path of a folder relative to the root, for messages."""
+    try:
+        return Path(folder).relative_to(root).as_posix()
+    except ValueError:
+        return str(folder)
+
+
+def is_legacy_scan_folder(path):
+    path = Path(path)
+    return path.is_dir() and not path.name.startswith('.') and any((path / m).exists() for m in SCAN_MARKERS)
+
+
+def iter_scan_folders(root):
+    """(key, path) of every scan folder under `root`: sharded ones first, then flat-layout ones."""
+    root = Path(root)
+    if not root.is_dir():
+        return
+    entries = sorted(root.iterdir())
+    for first in entries:
+        if not (first.is_dir() and SHARD_RE.match(first.name)):
+            continue
+        for second in sorted(first.iterdir()):
+            if not (second.is_dir() and SHARD_RE.match(second.name)):
+                continue
+            for folder in sorted(second.iterdir()):
+                if folder.is_dir() and UID_RE.match(folder.name):
+                    yield folder.name, folder
+    for folder in entries:
+        if not SHARD_RE.match(folder.name) and is_legacy_scan_folder(folder):
+            yield folder.name, folder
+
+
+def legacy_uid(folder):
+    """UID of a flat-layout folder: from its manifest, its name, or its raw snapshot."""
+    folder = Path(folder)
+    try:
+        with open(folder / 'manifest.json', 'r', encoding='utf-8') as f:
+            uid = str(json.load(f).get('uid') or '')
+        if UID_RE.match(uid):
+            return uid
+    except (OSError, ValueError):
+        pass
+    match = LEGACY_UID_RE.search(folder.name)
+    if match:
+        return match.group(1)
+    import raw_store
+    try:
+        uid = str((raw_store.RawSnapshot(folder).header() or {}).get('uid') or '')
+    except (OSError, ValueError):
+        return None
+    return uid if UID_RE.match(uid) else None
+
+
+def folder_uid(key, folder=None):
+    """UID of a folder key (the key itself for sharded folders); the key when it has none."""
+    if UID_RE.match(str(key)):
+        return str(key)
+    match = LEGACY_UID_RE.search(str(key))
+    if match:
+        return match.group(1)
+    return (legacy_uid(folder) if folder is not None else None) or str(key)
+
+
+def remove_empty_parents(folder, root):
+    """Removes the shard directories left empty above a deleted folder."""
+    root = Path(root).resolve()
+    parent = Path(folder).resolve().parent
+    while parent != root and root in parent.parents:
+        try:
+            parent.rmdir()
+        except OSError:
+            break
+        parent = parent.parent
+
+
+def migrate(root, repository=None, index=None):
+    """
+    Moves the flat-layout folders of `root` to their shard. The scan database
+    (scan_db.ScanRepository) and the manifest index are re-keyed when given.
+    Returns {'moved': [(old key, uid)], 'skipped': [(old key, reason)]}.
+    """
+    root = Path(root)
+    report = {'moved': [], 'skipped': []}
+    legacy = [(key, path) for key, path in iter_scan_folders(root) if not UID_RE.match(key)]
+    for key, path in legacy:
+        uid = legacy_uid(path)
+        if uid is None:
+            report['skipped'].append((key, 'no UID'))
+            continue
+        target = shard_dir(root, uid)
+        with locks.uid_lock(uid, root):
+            if target.exists():
+                # Another folder of the same player was migrated first (e.g. a renamed copy)
+                report['skipped'].append((key, f'{display_path(root, target)} already exists'))
+                continue
+            target.parent.mkdir(parents=True, exist_ok=True)
+            os.rename(path, target)
+        if repository is not None:
+            repository.rename_folder(key, uid)
+        if index is not None:
+            index.rename(key, uid)
+        report['moved'].append((key, uid))
+    for key, reason in report['skipped']:
+        logging.warning(f"Scan folder {key} not migrated: {reason}")
+    if report['moved']:
+        logging.info(f"Moved {len(report['moved'])} scan folder(s) to the sharded layout under {root}")
+    return report
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != 'migrate':
+        print("Usage: python shards.py migrate [root]")
+        sys.exit(1)
+    data_root = Path(sys.argv[2]) if len(sys.argv) > 2 else Path(__file__).resolve().parent / "data"
+    result = migrate(data_root)
+    for old, uid in result['moved']:
+        print(f"{old} -> {display_path(data_root, shard_dir(data_root, uid))}")
+    for old, reason in result['skipped']:
+        print(f"{old}: skipped ({reason})")
@@ -0,0 +1,78 @@
+"""
+Leaderboard snapshots for incremental refreshes.
+
+Each deep leaderboard build (calc ID + character) stores its enriched rows together
+with a fingerprint of the Akasha entry they were built from. On the next refresh,
+entries whose fingerprint did not change reuse the stored row instead of being
+fetched from Enka again.
+"""
+import os
+import re
+import json
+import hashlib
+import threading
+from pathlib import Path
+
+SNAPSHOT_DIR = os.environ.get('LEADERBOARD_SNAPSHOT_DIR', str(Path(__file__).resolve().parent / "data" / "leaderboard_snapshots"))
+
+# Akasha fields that change when the build changes. Rank, nickname and region are
+# left out: a player moving down the board does not need a new Enka fetch.
+FINGERPRINT_FIELDS = ('UID', 'Weapon', 'Refine', 'DMG_Result', 'HP', 'ATK', 'DEF', 'EM', 'ER',
+                      'Crit_Rate', 'Crit_DMG', 'Elem_Bonus', 'Artifact_Sets')
+# Fields refreshed from the current entry when a stored row is reused
+VOLATILE_FIELDS = ('Rank', 'Player', 'Region')
+
+_lock = threading.Lock()
+
+
+def entry_fingerprint(entry):
+    payload = json.dumps([entry.get(field) for field in FINGERPRINT_FIELDS], default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def snapshot_path(calculation_id, character, root=None):
+    safe_char = re.sub(r'[^a-z0-9]', '', str(character).lower())
+    safe_id = re.sub(r'[^a-zA-Z0-9_-]', '_', str(calculation_id))
+    return os.path.join(root or SNAPSHOT_DIR, f"{safe_id}_{safe_char}.json")
+
+
+def load_snapshot(calculation_id, character, root=None):
+    """Returns {uid: {'fingerprint': .., 'row': ..}}; empty when there is no usable snapshot."""
+    try:
+        with open(snapshot_path(calculation_id, character, root), 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return data.get('entries', {}) if isinstance(data, dict) else {}
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def save_snapshot(calculation_id, character, entries, root=None):
+    """Atomically replaces the snapshot (temp file + rename)."""
+    path = snapshot_path(calculation_id, character, root)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with _lock:
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'calc_id': calculation_id, 'character': character, 'entries': entries}, f,
+                      ensure_ascii=False, default=str)
+        os.replace(tmp_path, path)
+
+
+def is_unchanged(previous, fingerprint, shallow=False):
+    """
+    True when the stored entry can be reused: same fingerprint, and not a row built
+    from Akasha alone (shallow) when the caller wants the full Enka data.
+    """
+    if not previous or previous.get('fingerprint') != fingerprint:
+        return False
+    return shallow or previous.get('source') != 'akasha'
+
+
+def reuse_row(previous, entry):
+    """Stored row with the rank-related fields of the current entry (None for a skipped entry)."""
+    if previous.get('row') is None:
+        return None
+    row = dict(previous['row'])
+    for field in VOLATILE_FIELDS:
+        row[field] = entry.get(field)
+    return row
@@ -0,0 +1,308 @@
+"""
+Durable Enrichment Queue
+========================
+SQLite-backed task queue shared by the API and one or more `worker.py` processes.
+
+One task = one leaderboard UID to enrich with Enka data. Workers lease a task for
+a limited time; a task whose lease expired (worker crashed or was killed) goes back
+to the queue and is retried, up to MAX_ATTEMPTS. Results are stored with the task,
+so the producer can collect them from any process. The Enka rate budget is kept in
+the same database (reserve_slot), so it holds for all the workers together.
+"""
+
+import os
+import json
+import socket
+import sqlite3
+import time
+import uuid
+from pathlib import Path
+
+# --- CONFIGURATION ---
+QUEUE_PATH = os.environ.get('ENRICH_QUEUE_PATH', str(Path(__file__).resolve().parent / "data" / "enrich_queue.db"))
+LEASE_SECONDS = 120
+MAX_ATTEMPTS = 3
+
+QUEUED = 'queued'
+LEASED = 'leased'
+DONE = 'done'
+FAILED = 'failed'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    batch_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    uid TEXT,
+    character TEXT NOT NULL,
+    entry TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_expires REAL,
+    outcome TEXT,
+    result TEXT,
+    error TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks (status, lease_expires);
+CREATE INDEX IF NOT EXISTS idx_tasks_batch ON tasks (batch_id, position);
+
+CREATE TABLE IF NOT EXISTS workers (
+    worker_id TEXT PRIMARY KEY,
+    host TEXT,
+    pid INTEGER,
+    started REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    done INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    busy_seconds REAL NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS rate_limits (
+    name TEXT PRIMARY KEY,
+    next_slot REAL NOT NULL
+);
+"""
+
+
+class TaskQueue:
+    """Small lease-based queue on top of SQLite (WAL mode, safe across processes)."""
+    def __init__(self, path=QUEUE_PATH, lease_seconds=LEASE_SECONDS, max_attempts=MAX_ATTEMPTS):
+        self.path = str(path)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.executescript(SCHEMA)
+        finally:
+            conn.close()
+
+    def _connect(self):
+        # A fresh connection per operation keeps the queue usable from threads and forked processes
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    # --- Producer side ---
+    def enqueue(self, entries, character, batch_id=None, positions=None):
+        """
+        Adds one task per leaderboard entry. Returns the batch ID.
+        `positions` are the leaderboard positions of the entries (1, 2, ... by default).
+        """
+        batch_id = batch_id or uuid.uuid4().hex
+        positions = list(positions) if positions is not None else range(1, len(entries) + 1)
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(
+                "INSERT INTO tasks (batch_id, position, uid, character, entry, created, updated) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (batch_id, i, str(entry.get('UID') or ''), character, json.dumps(entry, ensure_ascii=False), now, now)
+                    for i, entry in zip(positions, entries)
+                ]
+            )
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+        return batch_id
+
+    def batch_tasks(self, batch_id):
+        """All tasks of a batch in leaderboard order, with decoded results."""
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT id, position, uid, status, attempts, outcome, result, error FROM tasks WHERE batch_id = ? ORDER BY position",
+                (batch_id,)
+            ).fetchall()
+        finally:
+            conn.close()
+        tasks = []
+        for row in rows:
+            task = dict(row)
+            task['result'] = json.loads(task['result']) if task['result'] else None
+            tasks.append(task)
+        return tasks
+
+    def cancel_batch(self, batch_id):
+        """Removes tasks of a batch that no worker has picked up yet."""
+        conn = self._connect()
+        try:
+            cursor = conn.execute("DELETE FROM tasks WHERE batch_id = ? AND status = ?", (batch_id, QUEUED))
+            return cursor.rowcount
+        finally:
+            conn.close()
+
+    def purge_batch(self, batch_id):
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM tasks WHERE batch_id = ?", (batch_id,))
+        finally:
+            conn.close()
+
+    # --- Worker side ---
+    def register_worker(self, worker_id=None):
+        worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO workers (worker_id, host, pid, started, last_seen) VALUES (?, ?, ?, ?, ?)",
+                (worker_id, socket.gethostname(), os.getpid(), now, now)
+            )
+        finally:
+            conn.close()
+        return worker_id
+
+    def lease(self, worker_id):
+        """
+        Atomically takes the oldest queued task (or one whose lease expired).
+        Returns a dict with the decoded leaderboard entry, or None when the queue is empty.
+        """
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            self._reap_expired(conn, now)
+            # Leasing (even when there is nothing to lease) is the worker's heartbeat
+            conn.execute("UPDATE workers SET last_seen = ? WHERE worker_id = ?", (now, worker_id))
+            row = conn.execute(
+                "SELECT * FROM tasks WHERE status = ? OR (status = ? AND lease_expires < ?) ORDER BY id LIMIT 1",
+                (QUEUED, LEASED, now)
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE tasks SET status = ?, lease_owner = ?, lease_expires = ?, attempts = attempts + 1, updated = ? WHERE id = ?",
+                (LEASED, worker_id, now + self.lease_seconds, now, row['id'])
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+        task = dict(row)
+        task['attempts'] += 1
+        task['entry'] = json.loads(task['entry'])
+        return task
+
+    def _reap_expired(self, conn, now):
+        # Tasks that used up their attempts while leased by a dead worker are failed for good
+        conn.execute(
+            "UPDATE tasks SET status = ?, outcome = 'failed', error = 'Lease expired too many times', "
+            "lease_owner = NULL, lease_expires = NULL, updated = ? "
+            "WHERE status = ? AND lease_expires < ? AND attempts >= ?",
+            (FAILED, now, LEASED, now, self.max_attempts)
+        )
+
+    def reap_expired(self):
+        """Fails the tasks whose last lease expired, without waiting for a worker to call lease()."""
+        conn = self._connect()
+        try:
+            self._reap_expired(conn, time.time())
+        finally:
+            conn.close()
+
+    def live_workers(self, within):
+        """Number of workers seen in the last `within` seconds."""
+        conn = self._connect()
+        try:
+            return conn.execute("SELECT COUNT(*) FROM workers WHERE last_seen >= ?", (time.time() - within,)).fetchone()[0]
+        finally:
+            conn.close()
+
+    def complete(self, task_id, worker_id, outcome, result=None, elapsed=0.0):
+        """Stores the result of a leased task ('fetched' or 'skipped')."""
+        self._finish(task_id, worker_id, DONE, outcome=outcome, result=result, elapsed=elapsed)
+
+    def fail(self, task_id, worker_id, error, elapsed=0.0, retry=True):
+        """
+        Records a failed attempt. The task is queued again until MAX_ATTEMPTS is reached
+        (never with retry=False, for errors another attempt cannot fix).
+        """
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT attempts FROM tasks WHERE id = ?", (task_id,)).fetchone()
+        finally:
+            conn.close()
+        retry = retry and row is not None and row['attempts'] < self.max_attempts
+        self._finish(task_id, worker_id, QUEUED if retry else FAILED, outcome=None if retry else 'failed',
+                     error=str(error), elapsed=elapsed)
+
+    def _finish(self, task_id, worker_id, status, outcome=None, result=None, error=None, elapsed=0.0):
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            # Only the current lease owner may finish a task (an expired lease may have been re-issued)
+            cursor = conn.execute(
+                "UPDATE tasks SET status = ?, outcome = ?, result = ?, error = ?, lease_owner = NULL, lease_expires = NULL, updated = ? "
+                "WHERE id = ? AND lease_owner = ?",
+                (status, outcome, json.dumps(result, ensure_ascii=False) if result is not None else None, error, now, task_id, worker_id)
+            )
+            if cursor.rowcount:
+                column = 'done' if status == DONE else 'failed'
+                conn.execute(
+                    f"UPDATE workers SET {column} = {column} + 1, busy_seconds = busy_seconds + ?, last_seen = ? WHERE worker_id = ?",
+                    (elapsed, now, worker_id)
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def reserve_slot(self, interval, name='enka'):
+        """
+        Reserves the next request slot of the `name` rate limit, shared by every worker
+        of the queue: slots are `interval` seconds apart whatever the number of workers.
+        Returns the time at which the caller may send its request.
+        """
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT next_slot FROM rate_limits WHERE name = ?", (name,)).fetchone()
+            slot = max(now, row['next_slot']) if row else now
+            conn.execute(
+                "INSERT INTO rate_limits (name, next_slot) VALUES (?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET next_slot = excluded.next_slot",
+                (name, slot + interval)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        return slot
+
+    def wait_for_slot(self, interval, name='enka'):
+        """Sleeps until the next slot of the shared rate limit."""
+        delay = self.reserve_slot(interval, name) - time.time()
+        if delay > 0:
+            time.sleep(delay)
+
+    # --- Monitoring ---
+    def stats(self):
+        """Queue depth per status and per-worker throughput."""
+        now = time.time()
+        conn = self._connect()
+        try:
+            counts = {row['status']: row['n'] for row in conn.execute("SELECT status, COUNT(*) AS n FROM tasks GROUP BY status")}
+            workers = [dict(row) for row in conn.execute("SELECT * FROM workers ORDER BY started")]
+        finally:
+            conn.close()
+        for worker in workers:
+            uptime = max(now - worker['started'], 1e-9)
+            worker['tasks_per_minute'] = round((worker['done'] + worker['failed']) * 60 / uptime, 2)
+        return {'tasks': counts, 'workers': workers}
@@ -0,0 +1,98 @@
+"""
+Enrichment Worker
+=================
+Pulls leaderboard enrichment tasks (one per UID) from the shared SQLite queue
+and runs the Enka fetch + parse for them. Start as many as needed:
+
+    python worker.py                 # run forever
+    python worker.py --once          # drain the queue, then exit
+    python worker.py --stats         # print queue and per-worker throughput
+
+Several processes (or compose replicas) can share the same queue file.
+"""
+
+import argparse
+import logging
+import signal
+import time
+
+import leaderboard
+import task_queue
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("worker")
+
+# --- CONFIGURATION ---
+IDLE_SLEEP = 2.0  # Seconds to wait when the queue is empty
+
+
+def run_worker(queue, worker_id=None, once=False, request_delay=leaderboard.REQUEST_DELAY, stop=lambda: False):
+    """Main loop: lease -> enrich -> complete/fail. Returns the number of processed tasks."""
+    worker_id = queue.register_worker(worker_id)
+    logger.info(f"Worker {worker_id} started on {queue.path}")
+    processed = 0
+
+    while not stop():
+        task = queue.lease(worker_id)
+        if task is None:
+            if once:
+                break
+            time.sleep(IDLE_SLEEP)
+            continue
+
+        # Stay within Enka's rate budget, shared by all the workers of the queue: one slot per
+        # Enka request, so retries are left to the queue (a failed task is leased again)
+        queue.wait_for_slot(request_delay)
+        started = time.time()
+        try:
+            row, outcome, error = leaderboard.enrich_entry(task['entry'], task['character'], max_retries=1)
+            elapsed = time.time() - started
+            if outcome == 'failed':
+                # No point in asking again for a profile that does not exist
+                queue.fail(task['id'], worker_id, error or "Enka fetch failed", elapsed=elapsed,
+                           retry="404" not in str(error))
+            else:
+                queue.complete(task['id'], worker_id, outcome, result=row, elapsed=elapsed)
+            logger.info(f"Task {task['id']} UID {task['uid']} -> {outcome} ({elapsed:.1f}s, attempt {task['attempts']})")
+        except Exception as e:
+            logger.exception(f"Task {task['id']} crashed")
+            queue.fail(task['id'], worker_id, e, elapsed=time.time() - started)
+
+        processed += 1
+
+    logger.info(f"Worker {worker_id} stopped after {processed} tasks")
+    return processed
+
+
+def print_stats(queue):
+    stats = queue.stats()
+    print("Tasks:", ", ".join(f"{k}={v}" for k, v in sorted(stats['tasks'].items())) or "none")
+    for w in stats['workers']:
+        print(f"  {w['worker_id']}: done={w['done']} failed={w['failed']} "
+              f"busy={w['busy_seconds']:.0f}s rate={w['tasks_per_minute']}/min")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Leaderboard enrichment worker")
+    parser.add_argument("--queue", default=task_queue.QUEUE_PATH, help="Path to the SQLite queue file")
+    parser.add_argument("--worker-id", default=None)
+    parser.add_argument("--once", action="store_true", help="Exit when the queue is empty")
+    parser.add_argument("--stats", action="store_true", help="Print queue statistics and exit")
+    args = parser.parse_args()
+
+    queue = task_queue.TaskQueue(args.queue)
+    if args.stats:
+        print_stats(queue)
+        return
+
+    stopping = []
+    signal.signal(signal.SIGTERM, lambda *_: stopping.append(True))
+    try:
+        run_worker(queue, worker_id=args.worker_id, once=args.once, stop=lambda: bool(stopping))
+    except KeyboardInterrupt:
+        pass
+    print_stats(queue)
+
+
+if __name__ == "__main__":
+    main()
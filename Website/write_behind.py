@@ -0,0 +1,257 @@
+"""
+Write-behind persistence of the scans.
+
+The API answers /scan as soon as the Enka response is parsed; ScanWriter then
+persists it (enka.save_player_data: merges, delta logs, raw snapshot, manifest,
+scan database) on a single background thread:
+
+- bounded: at most `max_pending` scans wait in memory, submit() blocks beyond that
+- ordered: scans are written one at a time, in submission order
+- durable: every submitted scan is first spooled (one compact JSON file, named after
+  its sequence number) and removed once written; spooled scans left by a crash or an
+  unfinished shutdown are replayed, in order, by start()
+- shared: each writer spools into its own <root>/.pending/<owner>/ and holds the
+  <owner>.lock file lock while it runs. start() only claims the spools whose lock is
+  free (their writer is gone), by moving their files into its own spool, so several
+  uvicorn workers never replay the same scan
+- reported: status(uid) tells whether the last scan of a player is pending, saved
+  or failed (with the error); failed spool files are kept as *.failed
+"""
+import os
+import json
+import time
+import uuid
+import queue
+import logging
+import threading
+from pathlib import Path
+from contextlib import ExitStack
+from collections import OrderedDict
+
+import enka
+import locks
+
+PENDING_DIR = ".pending"
+MAX_STATUSES = 1000
+
+_STOP = object()
+
+
+class ScanWriter:
+    """Background writer of the scans of `root`."""
+    def __init__(self, root, repository=None, max_pending=32, fsync=True):
+        self.root = Path(root)
+        self.repository = repository
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.spool_dir = self.root / PENDING_DIR / self.owner
+        self.fsync = fsync
+        self.written = 0
+        self.failed = 0
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._statuses = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_seq = 0
+        self._closed = False
+        self._thread = None
+        self._owner_lock = None
+
+    # --- Spool ---
+
+    def _next_seq(self):
+        self._last_seq = max(time.time_ns(), self._last_seq + 1)
+        return self._last_seq
+
+    def _hold_spool(self):
+        """Takes the lock of our spool (held until close()), then creates it."""
+        if self._owner_lock is None:
+            self._owner_lock = ExitStack()
+            self._owner_lock.enter_context(locks.file_lock(self.root / PENDING_DIR / f"{self.owner}.lock"))
+        self.spool_dir.mkdir(parents=True, exist_ok=True)
+
+    def _spool(self, seq, uid, data):
+        self._hold_spool()
+        path = self.spool_dir / f"{seq:020d}-{uid}.json"
+        tmp_path = path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'uid': str(uid), 'data': data}, f, ensure_ascii=False, separators=(',', ':'))
+            if self.fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        return path
+
+    def pending_files(self):
+        """Spooled scans not written yet, oldest first."""
+        if not self.spool_dir.is_dir():
+            return []
+        return sorted(self.spool_dir.glob('*.json'))
+
+    # --- Status ---
+
+    def _set_status(self, uid, **fields):
+        with self._lock:
+            status = dict(self._statuses.pop(str(uid), {}), uid=str(uid), **fields)
+            self._statuses[str(uid)] = status
+            while len(self._statuses) > MAX_STATUSES:
+                self._statuses.popitem(last=False)
+            return dict(status)
+
+    def status(self, uid):
+        """Persistence status of the last scan of `uid` (None when it was never submitted here)."""
+        with self._lock:
+            status = self._statuses.get(str(uid))
+            return dict(status) if status else None
+
+    def stats(self):
+        return {
+            "pending": self._queue.qsize(),
+            "max_pending": self._queue.maxsize,
+            "written": self.written,
+            "failed": self.failed,
+            "running": self._thread is not None and self._thread.is_alive(),
+        }
+
+    # --- Writing ---
+
+    def submit(self, uid, data, parsed=None):
+        """
+        Spools the scan and queues it for writing; blocks while `max_pending` scans
+        are already waiting. Returns its status.
+        """
+        if self._closed:
+            raise RuntimeError("ScanWriter is closed")
+        with self._lock:
+            # Sequence numbers and queue order must match: both are taken under the lock
+            seq = self._next_seq()
+            path = self._spool(seq, uid, data)
+        status = self._set_status(uid, state='pending', seq=seq, submitted_at=time.time(), error=None)
+        self._queue.put((seq, str(uid), data, parsed, path))
+        return status
+
+    def _write(self, seq, uid, data, parsed, path):
+        status = self.status(uid)
+        current = status is not None and status.get('seq') == seq
+        try:
+            if parsed is None:
+                parsed, error = enka.parse_player_data(data)
+                if error:
+                    raise ValueError(error)
+            enka.save_player_data(uid, data, parsed, output_root=self.root, repository=self.repository)
+        except Exception as e:
+            logging.exception(f"Write-behind save failed for {uid} ({path.name})")
+            self.failed += 1
+            try:
+                os.replace(path, path.with_suffix('.failed'))
+            except OSError:
+                pass
+            if current:
+                self._set_status(uid, state='failed', error=str(e), finished_at=time.time())
+            return
+        self.written += 1
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        if current:
+            # A newer scan of the same player may have been submitted meanwhile: keep its status
+            self._set_status(uid, state='saved', finished_at=time.time())
+
+    def _loop(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is _STOP:
+                    return
+                self._write(*item)
+            finally:
+                self._queue.task_done()
+
+    def _claim_spools(self):
+        """
+        Moves into our spool the files of the spools whose writer is gone (their lock
+        is free), and those of the flat .pending/ layout. Returns the claimed scans.
+        """
+        pending = self.root / PENDING_DIR
+        claimed = []
+        for path in sorted(pending.glob('*.json')):
+            try:
+                os.rename(path, self.spool_dir / path.name)
+            except FileNotFoundError:
+                continue  # Claimed by another writer
+            claimed.append(self.spool_dir / path.name)
+
+        for folder in sorted(p for p in pending.iterdir() if p.is_dir() and p.name != self.owner):
+            lock_file = pending / f"{folder.name}.lock"
+            try:
+                with locks.file_lock(lock_file, timeout=0):
+                    if not folder.is_dir():
+                        continue  # Claimed by another writer meanwhile
+                    for path in sorted(folder.iterdir()):
+                        if path.suffix == '.tmp':
+                            path.unlink(missing_ok=True)
+                            continue
+                        os.replace(path, self.spool_dir / path.name)
+                        if path.suffix == '.json':
+                            claimed.append(self.spool_dir / path.name)
+                    folder.rmdir()
+                    lock_file.unlink(missing_ok=True)
+            except TimeoutError:
+                continue  # Its writer is running
+            except OSError as e:
+                logging.warning(f"Could not claim the spooled scans of {folder}: {e}")
+        return sorted(claimed)
+
+    def recover(self):
+        """Queues, in order, the scans spooled by writers that are gone. Returns their number."""
+        self._hold_spool()
+        files = self._claim_spools()
+        for path in files:
+            seq_text, _, uid = path.stem.partition('-')
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)['data']
+            except (OSError, ValueError, KeyError) as e:
+                logging.warning(f"Unreadable spooled scan {path.name}: {e}")
+                os.replace(path, path.with_suffix('.failed'))
+                continue
+            seq = int(seq_text)
+            with self._lock:
+                self._last_seq = max(self._last_seq, seq)
+            self._set_status(uid, state='pending', seq=seq, submitted_at=None, error=None)
+            self._queue.put((seq, uid, data, None, path))
+        if files:
+            logging.info(f"Replaying {len(files)} spooled scan(s) in {self.spool_dir}")
+        return len(files)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="scan-writer", daemon=True)
+            self._thread.start()
+            self.recover()
+
+    def flush(self):
+        """Waits until every queued scan is written."""
+        self._queue.join()
+
+    def close(self, timeout=30):
+        """
+        Stops accepting scans and waits up to `timeout` seconds for the queued ones.
+        Scans still unwritten stay spooled and are replayed by the next start().
+        """
+        self._closed = True
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+            if self._thread.is_alive():
+                logging.warning(f"Scan writer stopped with {self._queue.qsize()} scan(s) still spooled")
+                # Still writing: keep the spool locked until the process exits
+                return
+            self._thread = None
+        if self._owner_lock is not None:
+            try:
+                self.spool_dir.rmdir()  # Only when empty: what is left is claimed by the next start()
+                (self.root / PENDING_DIR / f"{self.owner}.lock").unlink(missing_ok=True)
+            except OSError:
+                pass
+            self._owner_lock.close()
+            self._owner_lock = None
@@ -0,0 +1,268 @@
+import sys
+import os
+import json
+import time
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+# Add Website to path so we can import akasha
+sys.path.insert(0, os.path.join(os.getcwd(), 'Website'))
+
+import akasha
+import dataset_sink
+
+
+def make_entry(rank, uid=None):
+    return {
+        'name': 'Furina',
+        'index': rank,
+        'uid': uid if uid is not None else str(700000000 + rank),
+        'stats': {'maxHp': {'value': 40000}, 'critRate': {'value': 0.7}},
+        'owner': {'nickname': f'P{rank}'},
+        'weapon': {'name': 'Splendor'},
+        'calculation': {'result': 1000 - rank},
+    }
+
+
+class FakeAkasha:
+    """Serves a leaderboard of `total` entries; only the second query shape works."""
+    def __init__(self, total, failing_pages=()):
+        self.total = total
+        self.failing_pages = set(failing_pages)
+        self.calls = []
+
+    def __call__(self, session, url, params=None, **kwargs):
+        self.calls.append(dict(params))
+        response = MagicMock()
+        if 'LeaderboardId' in params or params['page'] in self.failing_pages:
+            response.status_code = 200 if 'LeaderboardId' in params else 500
+            response.json.return_value = {'data': []}
+            return response
+        size, page = params['size'], params['page']
+        ranks = range((page - 1) * size + 1, min(page * size, self.total) + 1)
+        response.status_code = 200
+        response.json.return_value = {'data': [make_entry(r) for r in ranks]}
+        return response
+
+
+class TestAkashaPages(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.shape_cache = os.path.join(tmp.name, 'shapes.json')
+        patcher = patch('akasha.QUERY_SHAPE_CACHE', self.shape_cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_pages_are_merged_in_rank_order(self):
+        fake = FakeAkasha(total=45)
+        with patch('akasha.http_client.get_with_retry', side_effect=fake), \
+             patch('akasha.http_client.create_session'):
+            entries, state = akasha.fetch_leaderboard_pages('123', limit=100, page_size=20, max_workers=2)
+
+        self.assertEqual([e['index'] for e in entries], list(range(1, 46)))
+        self.assertTrue(state['complete'])
+        self.assertEqual(state['last_good_page'], 3)
+        # Waves of 2 pages: pages after the short page 3 are never requested
+        pages = sorted(c['page'] for c in fake.calls if 'calculationId' in c)
+        self.assertEqual(pages, [1, 2, 3])
+
+    def test_duplicates_across_pages_are_dropped(self):
+        pages = {
+            1: [make_entry(1), make_entry(2)],
+            # Entry 2 moved down one rank between the two requests
+            2: [dict(make_entry(3, uid='700000002'), index=3), make_entry(4)],
+        }
+        merged = akasha.merge_pages(pages)
+        self.assertEqual([e['index'] for e in merged], [1, 2, 4])
+
+    def test_resume_from_last_good_page(self):
+        fake = FakeAkasha(total=60, failing_pages={2})
+        with patch('akasha.http_client.get_with_retry', side_effect=fake), \
+             patch('akasha.http_client.create_session'):
+            entries, state = akasha.fetch_leaderboard_pages('123', limit=60, page_size=20)
+            self.assertFalse(state['complete'])
+            self.assertEqual(state['last_good_page'], 1)
+            self.assertEqual(len(entries), 20)
+            self.assertIn(3, state['pages'])
+
+            fake.failing_pages.clear()
+            fake.calls.clear()
+            entries, state = akasha.fetch_leaderboard_pages('123', limit=60, page_size=20, resume=state)
+
+        self.assertTrue(state['complete'])
+        self.assertEqual(len(entries), 60)
+        # Only the missing page is fetched again, with the query shape that worked
+        self.assertEqual([(c['page'], 'calculationId' in c) for c in fake.calls], [(2, True)])
+
+    def test_fetch_leaderboard_resumes_incomplete_fetch(self):
+        fake = FakeAkasha(total=40, failing_pages={2})
+        akasha._partial_fetches.clear()
+        with patch('akasha.http_client.get_with_retry', side_effect=fake), \
+             patch('akasha.http_client.create_session'), \
+             patch('pandas.DataFrame.to_csv'), patch('builtins.print'):
+            first = akasha.fetch_leaderboard('123', limit=40)
+            fake.failing_pages.clear()
+            fake.calls.clear()
+            second = akasha.fetch_leaderboard('123', limit=40)
+
+        self.assertEqual(len(first), 20)
+        self.assertEqual(len(second), 40)
+        self.assertEqual([c['page'] for c in fake.calls], [2])
+        self.assertEqual(akasha._partial_fetches, {})
+
+    def test_quiet_mode_has_no_side_effects_and_feeds_the_sink(self):
+        fake = FakeAkasha(total=5)
+        tmp = os.path.dirname(self.shape_cache)
+        sink = dataset_sink.LeaderboardDatasetSink(os.path.join(tmp, 'datasets'), use_parquet=False)
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            with patch('akasha.http_client.get_with_retry', side_effect=fake), \
+                 patch('akasha.http_client.create_session'), patch('builtins.print') as mock_print:
+                profiles = akasha.fetch_leaderboard('123', limit=5, quiet=True, sink=sink)
+        finally:
+            os.chdir(cwd)
+
+        mock_print.assert_not_called()
+        self.assertEqual(len(profiles), 5)
+        # No <character>_dataset.csv in the working directory, only the sink's snapshot
+        self.assertEqual(sorted(os.listdir(tmp)), ['datasets', 'shapes.json'])
+        self.assertEqual(len(sink.read('123')), 5)
+
+    def test_quiet_mode_logs_request_errors(self):
+        fake = FakeAkasha(total=5)
+        fake.errors = iter([ConnectionError("reset")])
+
+        def flaky(session, url, params=None, **kwargs):
+            if params['page'] == 1 and 'calculationId' in params:
+                error = next(fake.errors, None)
+                if error:
+                    raise error
+            return fake(session, url, params=params, **kwargs)
+
+        with patch('akasha.http_client.get_with_retry', side_effect=flaky), \
+             patch('akasha.http_client.create_session'), patch('builtins.print') as mock_print, \
+             self.assertLogs(level='WARNING') as logs:
+            entries, _ = akasha.fetch_leaderboard_pages('123', limit=5)
+
+        mock_print.assert_not_called()
+        self.assertIn('reset', '\n'.join(logs.output))
+        self.assertEqual(entries, [])
+
+    def test_transient_error_keeps_the_remembered_shape(self):
+        akasha._update_query_shape('123', 'calculationId', self.shape_cache)
+        fake = FakeAkasha(total=5)
+        errors = iter([TimeoutError("timed out")])
+
+        def flaky(session, url, params=None, **kwargs):
+            if 'calculationId' in params:
+                error = next(errors, None)
+                if error:
+                    raise error
+            return fake(session, url, params=params, **kwargs)
+
+        with patch('akasha.http_client.get_with_retry', side_effect=flaky), \
+             patch('akasha.http_client.create_session'), self.assertLogs(level='WARNING'):
+            entries, _ = akasha.fetch_leaderboard_pages('123', limit=5)
+        self.assertEqual(entries, [])
+        self.assertEqual(akasha.load_query_shapes(self.shape_cache), {'123': 'calculationId'})
+
+        # The next fetch tries it first again, and it works
+        fake.calls.clear()
+        with patch('akasha.http_client.get_with_retry', side_effect=flaky), \
+             patch('akasha.http_client.create_session'):
+            entries, _ = akasha.fetch_leaderboard_pages('123', limit=5)
+        self.assertEqual(len(entries), 5)
+        self.assertEqual(len(fake.calls), 1)
+
+    def test_dataset_sink_round_trip(self):
+        sink = dataset_sink.LeaderboardDatasetSink(os.path.dirname(self.shape_cache), use_parquet=False)
+        profiles = [akasha.parse_entry(make_entry(r)) for r in (1, 2)]
+        sink.write('123', profiles)
+        sink.write('123', profiles[:1])
+        sink.write('456', profiles)
+
+        self.assertEqual(len(sink.files('123')), 2)
+        df = sink.read('123', columns=['UID', 'HP', 'fetched_at'])
+        self.assertEqual(len(df), 3)
+        self.assertEqual(set(df['calc_id']), {'123'})
+        self.assertEqual(len(sink.read()), 5)
+        with self.assertRaises(ValueError):
+            sink.write('../x', profiles)
+
+    def test_dataset_sink_compaction(self):
+        sink = dataset_sink.LeaderboardDatasetSink(os.path.dirname(self.shape_cache), use_parquet=False)
+        profiles = [akasha.parse_entry(make_entry(r)) for r in (1, 2)]
+        for _ in range(3):
+            sink.write('123', profiles)
+        sink.write('456', profiles)
+
+        self.assertEqual(sink.compact(), 3)
+        self.assertEqual(len(sink.files('123')), 1)
+        self.assertEqual(len(sink.files('456')), 1)
+        df = sink.read('123')
+        self.assertEqual(len(df), 6)
+        self.assertEqual(set(df['calc_id']), {'123'})
+        self.assertEqual(sink.compact(), 0)
+
+    def test_buffered_sink_flushes_in_the_background(self):
+        sink = dataset_sink.LeaderboardDatasetSink(os.path.dirname(self.shape_cache), use_parquet=False)
+        buffered = dataset_sink.BufferedDatasetSink(sink, flush_interval=3600, max_rows=4)
+        profiles = [akasha.parse_entry(make_entry(r)) for r in (1, 2)]
+        buffered.write('123', profiles)
+        buffered.write('456', profiles[:1])
+        # Nothing is written on the request path
+        self.assertEqual(sink.files(), [])
+        self.assertEqual(buffered.pending_rows(), 3)
+        with self.assertRaises(ValueError):
+            buffered.write('../x', profiles)
+
+        buffered.start()
+        buffered.write('123', profiles)  # max_rows reached: flushed without waiting for the interval
+        for _ in range(100):
+            if len(sink.files()) == 2:
+                break
+            time.sleep(0.02)
+        self.assertEqual(len(sink.files('123')), 1)
+        self.assertEqual(len(sink.read('123')), 4)
+
+        buffered.write('456', profiles)
+        buffered.stop()
+        self.assertEqual(buffered.pending_rows(), 0)
+        self.assertEqual(len(sink.read('456')), 3)
+
+    def test_query_shape_is_remembered(self):
+        fake = FakeAkasha(total=10)
+        with patch('akasha.http_client.get_with_retry', side_effect=fake), \
+             patch('akasha.http_client.create_session'):
+            akasha.fetch_leaderboard_pages('123', limit=20)
+            self.assertEqual(len(fake.calls), 2)
+            with open(self.shape_cache, encoding='utf-8') as f:
+                self.assertEqual(json.load(f), {'123': 'calculationId'})
+
+            fake.calls.clear()
+            entries, _ = akasha.fetch_leaderboard_pages('123', limit=20)
+
+        self.assertEqual(len(entries), 10)
+        # Exactly one upstream attempt, with the remembered shape
+        self.assertEqual(len(fake.calls), 1)
+        self.assertIn('calculationId', fake.calls[0])
+
+    def test_stale_query_shape_is_invalidated(self):
+        with open(self.shape_cache, 'w', encoding='utf-8') as f:
+            json.dump({'123': 'LeaderboardId', '456': 'calculationId'}, f)
+
+        fake = FakeAkasha(total=10)
+        with patch('akasha.http_client.get_with_retry', side_effect=fake), \
+             patch('akasha.http_client.create_session'):
+            entries, _ = akasha.fetch_leaderboard_pages('123', limit=20)
+
+        self.assertEqual(len(entries), 10)
+        self.assertEqual(akasha.load_query_shapes(), {'123': 'calculationId', '456': 'calculationId'})
+
+
+if __name__ == '__main__':
+    unittest.main()
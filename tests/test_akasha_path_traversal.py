@@ -1,6 +1,7 @@
 
 import sys
 import os
+import tempfile
 import unittest
 from unittest.mock import MagicMock, patch
 import pandas as pd
@@ -12,6 +13,14 @@ import akasha
 
 class TestAkashaPathTraversal(unittest.TestCase):
 
+    def setUp(self):
+        # Keep the learned query shapes out of the real data folder
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        patcher = patch('akasha.QUERY_SHAPE_CACHE', os.path.join(tmp.name, 'shapes.json'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
     @patch('akasha.http_client')
     @patch('pandas.DataFrame.to_csv')
     def test_path_traversal_sanitization(self, mock_to_csv, mock_http_client):
@@ -0,0 +1,108 @@
+import sys
+import os
+import shutil
+import time
+import tempfile
+import unittest
+from pathlib import Path
+
+import pandas as pd
+
+# Add Website to path so we can import analytics
+sys.path.append(os.path.join(os.getcwd(), 'Website'))
+
+import analytics
+import dataset_sink
+
+FIXTURES = Path(os.getcwd()) / 'Website' / 'backend'
+
+
+@unittest.skipIf(analytics.pa is None, "pyarrow is not installed")
+class TestAnalytics(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.data = Path(self.tmp.name) / 'data'
+        self.root = Path(self.tmp.name) / 'analytics'
+        for name in ('Kety_821915463', 'HaPpY_705691978'):
+            shutil.copytree(FIXTURES / name, self.data / name)
+        sink = dataset_sink.LeaderboardDatasetSink(self.data / 'datasets' / 'leaderboards', use_parquet=False)
+        sink.write('123', [{'Rank': 1, 'UID': '700000001', 'Crit_Rate': 70.0}])
+        sink.write('456', [{'Rank': 1, 'UID': '700000002', 'Crit_Rate': 60.0}])
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_compact_and_pushdown(self):
+        counts = analytics.compact(self.data, self.root)
+        artifacts = analytics.scan_tables(self.data, 'artifacts')
+        self.assertEqual(counts, {'artifacts': len(artifacts), 'characters': len(analytics.scan_tables(self.data, 'characters')),
+                                  'leaderboards': 2})
+        self.assertTrue((analytics.current_path('artifacts', self.root) / 'Slot=Sands' / 'part-0.parquet').exists())
+
+        # Partition pruning: only the Sands file is scanned
+        dataset = analytics.open_dataset('artifacts', self.root)
+        fragments = list(dataset.get_fragments(filter=analytics._expression([('Slot', '==', 'Sands')])))
+        self.assertEqual(len(fragments), 1)
+
+        some_set = artifacts[artifacts['Slot'] == 'Sands']['Set'].iloc[0]
+        expected = artifacts[(artifacts['Slot'] == 'Sands') & (artifacts['Set'] == some_set)]['Crit_Value']
+        result = analytics.aggregate('artifacts', 'Crit_Value', [('Set', '==', some_set), ('Slot', '==', 'Sands')],
+                                     root=self.root)
+        self.assertEqual(result['count'].iloc[0], len(expected))
+        self.assertAlmostEqual(result['mean'].iloc[0], expected.mean())
+
+        rows = analytics.query('characters', columns=['UID', 'Character'], filters=[('UID', '==', '821915463')],
+                               root=self.root)
+        self.assertEqual(list(rows.columns), ['UID', 'Character'])
+        self.assertEqual(set(rows['UID']), {'821915463'})
+
+        by_calc = analytics.aggregate('leaderboards', 'Crit_Rate', by=['calc_id'], root=self.root)
+        self.assertEqual(dict(zip(by_calc['calc_id'].astype(str), by_calc['mean'])), {'123': 70.0, '456': 60.0})
+
+    def test_recompaction_replaces_dataset(self):
+        analytics.compact(self.data, self.root)
+        first = analytics.current_path('artifacts', self.root)
+        # A reader that opened the first version keeps it while the next one is published
+        reader = analytics.open_dataset('artifacts', self.root)
+        shutil.rmtree(self.data / 'HaPpY_705691978')
+        analytics.compact(self.data, self.root)
+        uids = analytics.query('artifacts', columns=['UID'], root=self.root)['UID']
+        self.assertEqual(set(uids), {'821915463'})
+        self.assertNotEqual(analytics.current_path('artifacts', self.root), first)
+        self.assertGreater(reader.count_rows(), len(uids))
+
+        # Only the published version and the previous one are kept
+        analytics.compact(self.data, self.root)
+        self.assertFalse(first.exists())
+        self.assertEqual(len(list(self.root.glob('artifacts.v*'))), 2)
+        self.assertEqual(sorted(p.name for p in self.root.glob('*.current')),
+                         ['artifacts.current', 'characters.current', 'leaderboards.current'])
+
+    def test_unversioned_dataset_is_still_read(self):
+        analytics.compact(self.data, self.root)
+        os.replace(analytics.current_path('characters', self.root), self.root / 'characters')
+        os.remove(self.root / 'characters.current')
+        self.assertFalse(analytics.query('characters', root=self.root).empty)
+
+        analytics.compact(self.data, self.root)
+        self.assertFalse((self.root / 'characters').exists())
+        self.assertFalse(analytics.query('characters', root=self.root).empty)
+
+    def test_scheduler_compacts_in_the_background(self):
+        scheduler = analytics.CompactionScheduler(self.data, self.root, interval=3600)
+        scheduler.start()
+        for _ in range(300):
+            if scheduler.last_run is not None:
+                break
+            time.sleep(0.05)
+        scheduler.stop()
+        self.assertIsNotNone(scheduler.last_run)
+        self.assertIsNotNone(analytics.current_path('artifacts', self.root))
+
+    def test_missing_dataset(self):
+        self.assertTrue(analytics.query('artifacts', root=self.root).empty)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+import sys
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+# Add Website to path so we can import backend.benchmarks
+sys.path.append(os.path.join(os.getcwd(), 'Website'))
+
+import akasha
+from backend import benchmarks, logic
+
+
+def raw_entry(rank, uid, weapon='Splendor', sets=None, name='Furina'):
+    return {
+        'name': name,
+        'index': rank,
+        'uid': uid,
+        'stats': {'maxHp': {'value': 40000 + rank * 1000}, 'critRate': {'value': 0.6 + rank / 100},
+                  'critDamage': {'value': 2.0}, 'energyRecharge': {'value': 1.5}},
+        'owner': {'nickname': f'P{rank}'},
+        'weapon': {'name': weapon},
+        'calculation': {'result': 1000 - rank},
+        'artifactSets': sets if sets is not None else {'Golden Troupe': {'count': 4}},
+    }
+
+
+LEADERBOARDS = {
+    '1': [raw_entry(1, '700000001'), raw_entry(2, '700000002', weapon='Fleuve')],
+    # Same character, one shared player
+    '2': [raw_entry(1, '700000002', weapon='Fleuve'),
+          raw_entry(2, '700000003', sets={'Golden Troupe': {'count': 2}, 'Tenacity': {'count': 2}})],
+    '3': [raw_entry(1, '700000009', name='Raiden Shogun', weapon='Engulfing')],
+}
+
+
+class TestBenchmarks(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.store = benchmarks.BenchmarkStore(tmp.name)
+
+    def test_set_label(self):
+        self.assertEqual(akasha.artifact_set_label(raw_entry(1, '1')), '4pc Golden Troupe')
+        self.assertEqual(akasha.artifact_set_label({'artifactSets': {'B': {'count': 2}, 'A': {'count': 3}, 'C': 1}}),
+                         '2pc A + 2pc B')
+        self.assertIsNone(akasha.artifact_set_label({}))
+
+    @patch('backend.benchmarks.akasha.fetch_leaderboard_pages')
+    def test_refresh_pools_leaderboards_per_character(self, mock_pages):
+        mock_pages.side_effect = lambda calc_id, limit=100: (LEADERBOARDS[calc_id], {'complete': True})
+        scheduler = benchmarks.BenchmarkScheduler(self.store, ['1', '2', '3'], limit=20)
+        tables = scheduler.refresh_once()
+
+        self.assertEqual(sorted(t['key'] for t in tables), ['furina', 'raidenshogun'])
+        furina = self.store.get('Furina')
+        self.assertEqual(furina['sources'], ['1', '2'])
+        self.assertEqual(furina['sample_size'], 3)
+        self.assertEqual(furina['stats']['HP']['p50'], 42000)
+        self.assertEqual(furina['stats']['Crit_Rate']['mean'], 61.67)
+        self.assertEqual(furina['weapons'][0], {'name': 'Splendor', 'share': 0.667})
+        self.assertEqual([s['name'] for s in furina['sets']], ['4pc Golden Troupe', '2pc Golden Troupe + 2pc Tenacity'])
+
+        # Tables are served from disk by another store instance (e.g. after a restart)
+        other = benchmarks.BenchmarkStore(self.store.root)
+        self.assertEqual(other.get('raiden shogun')['sample_size'], 1)
+        self.assertIsNone(other.get('Nahida'))
+
+    def test_prepare_context_prefers_benchmark(self):
+        rows = [{'Weapon': 'Fleuve', 'HP': 40000, 'Crit_Rate': 60, 'Crit_DMG': 200, 'ER': 150,
+                 'Artifact_Sets': '4pc Golden Troupe'}]
+        table = benchmarks.build_table('Furina', rows, ['1'])
+        summary = logic.prepare_context([{'HP': 1}], benchmark=table)
+        self.assertIn('LEADERBOARD BENCHMARK (Furina, 1 top players)', summary)
+        self.assertIn('HP: 40000 (median 40000, middle 50% 40000-40000)', summary)
+        self.assertIn('Top Artifact Sets: 4pc Golden Troupe (100%)', summary)
+        self.assertEqual(logic.prepare_context(None), "No leaderboard data available.")
+
+    def test_api_uses_benchmark_only_without_client_context(self):
+        import anyio
+        from pathlib import Path
+        from fastapi.testclient import TestClient
+        from backend import api
+
+        table = benchmarks.build_table('Furina', [{'Weapon': 'Fleuve', 'HP': 40000}], ['1'])
+        with patch.object(api.benchmark_store, 'get', return_value=table):
+            self.assertIsNone(anyio.run(api.context_benchmark, [{'HP': 1}], 'Furina'))
+            self.assertEqual(anyio.run(api.context_benchmark, None, 'Furina'), table)
+
+        # /data/clear removes the scan folders, not the benchmark tables next to them
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp).resolve()
+            (root / '82' / '19' / '821915463').mkdir(parents=True)
+            (root / '82' / '19' / '821915463' / 'manifest.json').write_text('{}')
+            store = benchmarks.BenchmarkStore(root / 'benchmarks')
+            store.save(table)
+            with patch.object(api, 'DATA_ROOT', root), patch.object(api, 'scan_repository'), \
+                    patch.object(api, 'manifest_index'):
+                response = TestClient(api.app).delete('/data/clear')
+            self.assertEqual(response.json()['deleted'], 1)
+            self.assertFalse((root / '82').exists())
+            self.assertEqual(store.get('Furina')['sample_size'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
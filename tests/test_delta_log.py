@@ -0,0 +1,161 @@
+import sys
+import os
+import json
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+# Add Website to path so we can import delta_log
+sys.path.append(os.path.join(os.getcwd(), 'Website'))
+
+import delta_log
+
+
+def table(rows):
+    return pd.DataFrame(rows, columns=['Character', 'Slot', 'Sub1_Val'])
+
+
+class TestDeltaLog(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.base = os.path.join(self.tmp.name, 'artifacts')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def records(self):
+        with open(delta_log.log_path(self.base), encoding='utf-8') as f:
+            return [json.loads(line) for line in f]
+
+    def test_versions_are_rebuilt_from_deltas(self):
+        v1 = table([['Keqing', 'Flower', 3.9], ['Keqing', 'Plume', np.nan]])
+        v2 = table([['Keqing', 'Flower', 7.8], ['Keqing', 'Plume', np.nan], ['Ayaka', 'Flower', 5.8]])
+        v3 = v2.assign(Sub2_Val=[1.0, np.nan, 2.0])
+        for df in (v1, v2, v3):
+            delta_log.append(self.base, df)
+
+        self.assertEqual([r['kind'] for r in self.records()], ['snapshot', 'delta', 'delta'])
+        self.assertEqual(self.records()[1]['updates'], [[0, 2, 7.8]])
+        self.assertEqual(delta_log.latest_version(self.base), 3)
+        pd.testing.assert_frame_equal(delta_log.load(self.base, 1), v1)
+        pd.testing.assert_frame_equal(delta_log.load(self.base, 2), v2)
+        pd.testing.assert_frame_equal(delta_log.load(self.base), v3)
+        self.assertIsNone(delta_log.load(self.base, 4))
+
+    def test_periodic_and_fallback_snapshots(self):
+        rows = [['Keqing', slot, 1.0] for slot in ('Flower', 'Plume', 'Sands', 'Goblet', 'Circlet')]
+        for value in range(5):
+            rows[0][2] = float(value)
+            delta_log.append(self.base, table(rows), snapshot_every=3)
+        # Removing a row cannot be expressed as a delta
+        delta_log.append(self.base, table(rows[1:]), snapshot_every=3)
+
+        self.assertEqual([r['kind'] for r in self.records()],
+                         ['snapshot', 'delta', 'delta', 'snapshot', 'delta', 'snapshot'])
+        self.assertEqual(delta_log.load(self.base, 5)['Sub1_Val'].iloc[0], 4.0)
+        self.assertEqual(len(delta_log.load(self.base)), 4)
+
+    def test_torn_last_line_is_ignored(self):
+        delta_log.append(self.base, table([['Keqing', 'Flower', 3.9]]))
+        with open(delta_log.log_path(self.base), 'a', encoding='utf-8') as f:
+            f.write('{"version": 2, "kind": "delta", "time": 1, "colu')
+
+        self.assertEqual(delta_log.latest_version(self.base), 1)
+        self.assertEqual(delta_log.append(self.base, table([['Keqing', 'Flower', 7.8]])), 2)
+        self.assertEqual(delta_log.load(self.base)['Sub1_Val'].iloc[0], 7.8)
+        # The torn bytes were dropped by the append
+        self.assertEqual([r['version'] for r in self.records()], [1, 2])
+
+    def test_torn_line_terminated_by_an_older_append_is_ignored(self):
+        delta_log.append(self.base, table([['Keqing', 'Flower', 3.9]]))
+        with open(delta_log.log_path(self.base), 'a', encoding='utf-8') as f:
+            f.write('{"version": 2, "kind": "delta", "time": 1, "colu\n')
+            f.write(json.dumps({"version": 2, "kind": "delta", "time": 2, "columns": ['Character', 'Slot', 'Sub1_Val'],
+                                "updates": [[0, 2, 7.8]], "appends": []}) + '\n')
+
+        self.assertEqual(delta_log.load(self.base)['Sub1_Val'].iloc[0], 7.8)
+
+    def test_corrupt_line_inside_the_chain_is_not_skipped(self):
+        v1 = table([['Keqing', 'Flower', 3.9], ['Keqing', 'Plume', 1.0]])
+        delta_log.append(self.base, v1)
+        delta_log.append(self.base, v1.assign(Sub1_Val=[7.8, 1.0]))
+        delta_log.append(self.base, v1.assign(Sub1_Val=[7.8, 2.0]))
+        path = delta_log.log_path(self.base)
+        with open(path, encoding='utf-8') as f:
+            lines = f.readlines()
+        lines[1] = lines[1].replace('"updates": [[0, 2, 7.8]]', '"updates": [[0, 2, 7.8')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.writelines(lines)
+
+        with self.assertRaises(delta_log.CorruptLogError):
+            delta_log.load(self.base)
+        pd.testing.assert_frame_equal(delta_log.load(self.base, 1), v1)
+
+        # The legacy CSV of that version is used instead
+        legacy = v1.assign(Sub1_Val=[7.8, 2.0])
+        legacy.to_csv(delta_log.legacy_path(self.base, 3), index=False)
+        with self.assertLogs(level='WARNING'):
+            pd.testing.assert_frame_equal(delta_log.load(self.base, 3), legacy)
+
+    def test_legacy_csv_versions_and_export(self):
+        legacy = table([['Keqing', 'Flower', 3.9]])
+        legacy.to_csv(delta_log.legacy_path(self.base, 2), index=False)
+        self.assertEqual(delta_log.current_version(self.base), 2)
+        pd.testing.assert_frame_equal(delta_log.load(self.base), legacy)
+
+        # The log continues the legacy numbering
+        new = table([['Keqing', 'Flower', 3.9], ['Ayaka', 'Plume', 5.8]])
+        self.assertEqual(delta_log.append(self.base, new), 3)
+        self.assertEqual(delta_log.versions(self.base), [2, 3])
+
+        path = delta_log.export_csv(self.base)
+        self.assertEqual(os.path.basename(path), 'artifacts_v3.csv')
+        pd.testing.assert_frame_equal(pd.read_csv(path), new)
+
+
+    def test_cached_exports_are_kept_per_version(self):
+        for value in (3.9, 7.8, 11.7):
+            delta_log.append(self.base, table([['Keqing', 'Flower', value]]))
+        old = delta_log.cached_export(self.base, 1)
+        middle = delta_log.cached_export(self.base, 2, 'csv')
+        latest = delta_log.cached_export(self.base)
+        self.assertEqual(os.path.basename(latest), 'artifacts.v3.json')
+        # Exporting the latest version does not remove the others right away
+        self.assertTrue(os.path.exists(old) and os.path.exists(middle))
+        with open(old, encoding='utf-8') as f:
+            self.assertEqual(json.load(f)[0]['Sub1_Val'], 3.9)
+
+        # Superseded exports go once they are older than the grace period, never the latest
+        past = os.path.getmtime(old) - delta_log.EXPORT_GRACE - 1
+        for path in (old, middle, latest):
+            os.utime(path, (past, past))
+        requested = delta_log.cached_export(self.base, 2)
+        self.assertFalse(os.path.exists(old))
+        # Version 2 is the one being requested: none of its exports are removed
+        self.assertTrue(os.path.exists(middle))
+        self.assertTrue(os.path.exists(latest))
+        self.assertTrue(os.path.exists(requested))
+
+    def test_cached_export_is_written_under_the_lock(self):
+        delta_log.append(self.base, table([['Keqing', 'Flower', 3.9]]))
+        held = []
+
+        class Lock:
+            def __enter__(self):
+                held.append(True)
+
+            def __exit__(self, *exc):
+                held.append(False)
+
+        path = delta_log.cached_export(self.base, lock=Lock())
+        self.assertEqual(held, [True, False])
+        # Already written: the lock is not taken again
+        self.assertEqual(delta_log.cached_export(self.base, lock=Lock()), path)
+        self.assertEqual(held, [True, False])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import sys
+import os
+import random
+import unittest
+
+import numpy as np
+import pandas as pd
+
+# Add Website to path so we can import enka
+sys.path.append(os.path.join(os.getcwd(), 'Website'))
+
+import enka
+
+
+def synthetic_artifacts(n, seed):
+    rnd = random.Random(seed)
+    return pd.DataFrame([{
+        'Character': f'C{rnd.randint(0, n // 5)}',
+        'Slot': rnd.choice(['Flower', 'Plume', 'Sands', 'Goblet', 'Circlet']),
+        'Set': rnd.choice(['Golden Troupe', 'Emblem', None]),
+        'Main_Stat': 'HP',
+        'Main_Value': rnd.choice([4780, 4780.0, 46.6]),
+        'Sub1': 'Crit Rate', 'Sub1_Val': rnd.choice([3.9, 7.8, np.nan]),
+        'Sub2': 'Crit DMG', 'Sub2_Val': rnd.randint(1, 30),
+        'Level': rnd.randint(0, 20),
+    } for _ in range(n)])
+
+
+class TestEnkaMerge(unittest.TestCase):
+
+    def assert_same_merge(self, existing, new, key_func, key_columns):
+        expected, expected_stats = enka._merge_dataframes_rowwise(existing, new, key_func, key_columns)
+        merged, stats = enka.merge_dataframes(existing, new, key_func, key_columns)
+        self.assertEqual(stats, expected_stats)
+        pd.testing.assert_frame_equal(merged, expected)
+        return stats
+
+    def test_artifacts_match_rowwise_merge(self):
+        for seed in range(10):
+            existing = synthetic_artifacts(200, seed)
+            new = pd.concat([existing.sample(60, random_state=seed), synthetic_artifacts(100, seed + 100)],
+                            ignore_index=True)
+            stats = self.assert_same_merge(existing, new, enka.create_artifact_key, ['Character', 'Slot'])
+            self.assertGreaterEqual(stats['unchanged'], 60)
+
+    def test_characters_and_new_columns(self):
+        existing = pd.DataFrame([{'Character': 'Furina', 'HP': 40000, 'ATK': 1000, 'Crit_Rate%': 70.0},
+                                 {'Character': 'Keqing', 'HP': 15000, 'ATK': 2200, 'Crit_Rate%': 65.5}])
+        new = pd.DataFrame([{'Character': 'Furina', 'HP': 40000.0, 'ATK': 1000, 'Crit_Rate%': 70.0, 'Level': 90},
+                            {'Character': 'Keqing', 'HP': 15100, 'ATK': 2200, 'Crit_Rate%': 65.5, 'Level': 90},
+                            {'Character': 'Nahida', 'HP': 16000, 'ATK': 1500, 'Crit_Rate%': 50.0, 'Level': 80}])
+        stats = self.assert_same_merge(existing, new, enka.create_character_key, ['Character'])
+        self.assertEqual(stats, {'added': 1, 'updated': 1, 'unchanged': 1})
+
+    def test_unknown_key_function_uses_rowwise_merge(self):
+        existing = synthetic_artifacts(20, 1)
+        new = synthetic_artifacts(20, 2)
+        self.assert_same_merge(existing, new, lambda row: str(row.get('Level')), ['Character'])
+
+
+if __name__ == '__main__':
+    unittest.main()
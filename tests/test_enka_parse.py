@@ -0,0 +1,157 @@
+import sys
+import os
+import json
+import tempfile
+import unittest
+from unittest.mock import patch
+from pathlib import Path
+
+# Add Website to path so we can import enka
+sys.path.append(os.path.join(os.getcwd(), 'Website'))
+
+import enka
+import shards
+
+FIXTURE = Path(os.getcwd()) / 'Website' / 'backend' / 'Kety_821915463' / 'raw.json'
+
+
+class TestEnkaParse(unittest.TestCase):
+
+    def setUp(self):
+        with open(FIXTURE, encoding='utf-8') as f:
+            self.data = json.load(f)
+
+    def test_parse_all_characters(self):
+        parsed, error = enka.parse_player_data(self.data)
+        self.assertIsNone(error)
+        self.assertEqual(parsed['player']['nickname'], 'Kety')
+        self.assertEqual(len(parsed['characters']), len(self.data['avatarInfoList']))
+        keqing = next(c for c in parsed['characters'] if c.name == 'Keqing')
+        arts = [a for a in parsed['artifacts'] if a.character == 'Keqing']
+        self.assertEqual(keqing.artifacts, arts)
+        self.assertEqual(keqing.total_cv, sum(a.crit_value for a in arts))
+        self.assertEqual(keqing.to_dict()['Total_CV'], keqing.total_cv)
+        self.assertEqual(keqing.to_api()['artifacts'][0]['Character'], 'Keqing')
+
+    def test_parse_character_subset(self):
+        parsed, error = enka.parse_player_data(self.data, characters=['Keqing'])
+        self.assertIsNone(error)
+        self.assertEqual([c.name for c in parsed['characters']], ['Keqing'])
+        self.assertEqual({a.character for a in parsed['artifacts']}, {'Keqing'})
+
+    def test_parse_errors(self):
+        self.assertEqual(enka.parse_player_data({})[1], "Profile hidden or no data")
+        self.assertEqual(enka.parse_player_data({'playerInfo': {'nickname': 'x'}})[1], "No characters found in showcase")
+        self.assertEqual(enka.parse_player_data({'playerInfo': {}, 'avatarInfoList': []})[1], "No characters")
+
+    @patch('enka.request_player_data')
+    def test_fetch_player_characters_has_no_side_effects(self, mock_request):
+        mock_request.return_value = (self.data, None)
+        with tempfile.TemporaryDirectory() as tmp:
+            cwd = os.getcwd()
+            os.chdir(tmp)
+            try:
+                with patch('builtins.print') as mock_print:
+                    api_data, error = enka.fetch_player_characters('821915463', characters=['Keqing'])
+            finally:
+                os.chdir(cwd)
+            self.assertEqual(os.listdir(tmp), [])
+
+        self.assertIsNone(error)
+        mock_print.assert_not_called()
+        mock_request.assert_called_once_with('821915463', verbose=False)
+        self.assertEqual(len(api_data), 1)
+        self.assertEqual(api_data[0]['stats']['Character'], 'Keqing')
+        self.assertEqual(len(api_data[0]['artifacts']), 5)
+
+    @patch('enka.request_player_data')
+    def test_fetch_player_data_still_persists(self, mock_request):
+        mock_request.return_value = (self.data, None)
+        with tempfile.TemporaryDirectory() as tmp, patch('builtins.print'):
+            api_data, error = enka.fetch_player_data('821915463', output_root=tmp)
+            files = sorted(os.listdir(shards.shard_dir(tmp, '821915463')))
+
+        self.assertIsNone(error)
+        self.assertEqual(len(api_data), len(self.data['avatarInfoList']))
+        self.assertEqual(files, ['artifacts.log.jsonl', 'characters.log.jsonl', 'combined.log.jsonl',
+                                 'fingerprints.json', 'manifest.json', 'raw.jsonl.gz'])
+
+    @patch('enka.request_player_data')
+    def test_rescan_only_processes_changed_avatars(self, mock_request):
+        with tempfile.TemporaryDirectory() as tmp, patch('builtins.print'):
+            folder = shards.shard_dir(tmp, '821915463')
+            mock_request.return_value = (self.data, None)
+            enka.fetch_player_data('821915463', output_root=tmp)
+
+            # Identical showcase (only the cache ttl differs): nothing is written
+            same = dict(self.data, ttl=12345)
+            mock_request.return_value = (same, None)
+            mtimes = {p.name: p.stat().st_mtime_ns for p in folder.iterdir()}
+            with patch('enka.merge_dataframes') as mock_merge:
+                enka.fetch_player_data('821915463', output_root=tmp)
+            mock_merge.assert_not_called()
+            self.assertEqual({p.name: p.stat().st_mtime_ns for p in folder.iterdir()}, mtimes)
+
+            # One avatar levelled up: only its rows are merged
+            changed = json.loads(json.dumps(self.data))
+            avatar = changed['avatarInfoList'][0]
+            avatar['fightPropMap']['2000'] = avatar['fightPropMap'].get('2000', 0) + 1000
+            mock_request.return_value = (changed, None)
+            merged = []
+            real_merge = enka.merge_dataframes
+            with patch('enka.merge_dataframes', side_effect=lambda e, n, *a: merged.append(n) or real_merge(e, n, *a)):
+                enka.fetch_player_data('821915463', output_root=tmp)
+            versions = {table: enka.get_current_version(str(folder / table))[0]
+                        for table in ('characters', 'artifacts', 'combined')}
+
+        name = enka.avatar_character_name(avatar)
+        self.assertEqual([set(df['Character']) for df in merged], [{name}, {name}])
+        self.assertEqual(versions, {'characters': 2, 'artifacts': 1, 'combined': 2})
+
+    @patch('enka.request_player_data')
+    def test_corrupt_log_stops_the_save(self, mock_request):
+        with tempfile.TemporaryDirectory() as tmp, patch('builtins.print'):
+            mock_request.return_value = (self.data, None)
+            enka.fetch_player_data('821915463', output_root=tmp)
+            changed = json.loads(json.dumps(self.data))
+            changed['avatarInfoList'][0]['fightPropMap']['2000'] += 1000
+            mock_request.return_value = (changed, None)
+            enka.fetch_player_data('821915463', output_root=tmp)
+
+            base = str(shards.shard_dir(tmp, '821915463') / 'characters')
+            log = enka.delta_log.log_path(base)
+            with open(log, encoding='utf-8') as f:
+                lines = f.readlines()
+            self.assertEqual(len(lines), 2)
+            lines[1] = lines[1][:40] + '#' + lines[1][41:]
+            with open(log, 'w', encoding='utf-8') as f:
+                f.writelines(lines)
+
+            # A third scan must not replace the table with its own rows only
+            again = json.loads(json.dumps(changed))
+            again['avatarInfoList'][0]['fightPropMap']['2000'] += 1000
+            mock_request.return_value = (again, None)
+            with self.assertRaises(enka.delta_log.CorruptLogError):
+                enka.save_player_data('821915463', again, enka.parse_player_data(again)[0], output_root=tmp)
+            with open(log, encoding='utf-8') as f:
+                self.assertEqual(f.readlines(), lines)
+
+    def test_fingerprints_are_keyed_by_avatar_id(self):
+        # Two avatar IDs map to the same character name
+        data = json.loads(json.dumps(self.data))
+        first, second = data['avatarInfoList'][:2]
+        first['avatarId'], second['avatarId'] = 10000116, 10000903
+        self.assertEqual(enka.avatar_character_name(first), enka.avatar_character_name(second))
+        before = enka.showcase_fingerprints(data)
+        self.assertEqual(len(before['avatars']), len(data['avatarInfoList']))
+
+        second['fightPropMap']['2000'] = second['fightPropMap'].get('2000', 0) + 1000
+        after = enka.showcase_fingerprints(data)
+        changed = {k for k, fp in after['avatars'].items() if before['avatars'].get(k) != fp}
+        self.assertEqual(changed, {'10000903'})
+        parsed, _ = enka.parse_player_data(data)
+        self.assertEqual([c.avatar_id for c in parsed['characters'][:2]], [10000116, 10000903])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,150 @@
+import sys
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+# Add Website to path so we can import backend.jobs
+sys.path.append(os.path.join(os.getcwd(), 'Website'))
+
+from backend import jobs
+import task_queue
+import worker
+
+
+def wait_finished(job, timeout=5):
+    deadline = time.time() + timeout
+    while not job.finished and time.time() < deadline:
+        time.sleep(0.01)
+    return job.finished
+
+
+class TestJobManager(unittest.TestCase):
+
+    def setUp(self):
+        self.release = threading.Event()
+        self.calls = 0
+
+        def fake_iter(calc_id, character, limit=50, stop_event=None, **kwargs):
+            self.calls += 1
+            yield {'event': 'start', 'total': 2}
+            yield {'event': 'row', 'index': 1, 'data': {'UID': '1', 'Character': character}}
+            yield {'event': 'progress', 'processed': 1, 'total': 2, 'fetched': 1, 'skipped': 0, 'failed': 0}
+            self.release.wait(5)
+            if stop_event is not None and stop_event.is_set():
+                yield {'event': 'summary', 'total': 2, 'fetched': 1, 'skipped': 0, 'failed': 0, 'stopped': True}
+                return
+            yield {'event': 'row', 'index': 2, 'data': {'UID': '2', 'Character': character}}
+            yield {'event': 'summary', 'total': 2, 'fetched': 2, 'skipped': 0, 'failed': 0, 'stopped': False}
+
+        patcher = patch('backend.jobs.leaderboard.iter_leaderboard_character', side_effect=fake_iter)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.manager = jobs.JobManager(max_workers=1, max_pending=2)
+        self.addCleanup(self.manager.shutdown)
+        self.addCleanup(self.release.set)
+
+    def test_partial_rows_then_done(self):
+        job, reused = self.manager.submit('123', 'Furina', 20)
+        self.assertFalse(reused)
+
+        deadline = time.time() + 5
+        while not job.rows and time.time() < deadline:
+            time.sleep(0.01)
+        partial = job.to_dict()
+        self.assertEqual(partial['status'], jobs.RUNNING)
+        self.assertEqual(partial['total_rows'], 1)
+
+        self.release.set()
+        self.assertTrue(wait_finished(job))
+        final = job.to_dict(offset=1)
+        self.assertEqual(final['status'], jobs.DONE)
+        self.assertEqual([r['UID'] for r in final['rows']], ['2'])
+        self.assertEqual(final['summary']['fetched'], 2)
+
+    def test_only_refresh_jobs_are_incremental(self):
+        self.release.set()
+        one_off, _ = self.manager.submit('123', 'Furina', 20)
+        refresh, reused = self.manager.submit('123', 'Furina', 20, incremental=True)
+        self.assertFalse(reused)
+        self.assertTrue(wait_finished(one_off) and wait_finished(refresh))
+        calls = jobs.leaderboard.iter_leaderboard_character.call_args_list
+        self.assertEqual([c.kwargs['incremental'] for c in calls], [False, True])
+
+    def test_identical_jobs_are_deduplicated_and_reused(self):
+        job, _ = self.manager.submit('123', 'Furina', 20)
+        same, reused = self.manager.submit('123', 'Furina', 20)
+        self.assertTrue(reused)
+        self.assertIs(same, job)
+
+        self.release.set()
+        self.assertTrue(wait_finished(job))
+        again, reused = self.manager.submit('123', 'Furina', 20)
+        self.assertTrue(reused)
+        self.assertIs(again, job)
+        self.assertEqual(self.calls, 1)
+
+    def test_pending_limit_and_cancel(self):
+        first, _ = self.manager.submit('1', 'Furina', 20)
+        self.manager.submit('2', 'Furina', 20)
+        with self.assertRaises(OverflowError):
+            self.manager.submit('3', 'Furina', 20)
+
+        self.manager.cancel(first.id)
+        self.release.set()
+        self.assertTrue(wait_finished(first))
+        self.assertEqual(first.status, jobs.CANCELLED)
+
+
+
+class TestQueuedJobs(unittest.TestCase):
+
+    ENTRIES = [
+        {'Rank': 1, 'Player': 'A', 'UID': '700000001', 'DMG_Result': 100},
+        {'Rank': 2, 'Player': 'B', 'UID': '700000002', 'DMG_Result': 90},
+    ]
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.queue = task_queue.TaskQueue(os.path.join(tmp.name, 'queue.db'))
+        for patcher in (
+            patch('leaderboard.akasha.fetch_leaderboard', side_effect=lambda calc_id, **kwargs: self.ENTRIES),
+            patch('snapshots.SNAPSHOT_DIR', tmp.name),
+            patch('worker.leaderboard.enrich_entry',
+                  side_effect=lambda entry, character, **kwargs: ({'UID': entry['UID'], 'Character': character}, 'fetched', None)),
+        ):
+            self.enrich = patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def run_job(self, incremental):
+        manager = jobs.JobManager(max_workers=1, queue=self.queue)
+        self.addCleanup(manager.shutdown)
+        job, _ = manager.submit('123', 'Furina', 20, incremental=incremental)
+        deadline = time.time() + 5
+        while not job.finished and time.time() < deadline:
+            # Stands in for the worker processes
+            worker.run_worker(self.queue, worker_id='w1', once=True, request_delay=0)
+            time.sleep(0.01)
+        self.assertEqual(job.status, jobs.DONE)
+        return job
+
+    def test_incremental_refresh_through_the_queue(self):
+        first = self.run_job(incremental=True)
+        self.assertEqual(sorted(r['UID'] for r in first.rows), ['700000001', '700000002'])
+        self.assertEqual(self.enrich.call_count, 2)
+
+        # Nothing changed on the board: no task is queued, the stored rows are reused
+        refresh = self.run_job(incremental=True)
+        self.assertEqual(self.enrich.call_count, 2)
+        self.assertEqual(refresh.summary['reused'], 2)
+        self.assertEqual(sorted(r['UID'] for r in refresh.rows), ['700000001', '700000002'])
+
+        self.run_job(incremental=False)
+        self.assertEqual(self.enrich.call_count, 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
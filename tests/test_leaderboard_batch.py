@@ -0,0 +1,80 @@
+import sys
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+# Add Website to path so we can import leaderboard
+sys.path.append(os.path.join(os.getcwd(), 'Website'))
+
+import leaderboard
+
+
+def entry(rank, uid):
+    return {'Rank': rank, 'Player': f'P{uid}', 'UID': uid, 'Region': 'EU', 'Weapon': 'Sword', 'DMG_Result': 100 - rank}
+
+
+BOARDS = {
+    '1': [entry(1, '700000001'), entry(2, '700000002')],
+    '2': [entry(1, '700000002'), entry(2, '700000003')],
+    '3': [entry(1, '700000001'), entry(2, '700000002')],
+}
+
+
+def fake_player(uid, max_retries=leaderboard.MAX_RETRIES, characters=None):
+    if uid == '700000003':
+        return None, "Profile hidden or no data"
+    return [{'stats': {'Character': 'Furina', 'UID': uid}, 'artifacts': [
+        {'Slot': 'Flower', 'Set': 'Golden Troupe', 'Main_Stat': 'HP', 'Main_Value': 4780, 'Crit_Value': 30,
+         'Sub1': 'CRIT Rate', 'Sub1_Val': 10.5},
+    ]}], None
+
+
+class TestLeaderboardBatch(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        cwd = os.getcwd()
+        os.chdir(tmp.name)
+        self.addCleanup(os.chdir, cwd)
+
+    def test_read_batch_ids(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'ids.txt')
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write("# Hydro DPS\n3, 4\n\n5  # Furina\n1\n")
+            ids = leaderboard.read_batch_ids(['leaderboard.py', '--batch', '1,2', '--batch-file', path])
+        self.assertEqual(ids, ['1', '2', '3', '4', '5'])
+
+    def test_build_scan_rows(self):
+        chars, _ = fake_player('700000001')
+        rows = leaderboard.build_scan_rows(entry(1, '700000001'), chars)
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['LB_Rank'], 1)
+        self.assertEqual(rows[0]['FL_Set'], 'Golden Troupe')
+        self.assertEqual(rows[0]['FL_Main'], 'HP 4780')
+        self.assertEqual(rows[0]['FL_Subs'], 'CRIT Rate:10.5')
+
+    @patch('leaderboard.save_data')
+    @patch('leaderboard._fetch_player_with_retry', side_effect=fake_player)
+    @patch('leaderboard.akasha.fetch_leaderboard', side_effect=lambda calc_id, limit=50: BOARDS[calc_id])
+    def test_each_uid_is_fetched_once(self, mock_akasha, mock_fetch, mock_save):
+        with patch('builtins.print'):
+            stats = leaderboard.run_batch(['1', '2', '3'], limit=2, request_delay=0)
+
+        fetched = [c.args[0] for c in mock_fetch.call_args_list]
+        self.assertEqual(fetched, ['700000001', '700000002', '700000003'])
+        self.assertEqual(stats, {'leaderboards': 3, 'entries': 6, 'unique_uids': 3, 'fetches_saved': 3})
+
+        saved = {c.args[1]: (c.args[0], c.args[2]) for c in mock_save.call_args_list}
+        self.assertEqual(sorted(saved), ['1', '2', '3'])
+        rows, errors = saved['2']
+        # The shared player keeps the rank it has on this leaderboard
+        self.assertEqual([(r['UID'], r['LB_Rank']) for r in rows], [('700000002', 1)])
+        self.assertEqual(errors, [{'uid': '700000003', 'error': "Profile hidden or no data"}])
+        self.assertEqual([r['LB_Rank'] for r in saved['3'][0]], [1, 2])
+
+
+if __name__ == '__main__':
+    unittest.main()
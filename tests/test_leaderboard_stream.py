@@ -0,0 +1,159 @@
+import sys
+import os
+import json
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+
+# Add Website to path so we can import leaderboard and backend.api
+sys.path.append(os.path.join(os.getcwd(), 'Website'))
+
+import leaderboard
+
+LEADERBOARD = [
+    {'Rank': 1, 'Player': 'A', 'UID': '700000001', 'Region': 'EU', 'Weapon': 'W', 'DMG_Result': 100},
+    {'Rank': 2, 'Player': 'B', 'UID': None, 'Region': 'EU', 'Weapon': 'W', 'DMG_Result': 90},
+    {'Rank': 3, 'Player': 'C', 'UID': '700000003', 'Region': 'EU', 'Weapon': 'W', 'DMG_Result': 80},
+    {'Rank': 4, 'Player': 'D', 'UID': '700000004', 'Region': 'EU', 'Weapon': 'W', 'DMG_Result': 70},
+]
+
+def fake_player(uid, characters=None):
+    if uid == '700000003':
+        return None, "Player not found (404)"
+    return [{'stats': {'Character': 'Furina', 'HP': 40000, 'ER%': 150.0}, 'artifacts': []}], None
+
+
+class TestLeaderboardStream(unittest.TestCase):
+
+    @patch('leaderboard.enka.fetch_player_characters', side_effect=fake_player)
+    @patch('leaderboard.akasha.fetch_leaderboard', return_value=LEADERBOARD)
+    def test_events_order_and_summary(self, mock_lb, mock_enka):
+        events = list(leaderboard.iter_leaderboard_character('1', 'Furina', request_delay=0))
+        kinds = [e['event'] for e in events]
+
+        self.assertEqual(kinds[0], 'start')
+        self.assertEqual(kinds.count('row'), 2)
+        self.assertEqual(kinds.count('progress'), 4)
+        # A row is emitted before the progress event of the same entry
+        self.assertEqual(kinds[1:3], ['row', 'progress'])
+
+        summary = events[-1]
+        self.assertEqual(summary['event'], 'summary')
+        self.assertEqual((summary['fetched'], summary['skipped'], summary['failed']), (2, 1, 1))
+        self.assertFalse(summary['stopped'])
+
+    @patch('leaderboard.enka.fetch_player_characters', side_effect=fake_player)
+    @patch('leaderboard.akasha.fetch_leaderboard')
+    def test_shallow_mode_only_calls_enka_for_missing_stats(self, mock_lb, mock_enka):
+        stats = {'HP': 40000, 'ATK': 1000, 'Crit_Rate': 70.0, 'Crit_DMG': 200.0, 'Character': 'Furina',
+                 'Artifact_Sets': '4pc Golden Troupe'}
+        mock_lb.return_value = [dict(LEADERBOARD[0], **stats), dict(LEADERBOARD[2], **stats), LEADERBOARD[3]]
+
+        events = list(leaderboard.iter_leaderboard_character('1', 'Furina', request_delay=0, shallow=True))
+        rows = [e['data'] for e in events if e['event'] == 'row']
+
+        # Only the entry without Akasha stats goes to Enka
+        mock_enka.assert_called_once_with('700000004', characters=['Furina'])
+        self.assertEqual([r['UID'] for r in rows], ['700000001', '700000003', '700000004'])
+        self.assertEqual(rows[0]['Artifact_Sets'], '4pc Golden Troupe')
+        self.assertEqual((rows[0]['Crit_Rate'], rows[0]['Artifacts']), (70.0, []))
+        self.assertEqual(events[-1]['enka_calls'], 1)
+
+    @patch('leaderboard.enka.fetch_player_characters', side_effect=fake_player)
+    @patch('leaderboard.akasha.fetch_leaderboard')
+    def test_incremental_refresh_only_fetches_changed_entries(self, mock_lb, mock_enka):
+        board = [dict(e) for e in LEADERBOARD]
+        mock_lb.return_value = board
+        with tempfile.TemporaryDirectory() as tmp, patch('snapshots.SNAPSHOT_DIR', tmp):
+            first = list(leaderboard.iter_leaderboard_character('1', 'Furina', request_delay=0, incremental=True))
+            self.assertEqual(first[-1]['enka_calls'], 3)
+
+            # Player A moved down one rank (same build), player D changed weapon
+            board[0]['Rank'] = 2
+            board[3]['Weapon'] = 'Other'
+            mock_enka.reset_mock()
+            second = list(leaderboard.iter_leaderboard_character('1', 'Furina', request_delay=0, incremental=True))
+
+        # D changed, the failed player C is retried; A is reused with its new rank
+        self.assertEqual(sorted(c.args[0] for c in mock_enka.call_args_list), ['700000003', '700000004'])
+        self.assertEqual((second[-1]['reused'], second[-1]['fetched']), (1, 2))
+        rows = {e['data']['UID']: e['data'] for e in second if e['event'] == 'row'}
+        self.assertEqual(rows['700000001']['Rank'], 2)
+        self.assertEqual(rows['700000004']['Weapon'], 'Other')
+
+    @patch('leaderboard.enka.fetch_player_characters', side_effect=fake_player)
+    @patch('leaderboard.akasha.fetch_leaderboard', return_value=LEADERBOARD)
+    def test_early_stop(self, mock_lb, mock_enka):
+        events = list(leaderboard.iter_leaderboard_character('1', 'Furina', request_delay=0, max_rows=1))
+        self.assertEqual(sum(e['event'] == 'row' for e in events), 1)
+        self.assertTrue(events[-1]['stopped'])
+        self.assertEqual(mock_enka.call_count, 1)
+
+        stop_event = threading.Event()
+        stop_event.set()
+        events = list(leaderboard.iter_leaderboard_character('1', 'Furina', request_delay=0, stop_event=stop_event))
+        self.assertEqual([e['event'] for e in events], ['start', 'summary'])
+        self.assertTrue(events[-1]['stopped'])
+
+    @patch('leaderboard.enka.fetch_player_characters', side_effect=fake_player)
+    @patch('leaderboard.akasha.fetch_leaderboard', return_value=LEADERBOARD)
+    def test_fetch_leaderboard_character_unchanged(self, mock_lb, mock_enka):
+        rows = leaderboard.fetch_leaderboard_character('1', 'Furina', request_delay=0)
+        self.assertEqual([r['UID'] for r in rows], ['700000001', '700000004'])
+        self.assertEqual(rows[0]['ER'], 150.0)
+
+    @patch('leaderboard.enka.fetch_player_characters', side_effect=fake_player)
+    @patch('leaderboard.akasha.fetch_leaderboard', return_value=LEADERBOARD)
+    def test_ndjson_endpoint(self, mock_lb, mock_enka):
+        from fastapi.testclient import TestClient
+        from backend import api
+
+        iter_events = leaderboard.iter_leaderboard_character
+        with tempfile.TemporaryDirectory() as tmp, patch('snapshots.SNAPSHOT_DIR', tmp), \
+             patch('leaderboard.iter_leaderboard_character',
+                   lambda *args, **kwargs: iter_events(*args, request_delay=0, **kwargs)):
+            client = TestClient(api.app)
+            response = client.get('/leaderboard/deep/123/stream', params={'character': 'Furina'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers['content-type'].startswith('application/x-ndjson'))
+        events = [json.loads(line) for line in response.text.splitlines() if line]
+        self.assertEqual(events[0]['event'], 'stream')
+        self.assertEqual(events[-1]['event'], 'summary')
+        self.assertEqual(sum(e['event'] == 'row' for e in events), 2)
+        self.assertEqual(api.deep_streams, {})
+
+    def test_stream_limit_is_bounded(self):
+        from fastapi.testclient import TestClient
+        from backend import api
+
+        client = TestClient(api.app)
+        for limit in (0, 101):
+            response = client.get('/leaderboard/deep/123/stream', params={'character': 'Furina', 'limit': limit})
+            self.assertEqual(response.status_code, 400)
+        self.assertLess(api.MAX_DEEP_STREAMS, 40)
+
+    @patch('leaderboard.akasha.fetch_leaderboard', return_value=LEADERBOARD)
+    def test_stream_not_sent_is_not_registered(self, mock_lb):
+        import anyio
+        from backend import api
+
+        # The client went away before the body was sent: the generator never runs
+        response = anyio.run(lambda: api.stream_leaderboard_deep('123', 'Furina'))
+        self.assertEqual(api.deep_streams, {})
+        mock_lb.assert_not_called()
+
+        async def first_chunk():
+            chunk = await response.body_iterator.__anext__()
+            registered = dict(api.deep_streams)
+            await response.body_iterator.aclose()
+            return chunk, registered
+
+        chunk, registered = anyio.run(first_chunk)
+        self.assertEqual(list(registered), [json.loads(chunk)['stream_id']])
+        self.assertEqual(api.deep_streams, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
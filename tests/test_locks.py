@@ -0,0 +1,96 @@
+import sys
+import os
+import json
+import tempfile
+import unittest
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+from pathlib import Path
+
+# Add Website to path so we can import locks
+sys.path.append(os.path.join(os.getcwd(), 'Website'))
+
+import delta_log
+import enka
+import locks
+import shards
+
+FIXTURE = Path(os.getcwd()) / 'Website' / 'backend' / 'Kety_821915463' / 'raw.json'
+
+HOLD_LOCK = """
+import sys, time
+sys.path.append('Website')
+import locks
+with locks.uid_lock('821915463', sys.argv[1]):
+    print('locked', flush=True)
+    time.sleep(5)
+"""
+
+
+class TestLocks(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    @unittest.skipIf(locks.fcntl is None, "fcntl is not available")
+    def test_lock_is_held_across_processes(self):
+        holder = subprocess.Popen([sys.executable, '-c', HOLD_LOCK, str(self.root)], stdout=subprocess.PIPE, text=True)
+        try:
+            self.assertEqual(holder.stdout.readline().strip(), 'locked')
+            with self.assertRaises(TimeoutError):
+                with locks.uid_lock('821915463', self.root, timeout=0.2):
+                    pass
+            # Other players are not blocked
+            with locks.uid_lock('700000001', self.root, timeout=0.2):
+                pass
+        finally:
+            holder.kill()
+            holder.wait()
+        with locks.uid_lock('821915463', self.root, timeout=1):
+            pass
+
+    def test_concurrent_scans_of_one_player_get_distinct_versions(self):
+        with open(FIXTURE, encoding='utf-8') as f:
+            data = json.load(f)
+        showcases = []
+        for bonus in range(4):
+            changed = json.loads(json.dumps(data))
+            changed['avatarInfoList'][0]['fightPropMap']['2000'] += 1000 * (bonus + 1)
+            showcases.append(changed)
+
+        def scan(showcase):
+            parsed, _ = enka.parse_player_data(showcase)
+            return enka.save_player_data('821915463', showcase, parsed, output_root=self.root)
+
+        with patch('builtins.print'), ThreadPoolExecutor(max_workers=4) as pool:
+            list(pool.map(scan, showcases))
+
+        base = str(shards.shard_dir(self.root, '821915463') / 'characters')
+        self.assertEqual(delta_log.versions(base), [1, 2, 3, 4])
+        self.assertEqual(enka.get_current_version(base)[0], 4)
+
+    def test_deleting_a_legacy_folder_takes_its_player_lock(self):
+        from fastapi.testclient import TestClient
+        from backend import api
+
+        folder = self.root / 'Kety_scan'
+        folder.mkdir()
+        (folder / 'manifest.json').write_text(json.dumps({'uid': '821915463'}))
+        with patch.object(api, 'DATA_ROOT', self.root.resolve()), patch.object(api, 'scan_repository'), \
+                patch.object(api, 'manifest_index'), \
+                patch.object(api.locks, 'uid_lock', wraps=locks.uid_lock) as mock_lock:
+            response = TestClient(api.app).delete('/data/delete/Kety_scan')
+
+        self.assertEqual(response.status_code, 200)
+        # The UID comes from the manifest: the folder name has none
+        self.assertEqual(mock_lock.call_args[0][0], '821915463')
+        self.assertFalse(folder.exists())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import sys
+import os
+import json
+import tempfile
+import unittest
+from unittest.mock import patch
+from pathlib import Path
+
+import pandas as pd
+
+# Add Website to path so we can import manifest
+sys.path.append(os.path.join(os.getcwd(), 'Website'))
+
+import enka
+import delta_log
+import manifest
+
+FIXTURE = Path(os.getcwd()) / 'Website' / 'backend' / 'Kety_821915463' / 'raw.json'
+
+
+class TestManifest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    @patch('enka.request_player_data')
+    def test_scan_writes_manifest_and_index(self, mock_request):
+        with open(FIXTURE, encoding='utf-8') as f:
+            data = json.load(f)
+        mock_request.return_value = (data, None)
+        with patch('builtins.print'):
+            enka.fetch_player_data('821915463', output_root=self.root)
+
+        folder = self.root / '82' / '19' / '821915463'
+        info = manifest.read_manifest(folder)
+        self.assertEqual(info['uid'], '821915463')
+        self.assertEqual(info['tables']['characters']['version'], 1)
+        self.assertEqual(info['tables']['characters']['rows'], len(data['avatarInfoList']))
+        self.assertEqual(set(info['tables']), {'characters', 'artifacts', 'combined'})
+
+        # Version lookups are answered by the manifest, without reading the log
+        with patch('delta_log.latest_version') as mock_latest, patch('delta_log.legacy_versions') as mock_legacy:
+            self.assertEqual(enka.get_current_version(str(folder / 'artifacts'))[0], 1)
+        mock_latest.assert_not_called()
+        mock_legacy.assert_not_called()
+
+        index = manifest.ManifestIndex(self.root)
+        self.assertEqual(index.folders()['821915463']['nickname'], 'Kety')
+
+    def test_stale_entry_falls_back_to_the_log(self):
+        base = str(self.root / 'characters')
+        df = pd.DataFrame({'Character': ['Keqing'], 'Level': [90]})
+        delta_log.append(base, df)
+        manifest.record_table(base, 1, df)
+        self.assertEqual(manifest.table_entry(base)['version'], 1)
+
+        # Written without going through the manifest
+        delta_log.append(base, df.assign(Level=[95]))
+        self.assertIsNone(manifest.table_entry(base))
+        self.assertEqual(enka.get_current_version(base)[0], 2)
+
+    def test_index_changes_only_through_its_generation(self):
+        index = manifest.ManifestIndex(self.root)
+        self.assertEqual(index.folders(), {})
+        self.assertEqual(index.generation(), 1)
+
+        # Databases, spool and cache files change the root all the time: no rebuild
+        (self.root / 'scans.db-wal').write_bytes(b'x')
+        (self.root / '.pending').mkdir()
+        with patch('manifest.read_manifest') as mock_read:
+            self.assertEqual(index.folders(), {})
+        mock_read.assert_not_called()
+
+        # A folder copied in by hand is only picked up by rebuild()
+        folder = self.root / 'Manual_123456789'
+        folder.mkdir()
+        manifest._write_json_atomic(folder / 'manifest.json', {'uid': '123456789', 'tables': {}})
+        self.assertEqual(index.folders(), {})
+        index.rebuild()
+        self.assertEqual(list(index.folders()), ['Manual_123456789'])
+
+        # Changes made through another instance are seen
+        generation = index.generation()
+        manifest.ManifestIndex(self.root).rename('Manual_123456789', 'Renamed')
+        self.assertEqual(index.generation(), generation + 1)
+        self.assertEqual(list(index.folders()), ['Renamed'])
+        index.remove('Renamed')
+        self.assertEqual(index._load()['folders'], {})
+        self.assertEqual(index.generation(), generation + 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import sys
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+from pathlib import Path
+
+# Add Website to path so we can import raw_store
+sys.path.append(os.path.join(os.getcwd(), 'Website'))
+
+import raw_store
+
+FIXTURE = Path(os.getcwd()) / 'Website' / 'backend' / 'Kety_821915463'
+
+
+class TestRawStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.folder = Path(self.tmp.name) / 'Kety_821915463'
+        shutil.copytree(FIXTURE, self.folder)
+        with open(FIXTURE / 'raw.json', encoding='utf-8') as f:
+            self.data = json.load(f)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_roundtrip_and_lazy_access(self):
+        path = raw_store.write_raw(self.folder, self.data)
+        self.assertEqual(path.name, 'raw.jsonl.gz')
+        self.assertFalse((self.folder / 'raw.json').exists())
+        self.assertLess(path.stat().st_size, (FIXTURE / 'raw.json').stat().st_size / 5)
+        self.assertEqual(raw_store.load_raw(self.folder), self.data)
+
+        snapshot = raw_store.RawSnapshot(self.folder)
+        self.assertEqual(snapshot.player_info(), self.data['playerInfo'])
+        wanted = self.data['avatarInfoList'][2]
+        with patch('raw_store.json.loads', side_effect=json.loads) as mock_loads:
+            self.assertEqual(snapshot.avatar(wanted['avatarId']), wanted)
+        self.assertEqual(mock_loads.call_count, 1)
+        self.assertIsNone(snapshot.avatar(1))
+
+    def test_legacy_file_is_read_then_migrated(self):
+        legacy = raw_store.RawSnapshot(self.folder)
+        self.assertEqual(legacy.path.name, 'raw.json')
+        self.assertEqual(legacy.player_info(), self.data['playerInfo'])
+        self.assertEqual(legacy.avatar(self.data['avatarInfoList'][0]['avatarId']), self.data['avatarInfoList'][0])
+
+        self.assertEqual(raw_store.migrate_all(self.tmp.name), 1)
+        self.assertEqual(raw_store.migrate_all(self.tmp.name), 0)
+        self.assertEqual(raw_store.raw_path(self.folder).name, 'raw.jsonl.gz')
+        self.assertFalse((self.folder / 'raw.json').exists())
+        self.assertEqual(raw_store.load_raw(self.folder), self.data)
+
+    def test_missing_snapshot(self):
+        empty = Path(self.tmp.name) / 'empty'
+        empty.mkdir()
+        self.assertFalse(raw_store.exists(empty))
+        self.assertIsNone(raw_store.load_raw(empty))
+        self.assertEqual(raw_store.RawSnapshot(empty).player_info(), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
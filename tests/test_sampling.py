@@ -0,0 +1,66 @@
+import sys
+import os
+import unittest
+from unittest.mock import patch
+
+# Add Website to path so we can import sampling and leaderboard
+sys.path.append(os.path.join(os.getcwd(), 'Website'))
+
+import sampling
+import leaderboard
+
+
+def entry(rank):
+    return {'Rank': rank, 'Player': f'P{rank}', 'UID': str(700000000 + rank), 'Region': 'EU',
+            'Weapon': 'W', 'DMG_Result': 1000 - rank}
+
+
+def steady_player(uid, characters=None):
+    # Stats vary by less than 1% around their mean
+    jitter = int(uid) % 3
+    return [{'stats': {'Character': 'Furina', 'HP': 40000 + jitter * 100, 'ATK': 1000 + jitter,
+                       'ER%': 150.0, 'Crit_Rate%': 70.0 + jitter * 0.1, 'Crit_DMG%': 200.0}, 'artifacts': []}], None
+
+
+class TestSampling(unittest.TestCase):
+
+    def test_stratified_order_covers_the_board_first(self):
+        order = sampling.sampling_order(10, 'stratified', strata=5)
+        self.assertEqual(order[:5], [0, 2, 4, 6, 8])
+        self.assertEqual(sorted(order), list(range(10)))
+        self.assertEqual(sampling.sampling_order(3, 'stratified'), [0, 1, 2])
+        with self.assertRaises(ValueError):
+            sampling.sampling_order(10, 'random')
+
+    def test_precision(self):
+        stats = sampling.RunningStats(stats=('HP', 'EM'))
+        for hp in (100, 100, 100):
+            stats.add({'HP': hp, 'EM': 0})
+        self.assertEqual(stats.precision(), {'HP': 0.0, 'EM': 0.0})
+        stats.add({'HP': 140, 'EM': None})
+        # mean 110, s = 20 -> 1.96 * 20 / 2 / 110
+        self.assertAlmostEqual(stats.precision()['HP'], 0.17818, places=5)
+        self.assertFalse(stats.converged(0.1, min_samples=2))
+        self.assertTrue(stats.converged(0.2, min_samples=2))
+
+    @patch('leaderboard.enka.fetch_player_characters', side_effect=steady_player)
+    @patch('leaderboard.akasha.fetch_leaderboard', return_value=[entry(r) for r in range(1, 41)])
+    def test_scan_stops_when_means_are_stable(self, mock_lb, mock_enka):
+        events = list(leaderboard.iter_leaderboard_character('1', 'Furina', request_delay=0, tolerance=0.01,
+                                                             order='stratified'))
+        summary = events[-1]
+        self.assertTrue(summary['converged'])
+        self.assertTrue(summary['stopped'])
+        self.assertEqual(mock_enka.call_count, sampling.MIN_SAMPLES)
+        self.assertEqual(summary['fetches_saved'], 40 - sampling.MIN_SAMPLES)
+        precision = summary['precision']
+        self.assertTrue(all(precision[s] <= 0.01 for s in ('HP', 'ATK', 'ER', 'Crit_Rate', 'Crit_DMG')))
+        # Stats missing from the showcase do not block the stop
+        self.assertIsNone(precision['DEF'])
+        # Stratified: the first fetches are spread over the board
+        ranks = [e['data']['Rank'] for e in events if e['event'] == 'row']
+        self.assertEqual(ranks, [1, 9, 17, 25, 33])
+
+
+if __name__ == '__main__':
+    unittest.main()
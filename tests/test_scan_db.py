@@ -0,0 +1,89 @@
+import sys
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+from pathlib import Path
+
+# Add Website to path so we can import scan_db
+sys.path.append(os.path.join(os.getcwd(), 'Website'))
+
+import enka
+import scan_db
+
+FIXTURE = Path(os.getcwd()) / 'Website' / 'backend' / 'Kety_821915463' / 'raw.json'
+
+
+class TestScanRepository(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.repo = scan_db.ScanRepository(Path(self.tmp.name) / 'scans.db')
+        with open(FIXTURE, encoding='utf-8') as f:
+            self.data = json.load(f)
+        self.parsed, _ = enka.parse_player_data(self.data)
+
+    def tearDown(self):
+        self.repo.close()
+        self.tmp.cleanup()
+
+    def record(self, folder='Kety_821915463', uid='821915463'):
+        return self.repo.record_scan(uid, folder, self.parsed['player'], self.parsed['characters'],
+                                     self.parsed['artifacts'], versions={'characters': 1, 'artifacts': 1})
+
+    def test_wal_mode_and_indexes(self):
+        conn = self.repo._connect()
+        self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], 'wal')
+        plan = ' '.join(r['detail'] for r in conn.execute(
+            "EXPLAIN QUERY PLAN SELECT * FROM artifacts WHERE set_name = ? AND slot = ?", ('x', 'y')))
+        self.assertIn('idx_artifacts_set', plan)
+
+    def test_latest_scan_lookups(self):
+        self.record()
+        second = self.record()
+        self.assertEqual(self.repo.player('821915463')['latest_scan_id'], second)
+        self.assertEqual(len(self.repo.latest_characters('821915463')), len(self.parsed['characters']))
+
+        sands = self.repo.find_artifacts(slot='Sands', limit=1000)
+        self.assertEqual(len(sands), sum(a.slot == 'Sands' for a in self.parsed['artifacts']))
+        some_set = self.parsed['artifacts'][0].set_name
+        self.assertTrue(all(a['Set'] == some_set for a in self.repo.find_artifacts(set_name=some_set)))
+        self.assertEqual(len(self.repo.find_artifacts(latest_only=False, limit=1000)), 2 * len(self.parsed['artifacts']))
+        with self.assertRaises(ValueError):
+            self.repo.find_artifacts(level='+20')
+
+    def test_folder_rename_and_delete(self):
+        self.record()
+        self.assertEqual([f['folder'] for f in self.repo.folders()], ['Kety_821915463'])
+        self.assertEqual(self.repo.rename_folder('Kety_821915463', 'Main'), 1)
+        self.assertTrue(self.repo.has_folder('Main'))
+        self.assertFalse(self.repo.has_folder('Kety_821915463'))
+
+        self.repo.delete_folder('Main')
+        self.assertEqual(self.repo.folders(), [])
+        self.assertIsNone(self.repo.player('821915463'))
+        self.assertEqual(self.repo.find_artifacts(latest_only=False), [])
+
+    def test_backfill_existing_folders(self):
+        root = Path(self.tmp.name) / 'data'
+        shutil.copytree(FIXTURE.parent, root / 'Kety_821915463')
+        self.assertEqual(scan_db.backfill(self.repo, root), 1)
+        self.assertEqual(scan_db.backfill(self.repo, root), 0)
+        self.assertEqual(self.repo.player('821915463')['nickname'], 'Kety')
+
+    @patch('enka.request_player_data')
+    def test_fetch_player_data_indexes_persisted_scans(self, mock_request):
+        mock_request.return_value = (self.data, None)
+        with patch('builtins.print'):
+            enka.fetch_player_data('821915463', output_root=self.tmp.name, repository=self.repo)
+            # Identical showcase: nothing new to index
+            enka.fetch_player_data('821915463', output_root=self.tmp.name, repository=self.repo)
+
+        folders = self.repo.folders()
+        self.assertEqual([(f['folder'], f['scans']) for f in folders], [('821915463', 1)])
+
+
+if __name__ == '__main__':
+    unittest.main()
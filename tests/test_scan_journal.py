@@ -0,0 +1,89 @@
+import sys
+import os
+import json
+import tempfile
+import unittest
+from unittest.mock import patch
+
+# Add Website to path so we can import leaderboard
+sys.path.append(os.path.join(os.getcwd(), 'Website'))
+
+import leaderboard
+
+BOARD = [
+    {'Rank': r, 'Player': f'P{r}', 'UID': str(700000000 + r), 'Region': 'EU', 'Weapon': 'Sword', 'DMG_Result': 100 - r}
+    for r in range(1, 5)
+]
+
+
+def fake_player(uid, max_retries=leaderboard.MAX_RETRIES, characters=None):
+    return [{'stats': {'Character': 'Furina', 'UID': uid}, 'artifacts': []}], None
+
+
+class TestScanJournal(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        cwd = os.getcwd()
+        os.chdir(tmp.name)
+        self.addCleanup(os.chdir, cwd)
+
+    def test_orphaned_rows_are_dropped_on_resume(self):
+        journal = leaderboard.ScanJournal('1')
+        journal.record('700000001', [{'UID': '700000001', 'Character': 'Furina'}])
+        journal.close()
+        # Crash between the row append and the checkpoint, plus a torn line
+        with open(journal.rows_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({'UID': '700000002', 'Character': 'Furina'}) + "\n")
+            f.write('{"UID": "7000')
+
+        resumed = leaderboard.ScanJournal('1', resume=True)
+        self.assertTrue(resumed.is_done('700000001'))
+        self.assertFalse(resumed.is_done('700000002'))
+        self.assertEqual([r['UID'] for r in resumed.rows], ['700000001'])
+        resumed.close()
+        with open(resumed.rows_path, encoding='utf-8') as f:
+            self.assertEqual(len(f.readlines()), 1)
+
+    def test_without_resume_starts_over(self):
+        journal = leaderboard.ScanJournal('1')
+        journal.record('700000001', [{'UID': '700000001'}])
+        journal.close()
+
+        fresh = leaderboard.ScanJournal('1')
+        self.assertEqual((fresh.completed, fresh.rows), (set(), []))
+        fresh.close()
+
+    @patch('leaderboard.save_data')
+    @patch('leaderboard.akasha.fetch_leaderboard', return_value=BOARD)
+    def test_interrupted_batch_resumes_where_it_stopped(self, mock_akasha, mock_save):
+        calls = []
+
+        def interrupted_player(uid, *args, **kwargs):
+            if len(calls) == 2:
+                raise KeyboardInterrupt
+            calls.append(uid)
+            return fake_player(uid)
+
+        with patch('leaderboard._fetch_player_with_retry', side_effect=interrupted_player), patch('builtins.print'):
+            leaderboard.run_batch(['1'], request_delay=0)
+        # Reports are written once, with what was fetched, and the journal is kept
+        self.assertEqual(len(mock_save.call_args.args[0]), 2)
+        self.assertTrue(os.path.exists(os.path.join('scan_1', 'checkpoint.jsonl')))
+
+        mock_save.reset_mock()
+        with patch('leaderboard._fetch_player_with_retry', side_effect=fake_player) as mock_fetch, \
+             patch('builtins.print'):
+            leaderboard.run_batch(['1'], request_delay=0, resume=True)
+
+        self.assertEqual([c.args[0] for c in mock_fetch.call_args_list], ['700000003', '700000004'])
+        mock_save.assert_called_once()
+        self.assertEqual([r['UID'] for r in mock_save.call_args.args[0]],
+                         ['700000001', '700000002', '700000003', '700000004'])
+        # Completed scan: the journal is removed
+        self.assertFalse(os.path.exists(os.path.join('scan_1', 'checkpoint.jsonl')))
+
+
+if __name__ == '__main__':
+    unittest.main()
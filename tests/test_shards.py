@@ -0,0 +1,67 @@
+import sys
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+# Add Website to path so we can import shards
+sys.path.append(os.path.join(os.getcwd(), 'Website'))
+
+import manifest
+import scan_db
+import shards
+
+FIXTURE = Path(os.getcwd()) / 'Website' / 'backend' / 'Kety_821915463'
+
+
+class TestShards(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_paths(self):
+        self.assertEqual(shards.shard_dir(self.root, '734186982'), self.root / '73' / '41' / '734186982')
+        self.assertEqual(shards.folder_path(self.root, '734186982'), self.root / '73' / '41' / '734186982')
+        self.assertEqual(shards.folder_path(self.root, 'Kety_821915463'), self.root / 'Kety_821915463')
+        with self.assertRaises(ValueError):
+            shards.shard_dir(self.root, '../12345678')
+
+    def test_migrate_flat_folders(self):
+        shutil.copytree(FIXTURE, self.root / 'Kety_821915463')
+        # A renamed copy of the same player, and a directory that is not a scan
+        shutil.copytree(FIXTURE, self.root / 'Kety_backup_821915463')
+        (self.root / 'benchmarks').mkdir()
+        repo = scan_db.ScanRepository(self.root / 'scans.db')
+        repo.record_scan('821915463', 'Kety_821915463', {'nickname': 'Kety'}, [], [])
+        index = manifest.ManifestIndex(self.root)
+
+        report = shards.migrate(self.root, repository=repo, index=index)
+
+        self.assertEqual(report['moved'], [('Kety_821915463', '821915463')])
+        self.assertEqual([key for key, _ in report['skipped']], ['Kety_backup_821915463'])
+        self.assertTrue((self.root / '82' / '19' / '821915463' / 'raw.json').exists())
+        self.assertEqual([f['folder'] for f in repo.folders()], ['821915463'])
+        self.assertEqual([key for key, _ in shards.iter_scan_folders(self.root)],
+                         ['821915463', 'Kety_backup_821915463'])
+        repo.close()
+
+    def test_remove_empty_parents(self):
+        folder = shards.shard_dir(self.root, '734186982')
+        folder.mkdir(parents=True)
+        shards.shard_dir(self.root, '734199999').mkdir(parents=True)
+        shutil.rmtree(folder)
+        shards.remove_empty_parents(folder, self.root)
+        self.assertTrue((self.root / '73' / '41').exists())
+
+        shutil.rmtree(shards.shard_dir(self.root, '734199999'))
+        shards.remove_empty_parents(shards.shard_dir(self.root, '734199999'), self.root)
+        self.assertEqual(list(self.root.iterdir()), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
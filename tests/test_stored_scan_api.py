@@ -0,0 +1,87 @@
+import sys
+import os
+import json
+import tempfile
+import unittest
+from unittest.mock import patch
+from pathlib import Path
+
+# Add Website to path so we can import enka and backend.api
+sys.path.append(os.path.join(os.getcwd(), 'Website'))
+
+import enka
+import shards
+
+FIXTURE = Path(os.getcwd()) / 'Website' / 'backend' / 'Kety_821915463' / 'raw.json'
+UID = '821915463'
+
+
+class TestStoredScanEndpoints(unittest.TestCase):
+
+    def setUp(self):
+        from fastapi.testclient import TestClient
+        from backend import api
+
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = Path(tmp.name).resolve()
+        with open(FIXTURE, encoding='utf-8') as f:
+            self.data = json.load(f)
+        with patch('builtins.print'):
+            enka.save_player_data(UID, self.data, enka.parse_player_data(self.data)[0], output_root=self.root)
+
+        data_root = patch.object(api, 'DATA_ROOT', self.root)
+        data_root.start()
+        self.addCleanup(data_root.stop)
+        self.client = TestClient(api.app)
+
+    def test_raw_snapshot_is_served_compressed(self):
+        response = self.client.get(f'/data/{UID}/raw', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['content-encoding'], 'gzip')
+        self.assertEqual(int(response.headers['content-length']),
+                         (shards.shard_dir(self.root, UID) / 'raw.jsonl.gz').stat().st_size)
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        self.assertEqual(lines[0]['playerInfo'], self.data['playerInfo'])
+        self.assertEqual(len(lines) - 1, len(self.data['avatarInfoList']))
+
+        cached = self.client.get(f'/data/{UID}/raw', headers={
+            'Accept-Encoding': 'gzip', 'If-None-Match': response.headers['etag']})
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached.content, b'')
+
+    def test_raw_snapshot_without_gzip_support(self):
+        response = self.client.get(f'/data/{UID}/raw', headers={'Accept-Encoding': 'identity'})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('content-encoding', response.headers)
+        self.assertEqual(len(response.text.splitlines()) - 1, len(self.data['avatarInfoList']))
+
+    def test_latest_table_with_ranges_and_validators(self):
+        response = self.client.get(f'/data/{UID}/tables/combined')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['x-table-version'], '1')
+        rows = response.json()
+        self.assertEqual(len(rows), len(self.data['avatarInfoList']))
+        self.assertIn('FL_Set', rows[0])
+
+        partial = self.client.get(f'/data/{UID}/tables/combined', headers={'Range': 'bytes=0-9'})
+        self.assertEqual(partial.status_code, 206)
+        self.assertEqual(partial.content, response.content[:10])
+
+        cached = self.client.get(f'/data/{UID}/tables/combined',
+                                 headers={'If-Modified-Since': response.headers['last-modified']})
+        self.assertEqual(cached.status_code, 304)
+
+        csv = self.client.get(f'/data/{UID}/tables/characters', params={'format': 'csv', 'version': 1})
+        self.assertEqual(csv.status_code, 200)
+        self.assertTrue(csv.text.startswith('Character,'))
+
+    def test_unknown_folder_table_or_version(self):
+        self.assertEqual(self.client.get('/data/700000001/raw').status_code, 404)
+        self.assertEqual(self.client.get(f'/data/{UID}/tables/raw').status_code, 404)
+        self.assertEqual(self.client.get(f'/data/{UID}/tables/combined', params={'version': 5}).status_code, 404)
+        self.assertEqual(self.client.get(f'/data/{UID}/tables/combined', params={'format': 'xml'}).status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
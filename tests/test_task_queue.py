@@ -0,0 +1,162 @@
+import sys
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+# Add Website to path so we can import task_queue and worker
+sys.path.append(os.path.join(os.getcwd(), 'Website'))
+
+import task_queue
+import worker
+import leaderboard
+
+ENTRIES = [
+    {'Rank': 1, 'Player': 'A', 'UID': '700000001', 'DMG_Result': 100},
+    {'Rank': 2, 'Player': 'B', 'UID': '700000002', 'DMG_Result': 90},
+]
+
+
+class TestTaskQueue(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.queue = task_queue.TaskQueue(os.path.join(self.tmp.name, 'queue.db'), lease_seconds=60, max_attempts=2)
+
+    def test_lease_complete_in_order(self):
+        batch = self.queue.enqueue(ENTRIES, 'Furina')
+        w = self.queue.register_worker('w1')
+
+        first = self.queue.lease(w)
+        second = self.queue.lease(w)
+        self.assertEqual((first['uid'], second['uid']), ('700000001', '700000002'))
+        self.assertIsNone(self.queue.lease(w))
+
+        self.queue.complete(first['id'], w, 'fetched', result={'UID': '700000001'})
+        self.queue.complete(second['id'], w, 'skipped')
+
+        tasks = self.queue.batch_tasks(batch)
+        self.assertEqual([t['outcome'] for t in tasks], ['fetched', 'skipped'])
+        self.assertEqual(tasks[0]['result'], {'UID': '700000001'})
+
+        stats = self.queue.stats()
+        self.assertEqual(stats['tasks'], {'done': 2})
+        self.assertEqual(stats['workers'][0]['done'], 2)
+
+    def test_expired_lease_is_retried_then_failed(self):
+        self.queue.lease_seconds = -1  # every lease is immediately expired (crashed worker)
+        batch = self.queue.enqueue(ENTRIES[:1], 'Furina')
+
+        crashed = self.queue.lease('dead-worker')
+        retried = self.queue.lease('w2')
+        self.assertEqual(crashed['id'], retried['id'])
+        self.assertEqual(retried['attempts'], 2)
+
+        # The dead worker can no longer complete a task it lost
+        self.queue.complete(crashed['id'], 'dead-worker', 'fetched', result={'stale': True})
+        self.assertIsNone(self.queue.batch_tasks(batch)[0]['result'])
+
+        # Out of attempts: the task is failed for good
+        self.assertIsNone(self.queue.lease('w3'))
+        task = self.queue.batch_tasks(batch)[0]
+        self.assertEqual((task['status'], task['outcome']), (task_queue.FAILED, 'failed'))
+
+    def test_job_finishes_when_leases_expire_past_max_attempts(self):
+        self.queue.lease_seconds = -1
+
+        def fake_leaderboard(calc_id, limit=50, **kwargs):
+            return ENTRIES[:1]
+
+        with patch('leaderboard.akasha.fetch_leaderboard', side_effect=fake_leaderboard):
+            events = leaderboard.iter_leaderboard_character_queued('1', 'Furina', self.queue, poll_interval=0.01)
+            next(events)
+            # Workers crash on the task every time
+            self.queue.lease('dead-1')
+            self.queue.lease('dead-2')
+            self.assertIsNone(self.queue.lease('w3'))
+            rest = list(events)
+
+        self.assertEqual(rest[-1]['event'], 'summary')
+        self.assertEqual((rest[-1]['failed'], rest[-1]['fetched']), (1, 0))
+
+    def test_rate_limit_is_shared_by_workers(self):
+        other = task_queue.TaskQueue(self.queue.path)
+        slots = [self.queue.reserve_slot(10), other.reserve_slot(10), self.queue.reserve_slot(10)]
+        self.assertAlmostEqual(slots[1] - slots[0], 10, places=3)
+        self.assertAlmostEqual(slots[2] - slots[1], 10, places=3)
+
+    def test_fail_requeues_until_max_attempts(self):
+        batch = self.queue.enqueue(ENTRIES[:1], 'Furina')
+        task = self.queue.lease('w1')
+        self.queue.fail(task['id'], 'w1', 'timeout')
+        self.assertEqual(self.queue.batch_tasks(batch)[0]['status'], task_queue.QUEUED)
+
+        task = self.queue.lease('w1')
+        self.queue.fail(task['id'], 'w1', 'timeout')
+        tasks = self.queue.batch_tasks(batch)
+        self.assertEqual((tasks[0]['status'], tasks[0]['outcome']), (task_queue.FAILED, 'failed'))
+
+    def test_job_fails_without_workers(self):
+        def fake_leaderboard(calc_id, limit=50, **kwargs):
+            return ENTRIES
+
+        with patch('leaderboard.akasha.fetch_leaderboard', side_effect=fake_leaderboard):
+            events = leaderboard.iter_leaderboard_character_queued('1', 'Furina', self.queue, poll_interval=0.01,
+                                                                   idle_timeout=0.05)
+            start = next(events)
+            with self.assertRaises(TimeoutError):
+                list(events)
+        self.assertEqual(self.queue.batch_tasks(start['batch_id']), [])
+
+    def test_producer_reaps_expired_leases(self):
+        self.queue.lease_seconds = -1
+        batch = self.queue.enqueue(ENTRIES[:1], 'Furina')
+        self.queue.lease('dead-1')
+        self.queue.lease('dead-2')
+        self.queue.reap_expired()
+        task = self.queue.batch_tasks(batch)[0]
+        self.assertEqual((task['status'], task['outcome']), (task_queue.FAILED, 'failed'))
+
+    def test_idle_workers_are_alive(self):
+        self.queue.register_worker('w1')
+        self.assertEqual(self.queue.live_workers(60), 1)
+        self.assertEqual(self.queue.live_workers(-1), 0)
+        self.queue.lease('w1')
+        self.assertEqual(self.queue.live_workers(60), 1)
+
+    @patch('worker.leaderboard.enrich_entry')
+    def test_worker_retries_through_the_queue(self, mock_enrich):
+        batch = self.queue.enqueue(ENTRIES, 'Furina')
+        mock_enrich.side_effect = [(None, 'failed', 'timeout'), ({'UID': '700000001'}, 'fetched', None),
+                                   (None, 'failed', 'Error 404')]
+        worker.run_worker(self.queue, worker_id='w1', once=True, request_delay=0)
+
+        # One Enka request per lease; the 404 is not asked again
+        self.assertEqual([c.kwargs['max_retries'] for c in mock_enrich.call_args_list], [1, 1, 1])
+        tasks = self.queue.batch_tasks(batch)
+        self.assertEqual([(t['outcome'], t['attempts']) for t in tasks], [('fetched', 2), ('failed', 1)])
+
+    @patch('worker.leaderboard.enrich_entry')
+    def test_worker_drains_queue_and_producer_collects(self, mock_enrich):
+        mock_enrich.side_effect = lambda entry, character, **kwargs: ({'UID': entry['UID'], 'Character': character}, 'fetched', None)
+
+        def fake_leaderboard(calc_id, limit=50, **kwargs):
+            return ENTRIES
+
+        with patch('leaderboard.akasha.fetch_leaderboard', side_effect=fake_leaderboard):
+            events = leaderboard.iter_leaderboard_character_queued('1', 'Furina', self.queue, poll_interval=0.01)
+            start = next(events)
+            self.assertEqual(start['total'], 2)
+            worker.run_worker(self.queue, worker_id='w1', once=True, request_delay=0)
+            rest = list(events)
+
+        rows = [e['data']['UID'] for e in rest if e['event'] == 'row']
+        self.assertEqual(sorted(rows), ['700000001', '700000002'])
+        self.assertEqual(rest[-1]['fetched'], 2)
+        # Finished batches are removed from the queue
+        self.assertEqual(self.queue.batch_tasks(start['batch_id']), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
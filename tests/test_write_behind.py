@@ -0,0 +1,134 @@
+import sys
+import os
+import json
+import tempfile
+import unittest
+from unittest.mock import patch
+from pathlib import Path
+
+# Add Website to path so we can import write_behind
+sys.path.append(os.path.join(os.getcwd(), 'Website'))
+
+import delta_log
+import enka
+import shards
+import write_behind
+
+FIXTURE = Path(os.getcwd()) / 'Website' / 'backend' / 'Kety_821915463' / 'raw.json'
+UID = '821915463'
+
+
+class TestScanWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        with open(FIXTURE, encoding='utf-8') as f:
+            self.data = json.load(f)
+        printer = patch('builtins.print')
+        printer.start()
+        self.addCleanup(printer.stop)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def showcase(self, bonus):
+        changed = json.loads(json.dumps(self.data))
+        changed['avatarInfoList'][0]['fightPropMap']['2000'] += 1000 * bonus
+        return changed
+
+    def test_scans_are_written_in_submission_order(self):
+        writer = write_behind.ScanWriter(self.root, max_pending=2, fsync=False)
+        writer.start()
+        for bonus in range(1, 5):
+            showcase = self.showcase(bonus)
+            writer.submit(UID, showcase, enka.parse_player_data(showcase)[0])
+        writer.close()
+
+        folder = shards.shard_dir(self.root, UID)
+        self.assertEqual(delta_log.versions(str(folder / 'characters')), [1, 2, 3, 4])
+        hp = delta_log.load(str(folder / 'characters'))['HP'].iloc[0]
+        self.assertEqual(float(hp), float(enka.parse_player_data(self.showcase(4))[0]['characters'][0].hp))
+        self.assertEqual(writer.status(UID)['state'], 'saved')
+        self.assertEqual(writer.pending_files(), [])
+        self.assertEqual(writer.stats()['written'], 4)
+
+    def test_fetch_returns_before_the_scan_is_written(self):
+        writer = write_behind.ScanWriter(self.root, fsync=False)
+        with patch('enka.request_player_data', return_value=(self.data, None)):
+            api_data, error = enka.fetch_player_data(UID, output_root=self.root, writer=writer)
+        self.assertIsNone(error)
+        self.assertTrue(api_data)
+        # Not started yet: the scan only exists in the spool
+        self.assertFalse(shards.shard_dir(self.root, UID).exists())
+        self.assertEqual(writer.status(UID)['state'], 'pending')
+        self.assertEqual(len(writer.pending_files()), 1)
+
+        writer.start()
+        writer.flush()
+        self.assertEqual(writer.status(UID)['state'], 'saved')
+        self.assertTrue((shards.shard_dir(self.root, UID) / 'manifest.json').exists())
+
+    def test_failures_are_reported_and_kept(self):
+        writer = write_behind.ScanWriter(self.root, fsync=False)
+        writer.start()
+        with patch('enka.save_player_data', side_effect=OSError("disk full")), \
+                self.assertLogs(level='ERROR'):
+            writer.submit(UID, self.data)
+            writer.flush()
+        status = writer.status(UID)
+        self.assertEqual(status['state'], 'failed')
+        self.assertEqual(status['error'], 'disk full')
+        self.assertEqual(writer.pending_files(), [])
+        self.assertEqual(len(list(writer.spool_dir.glob('*.failed'))), 1)
+        writer.close()
+
+    def test_spooled_scans_are_replayed_on_start(self):
+        crashed = write_behind.ScanWriter(self.root, fsync=False)
+        crashed.submit(UID, self.showcase(1))
+        crashed.submit(UID, self.showcase(2))
+        # The process dies before its writer ran: its spool lock goes with it
+        crashed._owner_lock.close()
+
+        writer = write_behind.ScanWriter(self.root, fsync=False)
+        writer.start()
+        writer.close()
+        base = str(shards.shard_dir(self.root, UID) / 'characters')
+        self.assertEqual(delta_log.versions(base), [1, 2])
+        self.assertEqual(writer.pending_files(), [])
+        self.assertEqual(writer.status(UID)['state'], 'saved')
+        self.assertEqual(list((self.root / write_behind.PENDING_DIR).iterdir()), [])
+
+    def test_spool_of_a_running_writer_is_not_replayed(self):
+        running = write_behind.ScanWriter(self.root, fsync=False)
+        running.submit(UID, self.showcase(1))
+
+        other = write_behind.ScanWriter(self.root, fsync=False)
+        self.assertEqual(other.recover(), 0)
+        self.assertEqual(len(running.pending_files()), 1)
+
+        # Once the first writer is gone, exactly one writer claims its spool
+        running._owner_lock.close()
+        late = write_behind.ScanWriter(self.root, fsync=False)
+        self.assertEqual(other.recover(), 1)
+        self.assertEqual(late.recover(), 0)
+        self.assertFalse(running.spool_dir.exists())
+        self.assertEqual(len(other.pending_files()), 1)
+
+    def test_flat_spool_files_are_claimed_once(self):
+        pending = self.root / write_behind.PENDING_DIR
+        pending.mkdir()
+        (pending / f"{1:020d}-{UID}.json").write_text(json.dumps({'uid': UID, 'data': self.data}), encoding='utf-8')
+
+        first = write_behind.ScanWriter(self.root, fsync=False)
+        second = write_behind.ScanWriter(self.root, fsync=False)
+        self.assertEqual(first.recover(), 1)
+        self.assertEqual(second.recover(), 0)
+        first.start()
+        first.flush()
+        self.assertEqual(first.status(UID)['state'], 'saved')
+        first.close()
+
+
+if __name__ == '__main__':
+    unittest.main()